@@ -0,0 +1,71 @@
+""" Benchmark: object permission checks of a list endpoint through ActionBasedPermission
+
+A list endpoint checking the object permission of every row, with the previous
+implementation (split the action_permissions keys and instantiate the permission
+class on every call) and the compiled action map.
+
+Usage:
+
+    PYTHONPATH=src python benchmarks/action_permissions.py [rows]
+"""
+import re
+import sys
+from timeit import timeit
+
+import django
+from django.conf import settings
+
+settings.configure()
+django.setup()
+
+from rest_framework.permissions import IsAdminUser  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework.viewsets import GenericViewSet  # noqa: E402
+
+from scaffold.restframework.permissions import ActionBasedPermission, IsAuthor  # noqa: E402
+
+
+class LegacyActionBasedPermission(ActionBasedPermission):
+
+    def has_object_permission(self, request, view, obj):
+        for actions, cls in getattr(view, 'action_permissions', {}).items():
+            if isinstance(actions, str):
+                actions = re.split(r'\s+|[\.\|,]', actions)
+            if view.action in actions:
+                return cls().has_object_permission(request, view, obj)
+        return True
+
+
+class User:
+    is_authenticated = True
+
+
+class Row:
+    def __init__(self, author):
+        self.author = author
+
+
+class RowViewSet(GenericViewSet):
+    action_permissions = {
+        'create,update,partial_update': IsAdminUser,
+        'destroy': IsAdminUser,
+        'list,retrieve': IsAuthor,
+    }
+
+
+def main(rows=10000, number=20):
+    user = User()
+    request = APIRequestFactory().get('/')
+    request.user = user
+    view = RowViewSet(action='list', request=request)
+    data = [Row(user) for _ in range(rows)]
+    for name, permission in [('legacy', LegacyActionBasedPermission()),
+                             ('compiled', ActionBasedPermission())]:
+        seconds = timeit(lambda: [
+            row for row in data if permission.has_object_permission(request, view, row)
+        ], number=number) / number
+        print('{:>10}: {:8.2f} ms per list, {} rows'.format(name, seconds * 1000, rows))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
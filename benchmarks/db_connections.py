@@ -0,0 +1,72 @@
+""" Benchmark: requests/sec with per-request connections vs persistent connections
+
+The database is configured like scaffold.settings, from the DJANGO_DB_* environment
+variables (DJANGO_DB_TYPE=mysql, DJANGO_DB_HOST, ...), a temporary sqlite3 file
+is used when DJANGO_DB_TYPE is not set. The connect overhead shows on a networked
+database, sqlite3 connects almost for free.
+
+Usage:
+
+    PYTHONPATH=src python benchmarks/db_connections.py [requests]
+    DJANGO_DB_TYPE=mysql DJANGO_DB_NAME=test PYTHONPATH=src python benchmarks/db_connections.py
+"""
+import os
+import sys
+import tempfile
+from timeit import timeit
+
+import django
+from django.conf import settings
+
+if os.environ.get('DJANGO_DB_TYPE', 'sqlite3') == 'mysql':
+    DATABASE = {
+        'ENGINE': 'django.db.backends.mysql',
+        'NAME': os.environ.get('DJANGO_DB_NAME', 'test'),
+        'USER': os.environ.get('DJANGO_DB_USER', 'root'),
+        'PASSWORD': os.environ.get('DJANGO_DB_PASS', os.environ.get('DJANGO_DB_USER', 'root')),
+        'HOST': os.environ.get('DJANGO_DB_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('DJANGO_DB_PORT', '3306'),
+        'OPTIONS': {'charset': os.environ.get('DJANGO_DB_CHARSET', 'utf8mb4')},
+    }
+else:
+    DATABASE = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(tempfile.mkdtemp(), 'db.sqlite3'),
+    }
+
+settings.configure(
+    DEBUG=False,
+    ALLOWED_HOSTS=['*'],
+    ROOT_URLCONF=__name__,
+    DATABASES={'default': DATABASE},
+)
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.http import JsonResponse  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import path  # noqa: E402
+
+
+def query_view(request):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        return JsonResponse({'value': cursor.fetchone()[0]})
+
+
+urlpatterns = [path('', query_view)]
+
+
+def main(requests=2000):
+    client = Client()
+    for conn_max_age in (0, 60):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        client.get('/')
+        seconds = timeit(lambda: client.get('/'), number=requests)
+        print('CONN_MAX_AGE={:>3}: {:8.0f} requests/sec, {} requests on {}'.format(
+            conn_max_age, requests / seconds, requests, connection.vendor))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
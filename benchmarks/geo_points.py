@@ -0,0 +1,58 @@
+""" Benchmark: parsing and serializing GPS traces with the drf_extra_fields geo fields
+
+Compares a ListField of per point PointField with the bulk PointListField.
+Requires the GEOS/GDAL libraries used by GeoDjango; NumPy is optional.
+
+Usage:
+
+    PYTHONPATH=src python benchmarks/geo_points.py [points]
+"""
+import random
+import sys
+from timeit import timeit
+
+import django
+from django.conf import settings
+
+settings.configure()
+django.setup()
+
+from rest_framework import serializers  # noqa: E402
+
+from scaffold.libs.drf_extra_fields import geo_fields  # noqa: E402
+
+
+def trace(points):
+    longitude, latitude = 113.26, 23.13
+    coords = []
+    for i in range(points):
+        longitude += random.uniform(-0.0005, 0.0005)
+        latitude += random.uniform(-0.0005, 0.0005)
+        coords.append([longitude, latitude])
+    return coords
+
+
+def main(points=5000, number=10):
+    coords = trace(points)
+    print('numpy available: {}'.format(geo_fields.numpy is not None))
+
+    per_point = serializers.ListField(child=geo_fields.PointField())
+    per_point_data = [dict(longitude=x, latitude=y) for x, y in coords]
+    bulk = geo_fields.PointListField()
+
+    parsed = per_point.to_internal_value(per_point_data)
+    line = bulk.to_internal_value(coords)
+    assert bulk.to_representation(line) == coords
+
+    for name, func in [
+        ('PointField parse', lambda: per_point.to_internal_value(per_point_data)),
+        ('PointListField parse', lambda: bulk.to_internal_value(coords)),
+        ('PointField render', lambda: per_point.to_representation(parsed)),
+        ('PointListField render', lambda: bulk.to_representation(line)),
+    ]:
+        seconds = timeit(func, number=number) / number
+        print('{:>22}: {:8.2f} ms, {} points'.format(name, seconds * 1000, points))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
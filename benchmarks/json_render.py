@@ -0,0 +1,50 @@
+""" Benchmark: rendering large list payloads through the DRF JSON renderers
+
+Usage:
+
+    PYTHONPATH=src python benchmarks/json_render.py [rows]
+"""
+import datetime
+import decimal
+import sys
+import uuid
+from timeit import timeit
+
+import django
+from django.conf import settings
+
+settings.configure(REST_FRAMEWORK={
+    'DATETIME_FORMAT': '%Y-%m-%d %H:%M:%S',
+    'COERCE_DECIMAL_TO_STRING': False,
+})
+django.setup()
+
+from rest_framework.renderers import JSONRenderer as StockJSONRenderer  # noqa: E402
+
+from scaffold.restframework.renderers import JSONRenderer  # noqa: E402
+from scaffold.utils import fastjson  # noqa: E402
+
+
+def payload(rows):
+    now = datetime.datetime.now()
+    return dict(count=rows, pages=1, results=[dict(
+        id=i,
+        uuid=uuid.uuid4(),
+        name='会员{}'.format(i),
+        amount=decimal.Decimal('12.34'),
+        is_active=bool(i % 2),
+        date_created=now,
+        tags=['a', 'b', 'c'],
+    ) for i in range(rows)])
+
+
+def main(rows=10000, number=20):
+    data = payload(rows)
+    print('orjson available: {}'.format(fastjson.orjson is not None))
+    for name, renderer in [('stock', StockJSONRenderer()), ('scaffold', JSONRenderer())]:
+        seconds = timeit(lambda: renderer.render(data), number=number) / number
+        print('{:>10}: {:8.2f} ms per render, {} rows'.format(name, seconds * 1000, rows))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -3,6 +3,13 @@
 Helps to setup DRF to be ready with few lines of code,
 with easy convention configuration of serializers and viewsets.
 """
+import os
+
 from .version import VERSION
 
+if os.environ.get('SCAFFOLD_PROFILE_IMPORTS') == '1':
+    from . import importtime
+
+    importtime.install()
+
 __version__ = VERSION
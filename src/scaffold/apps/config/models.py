@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
 
@@ -70,14 +71,24 @@ class Option(models.Model):
     def __str__(self):
         return '{} = {}'.format(self.key, self.value)
 
+    CACHE_KEY = 'scaffold:options'
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(self.CACHE_KEY)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        cache.delete(self.CACHE_KEY)
+        return result
+
     @classmethod
     def get(cls, key):
         """ 获取选项值
         :param key: 选项的关键字
         :return: 匹配到的选项值，如果没有此选项，返回 None
         """
-        opt = cls.objects.filter(key=key).first()
-        return opt and opt.value
+        return cls.get_all().get(key)
 
     @classmethod
     def unset(cls, key):
@@ -86,6 +97,7 @@ class Option(models.Model):
         :return: 没有返回值
         """
         cls.objects.filter(key=key).delete()
+        cache.delete(cls.CACHE_KEY)
 
     @classmethod
     def set(cls, key, val):
@@ -98,9 +110,14 @@ class Option(models.Model):
         opt.value = val
         opt.save()
 
-    @staticmethod
-    def get_all():
-        return dict([(item.key, item.value) for item in Option.objects.all()])
+    @classmethod
+    def get_all(cls):
+        """ 全部选项 {key: value}，整体缓存，修改选项时失效 """
+        options = cache.get(cls.CACHE_KEY)
+        if options is None:
+            options = dict(cls.objects.values_list('key', 'value'))
+            cache.set(cls.CACHE_KEY, options)
+        return options
 
 
 class UserOption(models.Model):
@@ -138,9 +155,28 @@ class UserOption(models.Model):
     def __str__(self):
         return '{}: {} = {}'.format(self.user, self.key, self.value)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(self.get_cache_key(self.user_id))
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        cache.delete(self.get_cache_key(self.user_id))
+        return result
+
     @staticmethod
-    def get_all(user):
-        return dict([(item.key, item.value) for item in user.options.all()])
+    def get_cache_key(user_id):
+        return 'scaffold:user_options:{}'.format(user_id)
+
+    @classmethod
+    def get_all(cls, user):
+        """ 用户的全部选项 {key: value}，按用户整体缓存，修改选项时失效 """
+        key = cls.get_cache_key(user.pk)
+        options = cache.get(key)
+        if options is None:
+            options = dict(cls.objects.filter(user=user).values_list('key', 'value'))
+            cache.set(key, options)
+        return options
 
     @classmethod
     def get(cls, user, key):
@@ -149,8 +185,7 @@ class UserOption(models.Model):
         :param user: 选项对应的用户
         :return: 匹配到的选项值，如果没有此选项，返回 None
         """
-        opt = cls.objects.filter(user=user, key=key).first()
-        return opt and opt.value
+        return cls.get_all(user).get(key)
 
     @classmethod
     def set(cls, user, key, val):
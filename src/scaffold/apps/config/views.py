@@ -1,5 +1,6 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db.models.base import ModelBase
 from django.utils.decorators import method_decorator
 from rest_framework import viewsets
@@ -32,7 +33,15 @@ class OptionViewSet(viewsets.GenericViewSet):
 
     @action(methods=['GET'], detail=False)
     def choices(self, request):
-        """ 返回所有的常量选项 """
+        """ 返回所有的常量选项，只随代码变化，结果缓存起来 """
+        result = cache.get('scaffold:choices')
+        if result is None:
+            result = self.get_choices()
+            cache.set('scaffold:choices', result)
+        return Response(result)
+
+    @staticmethod
+    def get_choices():
         from django.apps import apps
         result = dict()
 
@@ -56,7 +65,7 @@ class OptionViewSet(viewsets.GenericViewSet):
         for app in apps.all_models.values():
             for cls in app.values():
                 inspect_class(cls)
-        return Response(result)
+        return result
 
 
 class UserOptionViewSet(viewsets.GenericViewSet):
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MediaConfig(AppConfig):
     name = 'scaffold.apps.media'
+
+    def ready(self):
+        from .cleanup import connect_receivers
+        connect_receivers()
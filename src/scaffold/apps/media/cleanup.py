@@ -0,0 +1,123 @@
+""" 附件文件的异步清理
+开启 SCAFFOLD_AUTO_DELETE_FILE 时，附件记录被删除（包括 QuerySet.delete() 以及级联删除）后，
+在事务提交时把文件交给后台线程批量删除。
+内容相同的附件共用同一个文件，删除前会确认所有模型的 FileField 都没有再引用这个文件。
+引用检查在删除记录的事务提交之后进行，两个事务并发删除同一个文件的最后两个引用时，
+后提交的一方一定能看到引用数为 0，文件不会被遗漏。
+
+只在开启 SCAFFOLD_AUTO_DELETE_FILE 时注册 post_delete 信号：有接收者的模型无法使用 fast delete，
+QuerySet.delete() 会先把记录逐条查出来。
+后台线程还没处理完的文件在进程退出时（atexit）同步删除，短生命周期的进程（管理命令、脚本）不会丢失。
+
+设置 SCAFFOLD_ASYNC_FILE_CLEANUP = False 可以改为在提交时同步删除（例如测试环境）。
+"""
+import logging
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+
+from scaffold.utils.worker import BatchWorker
+from .thumbnails import delete_variants
+
+__all__ = (
+    'FileCleaner',
+    'cleaner',
+    'collect_files',
+    'connect_receivers',
+    'disconnect_receivers',
+    'get_file_fields',
+    'get_referenced_names',
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FileCleaner(BatchWorker):
+    """ 后台批量删除文件 """
+    name = 'scaffold-file-cleaner'
+    batch_size = 200
+
+    def schedule(self, model, field_name, name):
+        if not getattr(settings, 'SCAFFOLD_ASYNC_FILE_CLEANUP', True):
+            return self.clean([(model, field_name, name)])
+        self.put((model, field_name, name))
+
+    def process(self, batch):
+        self.clean(batch)
+
+    @staticmethod
+    def clean(batch):
+        """ 删除一批文件，仍被任何模型引用的文件会被跳过 """
+        groups = defaultdict(set)
+        for model, field_name, name in batch:
+            groups[model._meta.get_field(field_name).storage].add(name)
+        for storage, names in groups.items():
+            with transaction.atomic():
+                for name in names - get_referenced_names(names):
+                    try:
+                        storage.delete(name)
+                    except Exception:
+                        logger.warning('Failed to delete file %s', name, exc_info=True)
+                        continue
+                    # 图片的缩略图/派生图跟随原图删除
+                    delete_variants(storage, name)
+
+
+def get_file_fields():
+    """ 所有模型的 (model, FileField 字段名) """
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def get_referenced_names(names):
+    """ names 中仍被任何模型的 FileField 引用的文件名 """
+    referenced = set()
+    names = set(names)
+    for model, field_name in get_file_fields():
+        referenced.update(model._default_manager.filter(
+            **{field_name + '__in': names - referenced}
+        ).values_list(field_name, flat=True))
+        if referenced >= names:
+            break
+    return referenced
+
+
+cleaner = FileCleaner()
+
+
+def collect_files(sender, instance, using, **kwargs):
+    """ post_delete 信号处理，事务提交后再清理文件，回滚时不会误删 """
+    if not getattr(settings, 'SCAFFOLD_AUTO_DELETE_FILE', False):
+        return
+    for field in sender._meta.fields:
+        if isinstance(field, models.FileField):
+            file = getattr(instance, field.name)
+            if file:
+                transaction.on_commit(
+                    lambda field_name=field.name, name=file.name:
+                    cleaner.schedule(sender, field_name, name),
+                    using=using,
+                )
+
+
+def connect_receivers():
+    """ 为附件模型注册 post_delete，在 MediaConfig.ready 中调用 """
+    if not getattr(settings, 'SCAFFOLD_AUTO_DELETE_FILE', False):
+        return
+    from .models import AbstractAttachment
+    # 只为附件模型注册，避免影响其他模型的 fast delete
+    for model in apps.get_models():
+        if issubclass(model, AbstractAttachment):
+            post_delete.connect(collect_files, sender=model, dispatch_uid='scaffold.media.collect_files')
+
+
+def disconnect_receivers():
+    for model in apps.get_models():
+        post_delete.disconnect(collect_files, sender=model, dispatch_uid='scaffold.media.collect_files')
@@ -0,0 +1,101 @@
+""" 扫描 MEDIA_ROOT 中没有被任何 FileField 引用的孤立文件
+只扫描各个 FileField 的 upload_to 目录，MEDIA_ROOT 下其他程序的文件不会被当作孤立文件删除。
+upload_to 是函数或者为空的字段无法确定目录，这些字段只参与引用比对。
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...cleanup import get_file_fields
+from ...thumbnails import VARIANT_PATTERN
+
+
+class Command(BaseCommand):
+    help = '扫描 MEDIA_ROOT 中没有被数据库引用的孤立文件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='删除扫描到的孤立文件')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='每次比对数据库的文件数量')
+
+    def handle(self, *args, **options):
+        self.delete = options['delete']
+        self.chunk_size = options['chunk_size']
+        self.file_fields = get_file_fields()
+        self.total = self.orphans = 0
+        chunk = []
+        for prefix in self.get_prefixes():
+            for path in self.walk(os.path.join(settings.MEDIA_ROOT, prefix)):
+                chunk.append(path)
+                if len(chunk) >= self.chunk_size:
+                    self.check_chunk(chunk)
+                    chunk = []
+        self.check_chunk(chunk)
+        self.stdout.write('{} files scanned, {} orphans {}.'.format(
+            self.total, self.orphans, 'deleted' if self.delete else 'found'))
+
+    def get_prefixes(self):
+        """ FileField 的 upload_to 中固定的目录部分，例如 'uploads/%Y/%m/' -> 'uploads'，去掉相互包含的目录 """
+        prefixes = set()
+        for model, field_name in self.file_fields:
+            upload_to = model._meta.get_field(field_name).upload_to
+            if not isinstance(upload_to, str):
+                continue
+            # upload_to 本身就是目录，只有 strftime 占位符之前的完整目录是固定的
+            prefix = upload_to.split('%', 1)[0]
+            if '%' in upload_to and not prefix.endswith('/'):
+                prefix = os.path.dirname(prefix)
+            prefix = prefix.strip('/')
+            if prefix:
+                prefixes.add(prefix)
+        result = []
+        for prefix in sorted(prefixes):
+            if not any(prefix.startswith(parent + '/') for parent in result):
+                result.append(prefix)
+        return result
+
+    def walk(self, top):
+        """ 用 os.scandir 遍历 top，返回相对 MEDIA_ROOT 的路径，跳过隐藏文件和目录 """
+        root = settings.MEDIA_ROOT
+        stack = [top] if os.path.isdir(top) else []
+        while stack:
+            directory = stack.pop()
+            with os.scandir(directory) as entries:
+                entries = [entry for entry in entries if not entry.name.startswith('.')]
+            originals = set()
+            variants = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                match = VARIANT_PATTERN.match(entry.name)
+                if match:
+                    variants.append((entry, match.group(1)))
+                    continue
+                originals.add(os.path.splitext(entry.name)[0])
+                yield os.path.relpath(entry.path, root).replace(os.sep, '/')
+            # 派生图只在原图已经不存在时视为孤立文件
+            for entry, base in variants:
+                if base not in originals:
+                    self.total += 1
+                    self.report(os.path.relpath(entry.path, root).replace(os.sep, '/'))
+
+    def check_chunk(self, paths):
+        if not paths:
+            return
+        self.total += len(paths)
+        remaining = set(paths)
+        for model, field_name in self.file_fields:
+            remaining -= set(model._default_manager.filter(
+                **{field_name + '__in': remaining}
+            ).values_list(field_name, flat=True))
+            if not remaining:
+                return
+        for path in sorted(remaining):
+            self.report(path)
+
+    def report(self, path):
+        self.orphans += 1
+        self.stdout.write(path)
+        if self.delete:
+            os.remove(os.path.join(settings.MEDIA_ROOT, path))
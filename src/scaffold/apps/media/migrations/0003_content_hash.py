@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0002_auto_20250321_1110'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='文件内容的 sha256，内容相同的附件共用同一个文件', max_length=64, verbose_name='内容哈希'),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='文件内容的 sha256，内容相同的附件共用同一个文件', max_length=64, verbose_name='内容哈希'),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='文件内容的 sha256，内容相同的附件共用同一个文件', max_length=64, verbose_name='内容哈希'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='文件内容的 sha256，内容相同的附件共用同一个文件', max_length=64, verbose_name='内容哈希'),
+        ),
+    ]
@@ -1,14 +1,81 @@
+import hashlib
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 import requests
 import os.path
 from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
 from django.db import models
+from django.dispatch import receiver
+from django.utils.encoding import filepath_to_uri
 
 from scaffold.exceptions.exceptions import AppError
+from .uploadhandlers import HASH_ALGORITHM, get_content_hash
+
+# 下载外部附件共用的 Session，复用连接池
+download_session = requests.Session()
+
+
+def download(url):
+    """ 流式下载外部链接到临时文件
+    超时时间和大小上限分别由 SCAFFOLD_DOWNLOAD_TIMEOUT（秒，默认 30）
+    以及 SCAFFOLD_DOWNLOAD_MAX_SIZE（字节，默认 20M）配置
+    :param url: 下载的链接
+    :return: 已经 seek 到开头的临时文件对象，由调用方负责关闭
+    """
+    timeout = getattr(settings, 'SCAFFOLD_DOWNLOAD_TIMEOUT', 30)
+    max_size = getattr(settings, 'SCAFFOLD_DOWNLOAD_MAX_SIZE', 20 * 1024 * 1024)
+    with download_session.get(url, stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        if int(resp.headers.get('Content-Length') or 0) > max_size:
+            raise AppError(-1, '下载的文件过大', data=dict(url=url))
+        file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        hasher = hashlib.new(HASH_ALGORITHM)
+        size = 0
+        for chunk in resp.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > max_size:
+                file.close()
+                raise AppError(-1, '下载的文件过大', data=dict(url=url))
+            hasher.update(chunk)
+            file.write(chunk)
+    file.seek(0)
+    file.content_hash = hasher.hexdigest()
+    return file
+
+
+@lru_cache(maxsize=None)
+def get_url_formatter(storage):
+    """ 获取存储的 name -> url 转换函数
+    FileSystemStorage 或者配置了 SCAFFOLD_MEDIA_BASE_URL 时，直接拼接 base_url，
+    不再逐个文件调用 storage.url()；其他存储引擎仍然使用 storage.url
+    """
+    base_url = getattr(settings, 'SCAFFOLD_MEDIA_BASE_URL', None)
+    if base_url is None and isinstance(storage, FileSystemStorage):
+        base_url = storage.base_url
+    if base_url is None:
+        return storage.url
+    if not base_url.endswith('/'):
+        base_url += '/'
+    return lambda name: base_url + filepath_to_uri(name).lstrip('/')
+
+
+@receiver(setting_changed)
+def clear_url_formatter_cache(setting, **kwargs):
+    """ 修改 SCAFFOLD_MEDIA_BASE_URL 或者 MEDIA_URL（例如 override_settings）之后重新生成 """
+    if setting in ('SCAFFOLD_MEDIA_BASE_URL', 'MEDIA_URL'):
+        get_url_formatter.cache_clear()
 
 
 class AbstractAttachment(models.Model):
+    """ 附件基类
+    开启 SCAFFOLD_AUTO_DELETE_FILE 时，记录删除后文件由 cleanup 模块在后台清理，
+    对 QuerySet.delete() 同样有效
+    """
     FILE_FIELD_NAME = ''
 
     name = models.CharField(
@@ -25,6 +92,15 @@ class AbstractAttachment(models.Model):
         default='',
     )
 
+    content_hash = models.CharField(
+        verbose_name='内容哈希',
+        max_length=64,
+        blank=True,
+        default='',
+        db_index=True,
+        help_text='文件内容的 sha256，内容相同的附件共用同一个文件',
+    )
+
     class Meta:
         verbose_name = '抽象附件'
         abstract = True
@@ -34,32 +110,44 @@ class AbstractAttachment(models.Model):
 
     def url(self):
         file_field = getattr(self, self.FILE_FIELD_NAME)
-        return file_field.url if file_field else self.ext_url
+        return get_url_formatter(file_field.storage)(file_field.name) if file_field else self.ext_url
+
+    def store_file(self, content, name='', query_db=True):
+        """ 按内容哈希存放文件
+        文件存放在 upload_to/ab/cd/<hash>.<ext> 下，内容相同的文件只存一份
+        :param content: 文件对象
+        :param name: 原始文件名，只用于确定扩展名
+        :param query_db: 是否先从数据库中查找相同哈希的文件，不方便访问数据库时（例如在线程中）传 False
+        """
+        field = self._meta.get_field(self.FILE_FIELD_NAME)
+        digest = get_content_hash(content)
+        path = None
+        if query_db:
+            path = type(self).objects.filter(content_hash=digest) \
+                .exclude(**{field.name: ''}) \
+                .values_list(field.name, flat=True).first()
+        if not path:
+            ext = os.path.splitext(name or getattr(content, 'name', None) or '')[1].lower()
+            path = field.generate_filename(self, '{}/{}/{}{}'.format(digest[:2], digest[2:4], digest, ext))
+            if not field.storage.exists(path):
+                path = field.storage.save(path, content, max_length=field.max_length)
+        # 赋值文件名，由 FileDescriptor 包装为已经提交的 FieldFile
+        setattr(self, field.name, path)
+        self.content_hash = digest
 
     def save(self, *args, **kwargs):
         file_field = getattr(self, self.FILE_FIELD_NAME)
         if not self.name and file_field:
             self.name = file_field.name
+        if file_field and not file_field._committed:
+            self.store_file(file_field.file, file_field.name)
         super().save(*args, **kwargs)
-        
-    def delete(self, *args, **kwargs):
-        if getattr(settings, 'SCAFFOLD_AUTO_DELETE_FILE', False):
-            for field in self._meta.fields:
-                if isinstance(field, models.FileField):
-                    file = getattr(self, field.name)
-                    try:
-                        file.delete(False)
-                    except:
-                        pass
-        return super(AbstractAttachment, self).delete(*args, **kwargs)
 
 
 class Image(AbstractAttachment,
             models.Model):
     """ 图片
     TODO: 考虑支持七牛引擎的问题
-    TODO: 还要考虑裁剪缩略图的问题
-    TODO: 存放的路径要按照 md5sum 折叠，以节省空间
     """
     FILE_FIELD_NAME = 'image'
 
@@ -76,10 +164,22 @@ class Image(AbstractAttachment,
         verbose_name_plural = '图片'
         db_table = 'base_media_image'
 
+    def variant_url(self, width=0, height=0, fit='contain', format='', quality=80):
+        """ 获取缩略图/派生图的链接，参数参考 thumbnails.get_variant
+        外部链接的图片或者派生图暂时无法生成时，返回原图链接
+        """
+        if not self.image:
+            return self.url()
+        from .thumbnails import FORMAT_CHOICES, get_variant
+        if not format and os.path.splitext(self.image.name)[1][1:].lower() not in FORMAT_CHOICES:
+            # 原图格式（例如 gif）不能直接生成派生图，又没有指定输出格式
+            return self.url()
+        name = get_variant(self.image, width, height, fit, format, quality)
+        return get_url_formatter(self.image.storage)(name) if name else self.url()
+
     def set_file_path(self, path):
-        from django.core.files import File
-        import os.path
-        self.image.save(os.path.basename(path), File(open(path, 'rb')))
+        with open(path, 'rb') as f:
+            self.store_file(File(f), os.path.basename(path))
         self.save()
 
     def save(self, *args, **kwargs):
@@ -93,21 +193,22 @@ class Image(AbstractAttachment,
         根据服务器本地文件路径构造一个对象
         :return:
         """
-        from django.core.files import File
-        import os.path
         obj = cls()
-        obj.image.save(os.path.basename(path), File(open(path, 'rb')))
-        obj.save()
-        # print(obj, obj.id)
+        obj.set_file_path(path)
         return obj
 
     @classmethod
     def from_file(cls, file):
-        """ TODO: 工厂方法
+        """ 工厂方法
         根据提交的 file 构造一个对象
-        如果存在相同的 md5sum
+        如果已经存在内容相同的图片，直接返回已有的对象
         :return:
         """
+        obj = cls.objects.filter(content_hash=get_content_hash(file)).first()
+        if obj is None:
+            obj = cls(name=file.name, image=file)
+            obj.save()
+        return obj
 
     @classmethod
     def from_url_reference(cls, url):
@@ -123,13 +224,9 @@ class Image(AbstractAttachment,
         根据指定的 url 下载图片保存，生成一个对象
         :return:
         """
-        resp = requests.get(url)
-        tmp = tempfile.NamedTemporaryFile(delete=True)
-        with open(tmp.name, 'wb+') as f:
-            f.write(resp.content)
-            f.seek(0)
+        with download(url) as f:
             obj: Image = cls(name=os.path.basename(url))
-            obj.image.save(obj.name, f)
+            obj.store_file(f, obj.name)
             obj.save()
             return obj
 
@@ -137,23 +234,47 @@ class Image(AbstractAttachment,
         """ 将外部链接的图片固化到本地 """
         if not self.ext_url:
             return
-        resp = requests.get(self.ext_url)
-        tmp = tempfile.NamedTemporaryFile(delete=True)
-        with open(tmp.name, 'wb+') as f:
-            f.write(resp.content)
-            f.seek(0)
+        with download(self.ext_url) as f:
             self.name = os.path.basename(self.ext_url)
             self.ext_url = ''
-            self.image.save(self.name, f)
+            self.store_file(f, self.name)
             self.save()
             return self
 
+    def _freeze_file(self):
+        """ 下载外部链接并写入存储，不保存数据库记录，供 freeze_many 在线程中调用 """
+        with download(self.ext_url) as f:
+            self.name = os.path.basename(self.ext_url)
+            self.store_file(f, self.name, query_db=False)
+        self.ext_url = ''
+        return self
+
+    @classmethod
+    def freeze_many(cls, queryset, concurrency=8):
+        """ 批量将外部链接的图片固化到本地
+        使用线程池并发下载，全部完成后通过 bulk_update 一次写回
+        :param queryset: 需要固化的图片集合，没有 ext_url 的对象会被忽略
+        :param concurrency: 并发下载的线程数
+        :return: (成功固化的对象列表, {对象: 异常})
+        """
+        objects = [obj for obj in queryset if obj.ext_url]
+        frozen, errors = [], {}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [(obj, executor.submit(obj._freeze_file)) for obj in objects]
+            for obj, future in futures:
+                try:
+                    frozen.append(future.result())
+                except Exception as e:
+                    errors[obj] = e
+        cls.objects.bulk_update(frozen, ['name', 'ext_url', 'image', 'content_hash'], batch_size=500)
+        return frozen, errors
 
 
 class Video(AbstractAttachment,
             models.Model):
     """ 视频对象
     """
+    FILE_FIELD_NAME = 'video'
 
     video = models.FileField(
         verbose_name='视频',
@@ -176,6 +297,7 @@ class Audio(AbstractAttachment,
             models.Model):
     """ 音频对象
     """
+    FILE_FIELD_NAME = 'audio'
 
     audio = models.FileField(
         verbose_name='音频',
@@ -199,6 +321,14 @@ class Audio(AbstractAttachment,
         super().save(*args, **kwargs)
 
 
+class GalleryQuerySet(models.QuerySet):
+
+    def with_gallery_urls(self):
+        """ 一次查询预取所有对象的图片，列表中输出 images_url 时使用 """
+        return self.prefetch_related(models.Prefetch(
+            'images', queryset=Image.objects.only('id', 'image', 'ext_url')))
+
+
 class GalleryModel(models.Model):
     images = models.ManyToManyField(
         verbose_name='图片',
@@ -207,11 +337,14 @@ class GalleryModel(models.Model):
         blank=True,
     )
 
+    objects = GalleryQuerySet.as_manager()
+
     class Meta:
         abstract = True
 
     @property
     def images_url(self):
+        """ 图片链接列表，queryset 经过 with_gallery_urls() 预取时不再产生查询 """
         return [img.url() for img in self.images.all()]
 
 
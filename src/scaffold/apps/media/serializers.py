@@ -1,5 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
 from . import models as m
+from . import thumbnails
 
 
 class AttachmentSerializer(serializers.ModelSerializer):
@@ -18,3 +20,20 @@ class ImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = m.Image
         fields = '__all__'
+
+
+class VariantSerializer(serializers.Serializer):
+    """ 缩略图/派生图的查询参数 """
+    width = serializers.IntegerField(min_value=0, default=0)
+    height = serializers.IntegerField(min_value=0, default=0)
+    fit = serializers.ChoiceField(choices=sorted(thumbnails.FIT_CHOICES), default=thumbnails.FIT_CONTAIN)
+    format = serializers.ChoiceField(choices=sorted(thumbnails.FORMAT_CHOICES), default='', allow_blank=True)
+    quality = serializers.IntegerField(min_value=1, max_value=95, default=80)
+
+    def validate(self, attrs):
+        max_size = getattr(settings, 'SCAFFOLD_THUMBNAIL_MAX_SIZE', 2048)
+        if not attrs['width'] and not attrs['height']:
+            raise serializers.ValidationError('width 和 height 至少指定一个')
+        if attrs['width'] > max_size or attrs['height'] > max_size:
+            raise serializers.ValidationError('尺寸不能超过 {}'.format(max_size))
+        return attrs
@@ -0,0 +1,180 @@
+""" 图片缩略图/派生图
+按需生成指定尺寸、裁剪方式、格式和质量的派生图，存放在原图旁边，文件名由参数确定，
+生成过一次之后直接返回已有的文件。
+
+生成在独立的线程池中进行，同一个派生图的并发请求只会生成一次。
+
+相关配置：
+
+- SCAFFOLD_THUMBNAIL_WORKERS: 同时生成派生图的最大线程数，默认 2
+- SCAFFOLD_THUMBNAIL_MAX_PENDING: 等待生成的最大数量，超过时直接返回原图，默认 50
+- SCAFFOLD_THUMBNAIL_MAX_SIZE: 派生图宽高的上限，默认 2048
+- SCAFFOLD_THUMBNAIL_TIMEOUT: 等待生成的最长时间（秒），超时返回原图，默认 10
+"""
+import io
+import logging
+import os.path
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image as PILImage, ImageOps
+
+from scaffold.exceptions.exceptions import AppError
+
+__all__ = (
+    'FIT_CONTAIN',
+    'FIT_COVER',
+    'FIT_FILL',
+    'VARIANT_PATTERN',
+    'variant_name',
+    'get_variant',
+    'delete_variants',
+)
+
+logger = logging.getLogger(__name__)
+
+FIT_CONTAIN = 'contain'
+FIT_COVER = 'cover'
+FIT_FILL = 'fill'
+FIT_CHOICES = (FIT_CONTAIN, FIT_COVER, FIT_FILL)
+
+FORMAT_CHOICES = {
+    'jpg': 'JPEG',
+    'jpeg': 'JPEG',
+    'png': 'PNG',
+    'webp': 'WEBP',
+}
+
+# 派生图的文件名：<原图去掉扩展名>.w200h200-cover-q80.webp
+VARIANT_PATTERN = re.compile(r'^(.+)\.w\d+h\d+-\w+-q\d+\.\w+$')
+
+_executor = None
+_pending = dict()
+_lock = threading.Lock()
+# 已经确认存在的派生图，避免每次都访问存储
+_existing = OrderedDict()
+_EXISTING_SIZE = 4096
+
+
+def variant_name(name, width=0, height=0, fit=FIT_CONTAIN, format='', quality=80):
+    """ 派生图的存放路径，例如 images/ab/cd/xxx.png -> images/ab/cd/xxx.w200h200-cover-q80.webp
+    :raise AppError: 参数不合法时
+    """
+    max_size = getattr(settings, 'SCAFFOLD_THUMBNAIL_MAX_SIZE', 2048)
+    base, ext = os.path.splitext(name)
+    format = (format or ext[1:]).lower()
+    if fit not in FIT_CHOICES or format not in FORMAT_CHOICES \
+            or not 0 <= width <= max_size or not 0 <= height <= max_size \
+            or not (width or height) or not 1 <= quality <= 95:
+        raise AppError(-1, '缩略图参数不正确', data=dict(
+            width=width, height=height, fit=fit, format=format, quality=quality))
+    return '{}.w{}h{}-{}-q{}.{}'.format(base, width, height, fit, quality, format)
+
+
+def render(field_file, target, width, height, fit, format, quality):
+    """ 生成派生图并写入存储 """
+    with field_file.storage.open(field_file.name, 'rb') as f:
+        img = ImageOps.exif_transpose(PILImage.open(f))
+        if not width or not height:
+            # 只指定一边时按比例缩放
+            ratio = (width or height) / (img.width if width else img.height)
+            width, height = width or round(img.width * ratio), height or round(img.height * ratio)
+            fit = FIT_FILL
+        if fit == FIT_COVER:
+            img = ImageOps.fit(img, (width, height), PILImage.LANCZOS)
+        elif fit == FIT_FILL:
+            img = img.resize((width, height), PILImage.LANCZOS)
+        else:
+            img.thumbnail((width, height), PILImage.LANCZOS)
+    image_format = FORMAT_CHOICES[format]
+    if image_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, image_format, quality=quality)
+    if not field_file.storage.exists(target):
+        field_file.storage.save(target, ContentFile(buffer.getvalue()))
+    return target
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'SCAFFOLD_THUMBNAIL_WORKERS', 2),
+                    thread_name_prefix='scaffold-thumbnail',
+                )
+    return _executor
+
+
+def remember(target):
+    with _lock:
+        _existing[target] = True
+        _existing.move_to_end(target)
+        while len(_existing) > _EXISTING_SIZE:
+            _existing.popitem(last=False)
+
+
+def get_variant(field_file, width=0, height=0, fit=FIT_CONTAIN, format='', quality=80):
+    """ 获取派生图的存储路径，不存在时交给线程池生成
+    :param field_file: 原图的 FieldFile
+    :return: 派生图的存储路径；排队过多或者等待超时的时候返回 None，调用方应当退回原图
+    """
+    target = variant_name(field_file.name, width, height, fit, format, quality)
+    if target in _existing:
+        return target
+    if field_file.storage.exists(target):
+        remember(target)
+        return target
+    executor = get_executor()
+    submitted = False
+    with _lock:
+        future = _pending.get(target)
+        if future is None:
+            if len(_pending) >= getattr(settings, 'SCAFFOLD_THUMBNAIL_MAX_PENDING', 50):
+                return None
+            format = (format or os.path.splitext(field_file.name)[1][1:]).lower()
+            future = _pending[target] = executor.submit(
+                render, field_file, target, width, height, fit, format, quality)
+            submitted = True
+    if submitted:
+        # 在锁外注册：已经完成的 future 会在当前线程立即执行回调
+        future.add_done_callback(lambda f: forget_pending(target))
+    try:
+        future.result(timeout=getattr(settings, 'SCAFFOLD_THUMBNAIL_TIMEOUT', 10))
+    except (TimeoutError, OSError, PILImage.DecompressionBombError):
+        # 超时、原图无法解析或者像素数超过 Pillow 的安全上限
+        return None
+    remember(target)
+    return target
+
+
+def forget_pending(target):
+    with _lock:
+        _pending.pop(target, None)
+
+
+def delete_variants(storage, name):
+    """ 删除原图 name 的所有派生图，原图删除时由 cleanup 模块调用 """
+    directory, filename = os.path.split(name)
+    base = os.path.splitext(filename)[0]
+    try:
+        files = storage.listdir(directory)[1]
+    except (FileNotFoundError, NotImplementedError):
+        return
+    prefix = directory + '/' if directory else ''
+    for file in files:
+        match = VARIANT_PATTERN.match(file)
+        if match and match.group(1) == base:
+            target = prefix + file
+            with _lock:
+                _existing.pop(target, None)
+            try:
+                storage.delete(target)
+            except Exception:
+                logger.warning('Failed to delete image variant %s', target, exc_info=True)
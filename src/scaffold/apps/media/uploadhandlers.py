@@ -0,0 +1,60 @@
+""" 上传过程中计算文件内容哈希
+在 FILE_UPLOAD_HANDLERS 中使用这里的处理器替换 django 默认的处理器，
+上传的文件对象会带上 content_hash 属性，保存附件时不需要再次读取文件内容。
+"""
+import hashlib
+
+from django.core.files import File
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+__all__ = (
+    'get_content_hash',
+    'HashingMemoryFileUploadHandler',
+    'HashingTemporaryFileUploadHandler',
+)
+
+HASH_ALGORITHM = 'sha256'
+
+
+def get_content_hash(content):
+    """ 获取文件内容的哈希
+    如果文件在上传或者下载的过程中已经计算过（content_hash 属性），直接返回，
+    否则分块读取文件计算
+    """
+    for obj in (content, getattr(content, 'file', None)):
+        digest = getattr(obj, 'content_hash', None)
+        if digest:
+            return digest
+    hasher = hashlib.new(HASH_ALGORITHM)
+    if not hasattr(content, 'chunks'):
+        content = File(content)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+class HashingUploadHandlerMixin(object):
+
+    def new_file(self, *args, **kwargs):
+        # 需要在 super 之前创建，MemoryFileUploadHandler 会抛出 StopFutureHandlers
+        self.hasher = hashlib.new(HASH_ALGORITHM)
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
@@ -1,14 +1,33 @@
+from django.shortcuts import redirect
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.negotiation import DefaultContentNegotiation
 
 from . import models as m
 from . import serializers as s
 
 
+class RedirectNegotiation(DefaultContentNegotiation):
+    """ 重定向没有响应体，query 参数里的 format 不作为 DRF 的输出格式 """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
 class ImageViewSet(viewsets.ModelViewSet):
     queryset = m.Image.objects.all()
     serializer_class = s.ImageSerializer
     filter_fields = '__all__'
 
+    @action(methods=['GET'], detail=True, content_negotiation_class=RedirectNegotiation)
+    def variant(self, request, pk=None):
+        """ 重定向到缩略图/派生图
+        ?width=200&height=200&fit=cover&format=webp&quality=80
+        """
+        serializer = s.VariantSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return redirect(self.get_object().variant_url(**serializer.validated_data))
+
 
 class AttachmentViewSet(viewsets.ModelViewSet):
     queryset = m.Attachment.objects.all()
@@ -0,0 +1,6 @@
+from django.contrib import admin
+
+from . import models as m
+
+admin.site.register(m.SearchHistory)
+admin.site.register(m.SearchTerm)
@@ -0,0 +1,129 @@
+""" 搜索历史
+搜索时调用 record(user, term) 入队，由后台线程批量写入：
+
+- SearchHistory: 每个用户最近 SCAFFOLD_SEARCH_HISTORY_SIZE（默认 10）个不重复的搜索词；
+- SearchTerm: 搜索词的累计次数。
+
+查询使用 recent_terms(user) 和 popular_terms()，都走索引，不需要读写会员记录。
+
+设置 SCAFFOLD_ASYNC_SEARCH_HISTORY = False 可以改为同步写入（例如测试环境）。
+"""
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from scaffold.utils.worker import BatchWorker
+from .models import SearchHistory, SearchTerm
+
+__all__ = (
+    'HistoryWriter',
+    'writer',
+    'record',
+    'recent_terms',
+    'popular_terms',
+)
+
+logger = logging.getLogger(__name__)
+
+TERM_MAX_LENGTH = 255
+
+
+class HistoryWriter(BatchWorker):
+    """ 后台批量写入搜索历史 """
+    name = 'scaffold-search-history'
+    batch_size = 500
+
+    def __init__(self):
+        super().__init__(getattr(settings, 'SCAFFOLD_SEARCH_HISTORY_QUEUE_SIZE', 10000))
+
+    def record(self, user_id, term, date_searched):
+        if not getattr(settings, 'SCAFFOLD_ASYNC_SEARCH_HISTORY', True):
+            return self.write([(user_id, term, date_searched)])
+        if not self.put((user_id, term, date_searched)):
+            logger.warning('Search history queue is full, dropping %r', term)
+
+    def process(self, batch):
+        self.write(batch)
+
+    @classmethod
+    def write(cls, batch):
+        with transaction.atomic():
+            cls.write_histories(batch)
+        with transaction.atomic():
+            cls.write_terms(batch)
+
+    @staticmethod
+    def write_histories(batch):
+        """ 写入各用户的环形缓冲：已有的搜索词更新时间，否则占用空槽位或者覆盖最早的槽位 """
+        size = getattr(settings, 'SCAFFOLD_SEARCH_HISTORY_SIZE', 10)
+        batch = [item for item in batch if item[0] is not None]
+        if not batch:
+            return
+        rows = defaultdict(dict)
+        for item in SearchHistory.objects.filter(user_id__in={user_id for user_id, _, _ in batch}):
+            rows[item.user_id][item.slot] = item
+        created, updated = [], set()
+        for user_id, term, date_searched in batch:
+            slots = rows[user_id]
+            item = next((item for item in slots.values() if item.term == term), None)
+            if item is None:
+                free = next((slot for slot in range(size) if slot not in slots), None)
+                if free is None:
+                    item = min(slots.values(), key=lambda i: i.date_searched)
+                    item.term = term
+                else:
+                    item = slots[free] = SearchHistory(user_id=user_id, slot=free, term=term)
+                    created.append(item)
+            item.date_searched = date_searched
+            if item.pk is not None:
+                updated.add(item)
+        if updated:
+            SearchHistory.objects.bulk_update(updated, ['term', 'date_searched'])
+        if created:
+            # 其他进程同时写入了同一个槽位时只跳过冲突的记录
+            SearchHistory.objects.bulk_create(created, ignore_conflicts=True)
+
+    @staticmethod
+    def write_terms(batch):
+        """ 累加搜索次数，每个不同的增量一条 UPDATE """
+        counter = Counter(term for _, term, _ in batch)
+        date_searched = max(date for _, _, date in batch)
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=term) for term in counter], ignore_conflicts=True)
+        increments = defaultdict(list)
+        for term, count in counter.items():
+            increments[count].append(term)
+        for count, terms in increments.items():
+            SearchTerm.objects.filter(term__in=terms).update(
+                count=models.F('count') + count, date_searched=date_searched)
+
+
+writer = HistoryWriter()
+
+
+def record(user, term):
+    """ 记录一次搜索，匿名用户只计入热门搜索 """
+    term = (term or '').strip()[:TERM_MAX_LENGTH]
+    if not term:
+        return
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    writer.record(user_id, term, timezone.now())
+
+
+def recent_terms(user, limit=None):
+    """ 用户最近的搜索词，由近到远 """
+    if user is None or not user.is_authenticated:
+        return []
+    queryset = SearchHistory.objects.filter(user=user).order_by('-date_searched')
+    return list(queryset.values_list('term', flat=True)[:limit])
+
+
+def popular_terms(limit=10, prefix=''):
+    """ 热门搜索词，可以按前缀筛选（用于搜索提示） """
+    queryset = SearchTerm.objects.order_by('-count')
+    if prefix:
+        queryset = queryset.filter(term__startswith=prefix)
+    return list(queryset.values_list('term', flat=True)[:limit])
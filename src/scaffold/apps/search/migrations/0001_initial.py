@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=255, unique=True, verbose_name='搜索词')),
+                ('count', models.BigIntegerField(db_index=True, default=0, verbose_name='搜索次数')),
+                ('date_searched', models.DateTimeField(blank=True, null=True, verbose_name='最后搜索时间')),
+            ],
+            options={
+                'verbose_name': '搜索词',
+                'verbose_name_plural': '搜索词',
+                'db_table': 'base_search_term',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchHistory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='槽位')),
+                ('term', models.CharField(max_length=255, verbose_name='搜索词')),
+                ('date_searched', models.DateTimeField(verbose_name='搜索时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_histories', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '搜索历史',
+                'verbose_name_plural': '搜索历史',
+                'db_table': 'base_search_history',
+                'unique_together': {('user', 'slot')},
+                'index_together': {('user', 'date_searched')},
+            },
+        ),
+    ]
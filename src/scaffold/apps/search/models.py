@@ -0,0 +1,69 @@
+from django.db import models
+
+
+class SearchHistory(models.Model):
+    """ 用户搜索历史
+    每个用户固定 SCAFFOLD_SEARCH_HISTORY_SIZE 个槽位（环形缓冲），
+    新的搜索词覆盖最早的槽位，重复搜索只更新时间。
+    通过 scaffold.apps.search.history 写入和查询，不要直接修改。
+    """
+
+    user = models.ForeignKey(
+        verbose_name='用户',
+        to='auth.User',
+        related_name='search_histories',
+        on_delete=models.CASCADE,
+    )
+
+    slot = models.PositiveSmallIntegerField(
+        verbose_name='槽位',
+    )
+
+    term = models.CharField(
+        verbose_name='搜索词',
+        max_length=255,
+    )
+
+    date_searched = models.DateTimeField(
+        verbose_name='搜索时间',
+    )
+
+    class Meta:
+        verbose_name = '搜索历史'
+        verbose_name_plural = '搜索历史'
+        unique_together = [('user', 'slot')]
+        index_together = [('user', 'date_searched')]
+        db_table = 'base_search_history'
+
+    def __str__(self):
+        return '{}: {}'.format(self.user_id, self.term)
+
+
+class SearchTerm(models.Model):
+    """ 搜索词的累计次数，用于热门搜索 """
+
+    term = models.CharField(
+        verbose_name='搜索词',
+        max_length=255,
+        unique=True,
+    )
+
+    count = models.BigIntegerField(
+        verbose_name='搜索次数',
+        default=0,
+        db_index=True,
+    )
+
+    date_searched = models.DateTimeField(
+        verbose_name='最后搜索时间',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = '搜索词'
+        verbose_name_plural = '搜索词'
+        db_table = 'base_search_term'
+
+    def __str__(self):
+        return '{} ({})'.format(self.term, self.count)
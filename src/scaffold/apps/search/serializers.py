@@ -0,0 +1,7 @@
+from rest_framework import serializers
+
+
+class PopularTermsSerializer(serializers.Serializer):
+    """ 热门搜索词的查询参数 """
+    prefix = serializers.CharField(default='', allow_blank=True, trim_whitespace=False, max_length=255)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
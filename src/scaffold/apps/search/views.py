@@ -0,0 +1,24 @@
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import history
+from . import serializers as s
+
+
+class SearchHistoryViewSet(viewsets.ViewSet):
+    """ 搜索历史以及热门搜索 """
+
+    @action(methods=['GET'], detail=False)
+    def recent(self, request):
+        """ 当前用户最近的搜索词 """
+        return Response(history.recent_terms(request.user))
+
+    @action(methods=['GET'], detail=False)
+    def popular(self, request):
+        """ 热门搜索词
+        ?prefix=手机&limit=10
+        """
+        serializer = s.PopularTermsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(history.popular_terms(**serializer.validated_data))
@@ -0,0 +1,45 @@
+""" System checks for the database settings, run on startup (runserver, migrate, check)
+
+Registered by the ready() of scaffold.restframework, which every scaffold
+project installs, so they run without adding scaffold.modules.
+
+* scaffold.W001: CONN_MAX_AGE is 0 on a networked database, so every request
+  pays a full connect (TCP + auth + init_command) round trip;
+* scaffold.W002: MyISAM is the default storage engine, which takes table locks
+  on every write and has no transactions (see docs/database.rst).
+
+Silence them with settings.SILENCED_SYSTEM_CHECKS if intended.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+__all__ = (
+    'check_database_connections',
+)
+
+
+@register(Tags.compatibility)
+def check_database_connections(app_configs=None, **kwargs):
+    errors = []
+    for alias, db in settings.DATABASES.items():
+        engine = db.get('ENGINE', '')
+        if engine.endswith('sqlite3') or engine.endswith('dummy'):
+            continue
+        if db.get('CONN_MAX_AGE', 0) == 0 and 'POOL_OPTIONS' not in db:
+            errors.append(Warning(
+                f'Database "{alias}" opens a new connection for every request.',
+                hint='Set CONN_MAX_AGE (env DJANGO_DB_CONN_MAX_AGE) to keep '
+                     'connections open, or configure a connection pool '
+                     '(env DJANGO_DB_POOL_SIZE).',
+                id='scaffold.W001',
+            ))
+        init_command = db.get('OPTIONS', {}).get('init_command', '')
+        if 'myisam' in init_command.lower():
+            errors.append(Warning(
+                f'Database "{alias}" uses MyISAM as the default storage engine.',
+                hint='MyISAM locks the whole table on writes and ignores transactions, '
+                     'use InnoDB (env DJANGO_DB_STORAGE_ENGINE) and see '
+                     'docs/database.rst to convert existing tables.',
+                id='scaffold.W002',
+            ))
+    return errors
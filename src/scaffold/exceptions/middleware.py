@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 
 from .exceptions import AppError
+from .reporter import reporter
 from ..utils.http import response_fail
 
 
@@ -8,12 +10,7 @@ class AppErrorMiddleware(MiddlewareMixin):
     @staticmethod
     def process_exception(request, exception):
         if isinstance(exception, AppError):
-            import traceback
-            from sys import stderr
-            from django.conf import settings
-            # TODO: Collect error to message queue
-            if exception.debug or settings.API_DEBUG:
-                print(traceback.format_exc(), file=stderr)
+            reporter.report(exception, capture=exception.debug or settings.API_DEBUG)
             return response_fail(
                 exception.messages[0],
                 exception.code,
@@ -21,4 +18,3 @@ class AppErrorMiddleware(MiddlewareMixin):
                 data=exception.data,
                 silent=exception.silent,
             )
-
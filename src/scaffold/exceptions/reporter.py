@@ -0,0 +1,138 @@
+""" 异常收集器
+将中间件捕获到的异常按指纹（异常类型 + 抛出位置）聚合计数，
+限流采样后的 traceback 格式化为字符串入队，由后台线程批量输出。
+
+相关配置：
+
+- SCAFFOLD_ERROR_SAMPLE_RATE: traceback 采样率，默认 1.0（全部采集）
+- SCAFFOLD_ERROR_TRACEBACK_LIMIT: 每个指纹在一个时间窗口内最多输出的 traceback 数量，默认 5
+- SCAFFOLD_ERROR_WINDOW: 限流时间窗口（秒），默认 60
+- SCAFFOLD_ERROR_QUEUE_SIZE: 待输出队列长度，队列满时直接丢弃并计数，默认 1000
+- SCAFFOLD_ERROR_BATCH_SIZE: 后台线程单次合并输出的最大条数，默认 50
+
+DEBUG 模式下不做采样和限流。
+
+计数快照可以通过 scaffold.exceptions.urls 中的 error_stats 接口（仅限管理员）采集：
+
+    urlpatterns = [
+        path('api/', include('scaffold.exceptions.urls')),
+    ]
+"""
+import random
+import sys
+import threading
+import traceback
+from collections import Counter
+from time import time
+
+from django.conf import settings
+
+from ..utils.worker import BatchWorker
+
+__all__ = (
+    'ErrorReporter',
+    'reporter',
+)
+
+
+class ErrorReporter(BatchWorker):
+    """ 异常计数、限流采样以及异步批量输出 """
+    name = 'scaffold-error-reporter'
+
+    def __init__(self, stream=None):
+        super().__init__(getattr(settings, 'SCAFFOLD_ERROR_QUEUE_SIZE', 1000))
+        self.stream = stream
+        self.sample_rate = getattr(settings, 'SCAFFOLD_ERROR_SAMPLE_RATE', 1.0)
+        self.traceback_limit = getattr(settings, 'SCAFFOLD_ERROR_TRACEBACK_LIMIT', 5)
+        self.window = getattr(settings, 'SCAFFOLD_ERROR_WINDOW', 60)
+        self.batch_size = getattr(settings, 'SCAFFOLD_ERROR_BATCH_SIZE', 50)
+        self.lock = threading.Lock()
+        # 按异常类名计数
+        self.class_counter = Counter()
+        # 按指纹计数
+        self.fingerprint_counter = Counter()
+        # fingerprint -> [窗口开始时间, 窗口内已输出数量, 被抑制的数量]
+        self.windows = dict()
+        # 下次清理过期窗口的时间
+        self.next_purge = 0
+        self.dropped = 0
+
+    @staticmethod
+    def fingerprint(exception):
+        """ 异常指纹：异常类型加上最内层抛出位置，不需要格式化整个 traceback """
+        tb = exception.__traceback__
+        if tb is None:
+            return type(exception).__qualname__
+        while tb.tb_next is not None:
+            tb = tb.tb_next
+        code = tb.tb_frame.f_code
+        return '{}@{}:{}'.format(type(exception).__qualname__, code.co_filename, tb.tb_lineno)
+
+    def report(self, exception, capture=True):
+        """ 记录一个异常
+        :param exception: 捕获到的异常对象
+        :param capture: 是否需要输出 traceback，不需要时只计数
+        """
+        key = self.fingerprint(exception)
+        with self.lock:
+            self.class_counter[type(exception).__qualname__] += 1
+            self.fingerprint_counter[key] += 1
+            if not capture:
+                return
+            suppressed = 0
+            if not settings.DEBUG:
+                now = time()
+                if now >= self.next_purge:
+                    self.purge_windows(now)
+                window = self.windows.get(key)
+                if window is None or now - window[0] > self.window:
+                    window = self.windows[key] = [now, 0, 0]
+                if window[1] >= self.traceback_limit or random.random() >= self.sample_rate:
+                    window[2] += 1
+                    return
+                window[1] += 1
+                suppressed, window[2] = window[2], 0
+        # 入队前格式化为字符串，不让队列持有 traceback 引用的栈帧和局部变量，
+        # 限流之后需要格式化的数量是有限的
+        text = ''.join(traceback.format_exception(
+            type(exception), exception, exception.__traceback__))
+        if not self.put((key, text, suppressed)):
+            with self.lock:
+                self.dropped += 1
+
+    def purge_windows(self, now):
+        """ 删除已经过期的限流窗口，调用方需要持有 self.lock """
+        self.windows = {
+            key: window for key, window in self.windows.items()
+            if now - window[0] <= self.window
+        }
+        self.next_purge = now + self.window
+
+    def snapshot(self):
+        """ 供运维采集的计数快照 """
+        with self.lock:
+            return dict(
+                classes=dict(self.class_counter),
+                fingerprints=dict(self.fingerprint_counter),
+                dropped=self.dropped,
+                pending=self.queue.qsize(),
+            )
+
+    def process(self, batch):
+        self.write(batch)
+
+    def write(self, batch):
+        chunks = []
+        for key, text, suppressed in batch:
+            if suppressed:
+                chunks.append('[{}] {} similar errors suppressed\n'.format(key, suppressed))
+            chunks.append(text)
+        stream = self.stream or sys.stderr
+        try:
+            stream.write(''.join(chunks))
+            stream.flush()
+        except Exception:
+            pass
+
+
+reporter = ErrorReporter()
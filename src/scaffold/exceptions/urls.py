@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('error_stats/', views.error_stats, name='error_stats'),
+]
@@ -0,0 +1,9 @@
+from .reporter import reporter
+from ..utils.http import response_success, response_fail
+
+
+def error_stats(request):
+    """ 异常计数快照，供运维采集，仅限管理员访问 """
+    if not request.user.is_staff:
+        return response_fail('权限不足', status=403)
+    return response_success(data=reporter.snapshot())
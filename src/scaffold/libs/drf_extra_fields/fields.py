@@ -1,11 +1,17 @@
 import base64
 import binascii
+import hashlib
 import imghdr
+import io
+import mimetypes
+import os
+import threading
 import uuid
+from collections import OrderedDict
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
-from django.utils import six
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework.fields import (
@@ -28,6 +34,106 @@ from .compat import (
 
 DEFAULT_CONTENT_TYPE = "application/octet-stream"
 
+# Number of base64 characters decoded at a time, must be a multiple of 4.
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+def iter_base64_decode(data, start=0, chunk_size=BASE64_CHUNK_SIZE):
+    """
+    Decode the base64 string `data` from `start` chunk by chunk, without
+    copying the whole string. Whitespace is ignored.
+    """
+    rest = ''
+    for offset in range(start, len(data), chunk_size):
+        piece = rest + ''.join(data[offset:offset + chunk_size].split())
+        cut = len(piece) - len(piece) % 4
+        rest = piece[cut:]
+        if cut:
+            yield base64.b64decode(piece[:cut])
+    if rest:
+        yield base64.b64decode(rest)
+
+
+class Base64Cache(object):
+    """
+    LRU cache of base64 encoded files keyed by (path, mtime, size), bounded
+    by the total length of the cached strings.
+    The budget defaults to settings.BASE64_CACHE_MAX_BYTES (16M), 0 disables it.
+    """
+
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total = 0
+        self.lock = threading.Lock()
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is None:
+            return getattr(settings, 'BASE64_CACHE_MAX_BYTES', 16 * 1024 * 1024)
+        return self._max_bytes
+
+    def get(self, path):
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                return value
+        with open(path, 'rb') as f:
+            value = base64.b64encode(f.read()).decode()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        max_bytes = self.max_bytes
+        if len(value) > max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = value
+            self.total += len(value)
+            while self.total > max_bytes:
+                self.total -= len(self.entries.popitem(last=False)[1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total = 0
+
+
+base64_cache = Base64Cache()
+
+
+class Base64Stream(object):
+    """
+    A lazily encoded base64 representation of a file.
+    `json_chunks()` yields the encoded string piece by piece so that a streaming
+    JSON encoder (scaffold.utils.fastjson.iterdumps) never holds the whole
+    payload; `str()` materializes it for regular renderers.
+    """
+    # Bytes read per chunk, a multiple of 3 so the pieces concatenate cleanly.
+    read_size = 3 * 16 * 1024
+
+    def __init__(self, path):
+        self.path = path
+
+    def json_chunks(self):
+        with open(self.path, 'rb') as f:
+            while True:
+                data = f.read(self.read_size)
+                if not data:
+                    break
+                yield base64.b64encode(data).decode()
+
+    def __str__(self):
+        return ''.join(self.json_chunks())
+
+    def __repr__(self):
+        return '<Base64Stream: {}>'.format(self.path)
+
 
 class Base64FieldMixin(object):
     ALLOWED_TYPES = NotImplemented
@@ -35,8 +141,15 @@ class Base64FieldMixin(object):
     INVALID_TYPE_MESSAGE = NotImplemented
     EMPTY_VALUES = (None, '', [], (), {})
 
+    INVALID_SIZE_MESSAGE = _("The file is too large.")
+
     def __init__(self, *args, **kwargs):
         self.represent_in_base64 = kwargs.pop('represent_in_base64', False)
+        # Represent as a Base64Stream, encoded while the response is written.
+        self.stream_base64 = kwargs.pop('stream_base64', False)
+        # Maximum decoded size in bytes, defaults to settings.BASE64_FILE_MAX_SIZE (unlimited).
+        self.max_decoded_size = kwargs.pop(
+            'max_decoded_size', getattr(settings, 'BASE64_FILE_MAX_SIZE', None))
         super(Base64FieldMixin, self).__init__(*args, **kwargs)
 
     def to_internal_value(self, base64_data):
@@ -44,35 +157,78 @@ class Base64FieldMixin(object):
         if base64_data in self.EMPTY_VALUES:
             return None
 
-        if isinstance(base64_data, six.string_types):
-            # Strip base64 header.
-            if ';base64,' in base64_data:
-                header, base64_data = base64_data.split(';base64,')
+        if isinstance(base64_data, str):
+            # Skip the base64 header without copying the payload.
+            start = base64_data.find(';base64,')
+            start = 0 if start < 0 else start + len(';base64,')
+
+            # Reject clearly oversized payloads before decoding anything,
+            # leaving some slack for line breaks inside the base64 string.
+            if self.max_decoded_size is not None \
+                    and (len(base64_data) - start) * 3 // 4 > self.max_decoded_size * 1.02 + 3:
+                raise ValidationError(self.INVALID_SIZE_MESSAGE)
 
-            # Try to decode the file. Return validation error if it fails.
-            try:
-                decoded_file = base64.b64decode(base64_data)
-            except (TypeError, binascii.Error):
-                raise ValidationError(self.INVALID_FILE_MESSAGE)
             # Generate file name:
             file_name = str(uuid.uuid4())[:12]  # 12 characters are more than enough.
-            # Get the file name extension:
-            file_extension = self.get_file_extension(file_name, decoded_file)
-            if file_extension not in self.ALLOWED_TYPES:
-                raise ValidationError(self.INVALID_TYPE_MESSAGE)
-            complete_file_name = file_name + "." + file_extension
-            data = ContentFile(decoded_file, name=complete_file_name)
+            data = self.decode_to_file(base64_data, start, file_name)
             return super(Base64FieldMixin, self).to_internal_value(data)
         return super(Base64FieldMixin, self).to_internal_value(base64_data)
 
+    def decode_to_file(self, base64_data, start, file_name):
+        """
+        Decode chunk by chunk into an uploaded file object, kept in memory
+        below FILE_UPLOAD_MAX_MEMORY_SIZE and spooled to a temporary file
+        above it. The type is sniffed from the first decoded chunk.
+        """
+        file = io.BytesIO()
+        hasher = hashlib.sha256()
+        complete_file_name = content_type = None
+        size = 0
+        try:
+            for chunk in iter_base64_decode(base64_data, start):
+                if complete_file_name is None:
+                    # Get the file name extension:
+                    file_extension = self.get_file_extension(file_name, chunk)
+                    if file_extension not in self.ALLOWED_TYPES:
+                        raise ValidationError(self.INVALID_TYPE_MESSAGE)
+                    complete_file_name = file_name + "." + file_extension
+                    content_type = mimetypes.guess_type(complete_file_name)[0] or DEFAULT_CONTENT_TYPE
+                size += len(chunk)
+                if self.max_decoded_size is not None and size > self.max_decoded_size:
+                    raise ValidationError(self.INVALID_SIZE_MESSAGE)
+                if isinstance(file, io.BytesIO) and size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+                    spooled = TemporaryUploadedFile(complete_file_name, content_type, 0, None)
+                    spooled.write(file.getvalue())
+                    file = spooled
+                hasher.update(chunk)
+                file.write(chunk)
+        except (TypeError, binascii.Error):
+            # Try to decode the file. Return validation error if it fails.
+            file.close()
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        except ValidationError:
+            file.close()
+            raise
+        if complete_file_name is None:
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        file.seek(0)
+        if isinstance(file, io.BytesIO):
+            file = InMemoryUploadedFile(file, None, complete_file_name, content_type, size, None)
+        else:
+            file.size = size
+        # Used by scaffold.apps.media to deduplicate the stored file without re-reading it.
+        file.content_hash = hasher.hexdigest()
+        return file
+
     def get_file_extension(self, filename, decoded_file):
         raise NotImplemented
 
     def to_representation(self, file):
-        if self.represent_in_base64:
+        if self.represent_in_base64 and file:
             try:
-                with open(file.path, 'rb') as f:
-                    return base64.b64encode(f.read()).decode()
+                if self.stream_base64:
+                    return Base64Stream(file.path)
+                return base64_cache.get(file.path)
             except Exception:
                 raise IOError("Error encoding file")
         else:
@@ -135,13 +291,13 @@ class RangeField(DictField):
                 value = data.pop(key)
             except KeyError:
                 continue
-            validated_dict[six.text_type(key)] = self.child.run_validation(value)
+            validated_dict[str(key)] = self.child.run_validation(value)
         for key in ('bounds', 'empty'):
             try:
                 value = data.pop(key)
             except KeyError:
                 continue
-            validated_dict[six.text_type(key)] = value
+            validated_dict[str(key)] = value
         if data:
             self.fail('too_much_content', extra=', '.join(map(str, data.keys())))
         return self.range_type(**validated_dict)
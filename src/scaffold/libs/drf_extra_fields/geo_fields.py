@@ -1,12 +1,18 @@
 import json
-from django.contrib.gis.geos import GEOSGeometry
+import struct
+
+from django.contrib.gis.geos import GEOSGeometry, LineString, MultiPoint, Point
 from django.contrib.gis.geos.error import GEOSException
 from django.utils.encoding import smart_str
-from django.utils import six
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import serializers
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 EMPTY_VALUES = (None, '', [], (), {})
 
 
@@ -34,7 +40,7 @@ class PointField(serializers.Field):
         if value in EMPTY_VALUES and not self.required:
             return None
 
-        if isinstance(value, six.string_types):
+        if isinstance(value, str):
             try:
                 value = value.replace("'", '"')
                 value = json.loads(value)
@@ -66,3 +72,107 @@ class PointField(serializers.Field):
                 "longitude": smart_str(value.x)
             }
         return value
+
+
+class PointListField(serializers.Field):
+    """
+    A field for handling a list of points (e.g. a GPS trace) as a compact
+    coordinate array, stored as a LineString (default) or MultiPoint.
+    Expected input format, in (longitude, latitude) order:
+        [[24.452545489, 49.8782482189424], [24.452601, 49.878302], ...]
+
+    Geometries are built through the GEOS coordinate sequence API (from a
+    NumPy array when NumPy is installed) and serialized back from the WKB
+    buffer, without formatting or parsing WKT per point.
+    """
+    type_name = 'PointListField'
+    type_label = 'points'
+
+    default_error_messages = {
+        'invalid': _('Enter a valid list of locations.'),
+        'min_length': _('Ensure this field has at least {min_length} points.'),
+        'max_length': _('Ensure this field has no more than {max_length} points.'),
+    }
+
+    def __init__(self, geometry_class=LineString, srid=None, max_length=None, **kwargs):
+        assert geometry_class in (LineString, MultiPoint), \
+            'geometry_class must be LineString or MultiPoint.'
+        self.geometry_class = geometry_class
+        self.srid = srid
+        self.min_length = 2 if geometry_class is LineString else 1
+        self.max_length = max_length
+        super(PointListField, self).__init__(**kwargs)
+
+    def to_internal_value(self, value):
+        """
+        Parse the coordinate array and return a geometry object
+        """
+        if value in EMPTY_VALUES and not self.required:
+            return None
+
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                self.fail('invalid')
+
+        coords = self.parse_coords(value)
+        if len(coords) < self.min_length:
+            self.fail('min_length', min_length=self.min_length)
+        if self.max_length is not None and len(coords) > self.max_length:
+            self.fail('max_length', max_length=self.max_length)
+        try:
+            if self.geometry_class is LineString:
+                return LineString(coords, srid=self.srid)
+            if numpy is not None:
+                coords = coords.tolist()
+            return MultiPoint([Point(x, y) for x, y in coords], srid=self.srid)
+        except (GEOSException, TypeError, ValueError):
+            self.fail('invalid')
+
+    def parse_coords(self, value):
+        """
+        Validate the input as an (n, 2) array of (longitude, latitude) pairs,
+        as a NumPy array when NumPy is installed, otherwise as a list of tuples.
+        """
+        if not isinstance(value, (list, tuple)):
+            self.fail('invalid')
+        if numpy is not None:
+            try:
+                coords = numpy.asarray(value, dtype=float)
+            except (TypeError, ValueError):
+                self.fail('invalid')
+            if coords.ndim != 2 or coords.shape[1] != 2 or not numpy.isfinite(coords).all() \
+                    or (numpy.abs(coords) > (180, 90)).any():
+                self.fail('invalid')
+            return coords
+        coords = []
+        try:
+            for longitude, latitude in value:
+                longitude, latitude = float(longitude), float(latitude)
+                if not (abs(longitude) <= 180 and abs(latitude) <= 90):
+                    self.fail('invalid')
+                coords.append((longitude, latitude))
+        except (TypeError, ValueError):
+            self.fail('invalid')
+        return coords
+
+    def to_representation(self, value):
+        """
+        Transform a LineString/MultiPoint object to a coordinate array.
+        """
+        if value is None:
+            return value
+
+        if isinstance(value, LineString):
+            # WKB of a line string: byte order (1), type (4), count (4), then the doubles.
+            wkb = memoryview(value.wkb)
+            dims = 3 if value.hasz else 2
+            if len(wkb) == 9 + 8 * dims * len(value):
+                order = '<' if wkb[0] == 1 else '>'
+                if numpy is not None:
+                    return numpy.frombuffer(wkb[9:], dtype=order + 'f8').reshape(-1, dims).tolist()
+                return [list(c) for c in struct.iter_unpack(order + 'd' * dims, wkb[9:])]
+        if isinstance(value, GEOSGeometry):
+            return [list(c) for c in value.coords]
+        return value
@@ -1,6 +1,15 @@
+import math
+from time import time
+
 from django.conf import settings
 from threading import currentThread
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.exceptions import SessionInterrupted
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import ValidationError
 from django.utils.deprecation import MiddlewareMixin
+from ..exceptions.reporter import reporter
+from ..utils import db_router
 from ..utils.http import response_fail
 
 _requests = {}
@@ -25,17 +34,13 @@ class CustomExceptionMiddleware(MiddlewareMixin):
 
     @staticmethod
     def process_exception(request, exception):
-        import traceback
-        from django.http import JsonResponse
-        from sys import stderr
-        from django.conf import settings
-        from django.core.exceptions import ValidationError
         # Retrieves the error message, response error message only.
         msg = exception.message if hasattr(exception, 'message') else str(exception)
-        # TODO: Collect error
-        # Bypass the exception raised but still print to stderr
-        if settings.DEBUG or type(exception) not in [AssertionError, ValidationError]:
-            print(traceback.format_exc(), file=stderr)
+        # Collect the error, traceback is printed to stderr asynchronously.
+        reporter.report(
+            exception,
+            capture=settings.DEBUG or type(exception) not in [AssertionError, ValidationError],
+        )
         # Return a client-recognizable format.
         return response_fail(msg=msg, errcode=-1, status=400)
 
@@ -90,35 +95,71 @@ class FullMediaUrlMiddleware(MiddlewareMixin):
 #             request.META['HTTP_X_CSRFTOKEN'] = csrftoken
 
 
-class ExplicitSessionMiddleware(MiddlewareMixin):
-    """ 支持用户显式指定 SESSION_ID，以支持不用 COOKIE 时的情况 """
+class ExplicitSessionMiddleware(SessionMiddleware):
+    """ 支持用户显式指定 SESSION_ID，以支持不用 COOKIE 时的情况
+    用于替换 django.contrib.sessions.middleware.SessionMiddleware：
+    请求头带有 CUSTOM_SESSION_HEADER 时，直接加载并校验对应的 session 挂到 request 上，
+    整个请求只读取一次 session 存储；否则按 cookie 方式处理。
+
+    设置 CUSTOM_SESSION_STATELESS = True 后，带请求头的客户端改用 signed_cookies 引擎，
+    请求头里传递的是签名后的 session 数据本身，这部分客户端完全不读写 session 存储。
+
+    如果仍然与 SessionMiddleware 同时配置（旧用法），只负责把请求头转写到 COOKIES 中。
+    """
 
     def __init__(self, get_response=None):
         super().__init__(get_response)
-        from importlib import import_module
-        self.get_response = get_response
-        engine = import_module(settings.SESSION_ENGINE)
-        self.SessionStore = engine.SessionStore
+        # 实际的请求头到了 request.META 里面会变成 HTTP_ 前缀加上横杠变成下划线的转换
+        self.header_key = ('HTTP_' + settings.CUSTOM_SESSION_HEADER).replace('-', '_').upper()
+        self.stateless = getattr(settings, 'CUSTOM_SESSION_STATELESS', False)
+        self.legacy = 'django.contrib.sessions.middleware.SessionMiddleware' in settings.MIDDLEWARE
+        if self.stateless:
+            from django.contrib.sessions.backends.signed_cookies import SessionStore
+            self.StatelessSessionStore = SessionStore
 
     def process_request(self, request):
-        # print('\n'.join(sorted(request.META.keys())))
-        # session_id = request.META.get('HTTP_X_SESSIONID')
-        # 实际的请求头到了 request.META 里面会变成 HTTP_ 前缀加上横杠变成下划线的转换
-        session_id = request.META.get(
-            ('HTTP_' + settings.CUSTOM_SESSION_HEADER).replace('-', '_')
-        )
-        # print(request.META.get('HTTP_X_CSRFTOKEN'))
-        if session_id and self.SessionStore(session_id):
-            request.COOKIES[settings.SESSION_COOKIE_NAME] = session_id
+        session_id = request.META.get(self.header_key)
+        if self.legacy:
+            if session_id:
+                request.COOKIES[settings.SESSION_COOKIE_NAME] = session_id
+            return
+        if session_id is None:
+            return super().process_request(request)
+        # session 来自请求头，响应时不设置 cookie，也不需要 Vary: Cookie
+        request._header_session = True
+        if self.stateless:
+            request.session = self.StatelessSessionStore(session_id or None)
+            return
+        session = self.SessionStore(session_id or None)
+        # 预先加载，无效的 session_id 会在加载时被置空，后续不会再次读取存储
+        session._get_session()
+        request.session = session
 
     def process_response(self, request, response):
-        if request.session:
-            session_id = getattr(request.session, 'session_key') or \
-                         getattr(request.session, '_SessionBase__session_key')
-            if session_id:
-                response[settings.CUSTOM_SESSION_HEADER] = session_id
+        session = getattr(request, 'session', None)
+        if getattr(request, '_header_session', False):
+            self.save_header_session(session, response)
+        elif not self.legacy:
+            response = super().process_response(request, response)
+        if session is not None and session.session_key:
+            response[settings.CUSTOM_SESSION_HEADER] = session.session_key
         return response
 
+    @staticmethod
+    def save_header_session(session, response):
+        """ 与 SessionMiddleware.process_response 一样保存修改过的 session，但是不处理 cookie """
+        if response.status_code == 500 or session.is_empty():
+            return
+        if session.modified or settings.SESSION_SAVE_EVERY_REQUEST:
+            try:
+                session.save()
+            except UpdateError:
+                raise SessionInterrupted(
+                    "The request's session was deleted before the "
+                    "request completed. The user may have logged "
+                    "out in a concurrent request, for example."
+                )
+
 
 class MethodOverrideMiddleware(MiddlewareMixin):
     """
@@ -140,3 +181,36 @@ class MethodOverrideMiddleware(MiddlewareMixin):
         method = (request.POST.get(settings.METHOD_OVERRIDE_PARAM_KEY) or
                   request.META.get(settings.METHOD_OVERRIDE_HTTP_HEADER))
         return method and method.upper()
+
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+    """ 读写分离时保证读到自己的写入，配合 scaffold.utils.db_router.ReplicaRouter 使用
+    每个请求开始时重置主库固定状态，请求中写入数据库之后的读操作走主库；
+    写入过的请求会在响应中设置 cookie，副本延迟时间内同一客户端的后续请求也读主库。
+    """
+    cookie_name = 'scaffold_db_pinned'
+
+    def process_request(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(self.cookie_name) or 0)
+        except ValueError:
+            pinned_until = 0.0
+        if not math.isfinite(pinned_until):
+            pinned_until = 0.0
+        # cookie 由客户端提供，最多固定 DATABASE_REPLICA_LAG 秒
+        pinned_until = min(pinned_until, time() + getattr(settings, 'DATABASE_REPLICA_LAG', 2))
+        request._db_pinned_token = db_router._pinned_until.set(pinned_until)
+
+    def process_response(self, request, response):
+        pinned_until = db_router._pinned_until.get()
+        max_age = pinned_until - time()
+        if max_age > 0:
+            response.set_cookie(self.cookie_name, str(pinned_until), max_age=math.ceil(max_age))
+        token = getattr(request, '_db_pinned_token', None)
+        if token is not None:
+            try:
+                db_router._pinned_until.reset(token)
+            except ValueError:
+                # 在其他 context 中创建的 token（例如异步视图）
+                pass
+        return response
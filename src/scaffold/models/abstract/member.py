@@ -1,5 +1,25 @@
+import json
+from bisect import bisect_right
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from scaffold.utils import geohash as geohash_utils
 from .meta import *
 
+try:
+    from django.contrib.gis.db import models as gis_models
+    from django.contrib.gis.geos import Point
+except (ImportError, ImproperlyConfigured, OSError):
+    # 没有安装 GDAL/GEOS 时不提供空间字段
+    gis_models = Point = None
+
 
 class AbstractMember(EntityModel):
     """ 会员类
@@ -76,6 +96,7 @@ class AbstractMember(EntityModel):
         on_delete=models.SET_NULL,
     )
 
+    # 已弃用：搜索历史改为由 scaffold.apps.search 单独保存，参考 add_search_history
     search_history = models.TextField(
         verbose_name='搜索历史',
         null=True,
@@ -124,6 +145,22 @@ class AbstractMember(EntityModel):
         # self.user.is_active = self.is_active
         # self.user.save()
 
+    def add_search_history(self, term):
+        """ 记录一次搜索，异步写入 scaffold.apps.search，不修改会员记录
+        没有安装 scaffold.apps.search 时不记录
+        """
+        if not apps.is_installed('scaffold.apps.search'):
+            return
+        from scaffold.apps.search import history
+        history.record(self.user, term)
+
+    def get_search_history(self, limit=None):
+        """ 最近的搜索词，由近到远，没有安装 scaffold.apps.search 时为空 """
+        if not apps.is_installed('scaffold.apps.search'):
+            return []
+        from scaffold.apps.search import history
+        return history.recent_terms(self.user, limit)
+
     def delete(self, *args, **kwargs):
         """ 删除的时候要连带删除 User 对象
         :param args:
@@ -191,7 +228,18 @@ class AbstractMember(EntityModel):
 #         verbose_name_plural = '地址'
 #         db_table = 'member_address'
 
+@lru_cache(maxsize=4096)
+def get_nickname_pinyin(nickname):
+    """ 昵称的拼音 slug，相同的昵称只计算一次 """
+    from uuslug import slugify
+    return slugify(nickname)
+
+
 class MemberPinyinMixin(models.Model):
+    """ 保存昵称拼音，用于排序和搜索
+    只有新建或者昵称被修改的时候才重新生成，
+    已有数据可以使用 backfill_member_pinyin 命令批量生成
+    """
     nickname_pinyin = models.CharField(
         verbose_name='昵称拼音',
         max_length=255,
@@ -204,8 +252,12 @@ class MemberPinyinMixin(models.Model):
 
     def save(self, *args, **kwargs):
         # 生成昵称的拼音
-        from uuslug import slugify
-        self.nickname_pinyin = slugify(self.nickname)
+        dirty_fields = get_dirty_fields(self)
+        if dirty_fields is None or 'nickname' in dirty_fields:
+            self.nickname_pinyin = get_nickname_pinyin(self.nickname)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'nickname' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'nickname_pinyin'}
         super().save(*args, **kwargs)
 
 
@@ -238,6 +290,24 @@ class MemberConstellationMixin(models.Model):
         (CONSTELLATION_PISCES, '双鱼座'),
     )
 
+    # 各星座的起始日期（月 * 100 + 日），与 CONSTELLATION_TABLE 对应
+    CONSTELLATION_BOUNDARIES = (120, 219, 321, 420, 521, 622, 723, 823, 923, 1024, 1123, 1222)
+    CONSTELLATION_TABLE = (
+        CONSTELLATION_CAPRICORN,
+        CONSTELLATION_AQUARIUS,
+        CONSTELLATION_PISCES,
+        CONSTELLATION_ARIES,
+        CONSTELLATION_TAURUS,
+        CONSTELLATION_GEMINI,
+        CONSTELLATION_CANCER,
+        CONSTELLATION_LEO,
+        CONSTELLATION_VIRGO,
+        CONSTELLATION_LIBRA,
+        CONSTELLATION_SCORPIO,
+        CONSTELLATION_SAGITTARIUS,
+        CONSTELLATION_CAPRICORN,
+    )
+
     constellation = models.CharField(
         verbose_name='星座',
         max_length=45,
@@ -249,38 +319,119 @@ class MemberConstellationMixin(models.Model):
     class Meta:
         abstract = True
 
+    @classmethod
+    def get_constellation(cls, birthday):
+        """ 根据生日确定星座，没有生日时返回空字符串 """
+        if not birthday:
+            return ''
+        key = birthday.month * 100 + birthday.day
+        return cls.CONSTELLATION_TABLE[bisect_right(cls.CONSTELLATION_BOUNDARIES, key)]
+
+    @classmethod
+    def update_constellations(cls, queryset=None):
+        """ 用一条 UPDATE ... CASE 语句批量填写星座，用于数据迁移
+        :param queryset: 需要更新的会员，默认全部
+        :return: 更新的行数
+        """
+        if queryset is None:
+            queryset = cls._default_manager.all()
+        whens = [models.When(birthday__isnull=True, then=models.Value(''))]
+        for boundary, constellation in zip(cls.CONSTELLATION_BOUNDARIES, cls.CONSTELLATION_TABLE):
+            month, day = divmod(boundary, 100)
+            whens.append(models.When(
+                models.Q(birthday__month__lt=month) | models.Q(birthday__month=month, birthday__day__lt=day),
+                then=models.Value(constellation),
+            ))
+        return queryset.update(constellation=models.Case(
+            *whens, default=models.Value(cls.CONSTELLATION_TABLE[-1]),
+            output_field=models.CharField(),
+        ))
+
     def save(self, *args, **kwargs):
-        # 如果输入了生日日期，直接确定星座
-        if not self.birthday:
-            self.birthday = datetime.now()
-        if self.birthday:
-            date_str = self.birthday.strftime('%m%d')
-            if date_str < '0120':  # 摩羯座
-                self.constellation = self.CONSTELLATION_CAPRICORN
-            elif date_str < '0219':  # 水瓶座
-                self.constellation = self.CONSTELLATION_AQUARIUS
-            elif date_str < '0321':  # 双鱼座
-                self.constellation = self.CONSTELLATION_PISCES
-            elif date_str < '0420':  # 白羊座
-                self.constellation = self.CONSTELLATION_ARIES
-            elif date_str < '0521':  # 金牛座
-                self.constellation = self.CONSTELLATION_TAURUS
-            elif date_str < '0622':  # 双子座
-                self.constellation = self.CONSTELLATION_GEMINI
-            elif date_str < '0723':  # 巨蟹座
-                self.constellation = self.CONSTELLATION_CANCER
-            elif date_str < '0823':  # 狮子座
-                self.constellation = self.CONSTELLATION_LEO
-            elif date_str < '0923':  # 处女座
-                self.constellation = self.CONSTELLATION_VIRGO
-            elif date_str < '1024':  # 天秤座
-                self.constellation = self.CONSTELLATION_LIBRA
-            elif date_str < '1123':  # 天蝎座
-                self.constellation = self.CONSTELLATION_SCORPIO
-            elif date_str < '1222':  # 射手座
-                self.constellation = self.CONSTELLATION_SAGITTARIUS
-            else:  # 摩羯座
-                self.constellation = self.CONSTELLATION_CAPRICORN
+        # 新建或者生日被修改的时候确定星座
+        dirty_fields = get_dirty_fields(self)
+        if dirty_fields is None or 'birthday' in dirty_fields:
+            self.constellation = self.get_constellation(self.birthday)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'birthday' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'constellation'}
+        super().save(*args, **kwargs)
+
+
+class MemberLocationMixin(models.Model):
+    """ 会员位置
+    保存经纬度以及带索引的 geohash，可以在任何数据库上查询附近的会员，
+    配合 scaffold.restframework.filters.NearbyFilterBackend 使用。
+    数据库支持 GIS 的时候可以改用 MemberGeoLocationMixin，查询会走空间索引。
+    """
+    latitude = models.FloatField(
+        verbose_name='纬度',
+        null=True,
+        blank=True,
+    )
+
+    longitude = models.FloatField(
+        verbose_name='经度',
+        null=True,
+        blank=True,
+    )
+
+    geohash = models.CharField(
+        verbose_name='geohash',
+        max_length=geohash_utils.MAX_PRECISION,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False,
+        help_text='根据经纬度自动生成',
+    )
+
+    class Meta:
+        abstract = True
+
+    @property
+    def has_location(self):
+        return self.latitude is not None and self.longitude is not None
+
+    def save(self, *args, **kwargs):
+        self.geohash = geohash_utils.encode(self.latitude, self.longitude) if self.has_location else ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+
+class MemberGeoLocationMixin(MemberLocationMixin):
+    """ 带空间索引的会员位置，需要使用 GIS 数据库后端（PostGIS/SpatiaLite/MySQL 等）
+    location 根据经纬度自动生成，序列化时可以使用 drf_extra_fields.geo_fields.PointField
+    没有安装 GeoDjango 依赖（GDAL/GEOS）时，继承这个类会抛出 ImproperlyConfigured
+    """
+    if gis_models is not None:
+        location = gis_models.PointField(
+            verbose_name='位置',
+            srid=4326,
+            spatial_index=True,
+            null=True,
+            blank=True,
+            editable=False,
+        )
+
+    class Meta:
+        abstract = True
+
+    def __init_subclass__(cls, **kwargs):
+        if gis_models is None:
+            raise ImproperlyConfigured(
+                '{} 继承了 MemberGeoLocationMixin，需要安装 GDAL/GEOS 并使用 GIS 数据库后端，'
+                '或者改用 MemberLocationMixin'.format(cls.__name__))
+        super().__init_subclass__(**kwargs)
+
+    def save(self, *args, **kwargs):
+        self.location = Point(self.longitude, self.latitude, srid=4326) \
+            if self.has_location else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'location'}
         super().save(*args, **kwargs)
 
 
@@ -322,6 +473,7 @@ class AbstractOAuthEntry(NullableUserOwnedModel):
         verbose_name='Union ID',
         max_length=50,
         blank=True,
+        db_index=True,
     )
 
     nickname = models.CharField(
@@ -356,3 +508,93 @@ class AbstractOAuthEntry(NullableUserOwnedModel):
         verbose_name_plural = '第三方授权'
         db_table = 'member_oauth_entry'
         unique_together = [['app', 'openid']]
+
+    @classmethod
+    def get_cache_key(cls, app, openid):
+        return 'scaffold:oauth:{}:{}:{}'.format(cls._meta.label_lower, app, openid)
+
+    @classmethod
+    def resolve(cls, platform, app, openid, unionid='', defaults=None):
+        """ 第三方登录时查找授权记录，首次登录时创建
+        查找结果会缓存 SCAFFOLD_OAUTH_CACHE_TIMEOUT 秒（默认 60），记录保存时同步更新缓存，
+        删除用户（author 被级联置空）时清除缓存；QuerySet.update() 修改的记录最多在这段时间内读到旧值。
+        记录还没有绑定用户时，会按 unionid 查找同一开放平台下已绑定的其他记录并绑定到同一用户。
+        :param platform: 第三方平台
+        :param app: app 标识
+        :param openid: 用户 OpenID
+        :param unionid: Union ID，没有的时候传空
+        :param defaults: 创建时的其他字段值（nickname、headimgurl 等）
+        :return: 授权记录
+        """
+        key = cls.get_cache_key(app, openid)
+        entry = cache.get(key)
+        cached = entry is not None
+        if entry is None:
+            entry = cls._default_manager.filter(app=app, openid=openid).first()
+        if entry is None:
+            # INSERT ... ON CONFLICT DO NOTHING，并发的首次登录不会冲突
+            cls._default_manager.bulk_create([cls(
+                platform=platform, app=app, openid=openid, unionid=unionid or '', **(defaults or {})
+            )], ignore_conflicts=True)
+            entry = cls._default_manager.get(app=app, openid=openid)
+        update_fields = []
+        if unionid and entry.unionid != unionid:
+            entry.unionid = unionid
+            update_fields.append('unionid')
+        if entry.author_id is None and entry.unionid:
+            author_id = cls._default_manager.filter(
+                unionid=entry.unionid, author__isnull=False,
+            ).values_list('author_id', flat=True).first()
+            if author_id is not None:
+                entry.author_id = author_id
+                update_fields.append('author')
+        if update_fields:
+            entry.save(update_fields=update_fields)
+        elif not cached:
+            entry.update_cache()
+        return entry
+
+    def update_cache(self):
+        cache.set(self.get_cache_key(self.app, self.openid), self,
+                  getattr(settings, 'SCAFFOLD_OAUTH_CACHE_TIMEOUT', 60))
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.update_cache()
+
+    def delete(self, *args, **kwargs):
+        cache.delete(self.get_cache_key(self.app, self.openid))
+        return super().delete(*args, **kwargs)
+
+    @property
+    def params_data(self):
+        """ params 解析后的数据，params 没有变化时不会重复解析 """
+        cached = self.__dict__.get('_params_cache')
+        if cached is None or cached[0] != self.params:
+            try:
+                data = json.loads(self.params) if self.params else {}
+            except ValueError:
+                data = {}
+            self._params_cache = cached = (self.params, data)
+        return cached[1]
+
+    @params_data.setter
+    def params_data(self, value):
+        self.params = json.dumps(value, ensure_ascii=False)
+        self._params_cache = (self.params, value)
+
+
+@receiver(pre_delete, sender='auth.User', dispatch_uid='scaffold.oauth_entry.author_deleted')
+def invalidate_oauth_entry_cache(sender, instance, using, **kwargs):
+    """ 删除用户时 author 通过 UPDATE 置空，不会经过授权记录的 save()，
+    在删除前找出授权记录，立即以及事务提交后各清除一次缓存
+    """
+    keys = [
+        model.get_cache_key(app, openid)
+        for model in apps.get_models() if issubclass(model, AbstractOAuthEntry)
+        for app, openid in model._default_manager.using(using).filter(
+            author_id=instance.pk).values_list('app', 'openid')
+    ]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys), using=using)
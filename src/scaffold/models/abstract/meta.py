@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import DatabaseError, models
 
 from scaffold.exceptions.exceptions import AppError
 
@@ -16,6 +16,124 @@ from scaffold.exceptions.exceptions import AppError
 #
 #     return do_patch
 
+class DirtyFieldsModel(models.Model):
+    """ 记录对象从数据库加载时的字段值，用于判断哪些字段被修改过
+    快照是按 concrete_fields 顺序排列的值元组，没有加载的字段记为 DEFERRED；
+    不做深拷贝，值为 dict/list 的字段（可能被原地修改）总是视为已修改。
+
+    从数据库加载的对象调用 save() 时只写入修改过的字段（以及 auto_now 字段），
+    修改的字段在 pre_save 信号之后计算，接收者修改的字段同样会被写入；
+    没有任何修改时不写数据库（也不会发送 pre_save/post_save 信号）。
+    数据库中的记录已经被删除时，和 Django 默认的行为一样改为 INSERT。
+    显式传入 update_fields 或者修改了主键时按原有方式保存，
+    设置 save_dirty_fields_only = False 可以关闭。
+
+    需要显式继承（放在基类的第一位），scaffold 的抽象模型都没有继承，参考 docs/database.rst。
+    """
+    save_dirty_fields_only = True
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if len(values) == len(cls._meta.concrete_fields):
+            instance._snapshot = tuple(values)
+        else:
+            instance.take_snapshot()
+        return instance
+
+    def take_snapshot(self, fields=None):
+        """ 将当前的字段值记为已保存
+        :param fields: 只更新这些字段（name 或者 attname），默认全部已加载的字段
+        """
+        concrete_fields = self._meta.concrete_fields
+        snapshot = self.__dict__.get('_snapshot')
+        if fields is None or snapshot is None:
+            snapshot = (models.DEFERRED,) * len(concrete_fields)
+        fields = fields and set(fields)
+        self._snapshot = tuple(
+            self.__dict__.get(f.attname, models.DEFERRED)
+            if fields is None or f.name in fields or f.attname in fields else value
+            for f, value in zip(concrete_fields, snapshot)
+        )
+
+    def get_dirty_fields(self):
+        """ 被修改过的字段名集合，新建（不是从数据库加载）的对象返回 None """
+        snapshot = self.__dict__.get('_snapshot')
+        if snapshot is None:
+            return None
+        return {
+            f.name for f, value in zip(self._meta.concrete_fields, snapshot)
+            if f.attname in self.__dict__ and (
+                value is models.DEFERRED or isinstance(value, (dict, list)) or self.__dict__[f.attname] != value
+            )
+        }
+
+    def refresh_from_db(self, using=None, fields=None):
+        fields = None if fields is None else list(fields)
+        super().refresh_from_db(using, fields)
+        self.take_snapshot(fields)
+
+    def save(self, *args, **kwargs):
+        if self.save_dirty_fields_only and not args and not self._state.adding \
+                and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            dirty_fields = self.get_dirty_fields()
+            if dirty_fields is not None and self._meta.pk.name not in dirty_fields:
+                if not dirty_fields:
+                    return
+                # 在 _save_parents/_save_table 中（pre_save 信号之后）重新计算
+                self._dirty_save = True
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            update_fields = self.__dict__.pop('_dirty_save_fields', None)
+            self.__dict__.pop('_dirty_save', None)
+            self.__dict__.pop('_dirty_save_missed', None)
+        if kwargs.get('update_fields') is not None:
+            update_fields = kwargs['update_fields']
+        self.take_snapshot(update_fields)
+
+    def _get_dirty_save_fields(self, update_fields):
+        """ 只保存修改过的字段时，实际写入的 update_fields（在 pre_save 信号之后计算一次） """
+        if update_fields is not None or not self.__dict__.get('_dirty_save'):
+            return update_fields
+        fields = self.__dict__.get('_dirty_save_fields')
+        if fields is None:
+            fields = self._dirty_save_fields = self.get_dirty_fields() | {
+                f.name for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)
+            }
+        return fields
+
+    def _save_parents(self, cls, using, update_fields, *args, **kwargs):
+        return super()._save_parents(cls, using, self._get_dirty_save_fields(update_fields), *args, **kwargs)
+
+    def _save_table(self, raw=False, cls=None, force_insert=False, force_update=False,
+                    using=None, update_fields=None):
+        fields = self._get_dirty_save_fields(update_fields)
+        try:
+            return super()._save_table(raw, cls, force_insert, force_update, using, fields)
+        except DatabaseError:
+            if fields is update_fields or not self.__dict__.pop('_dirty_save_missed', False):
+                raise
+        # 记录已经不存在，按没有 update_fields 保存（UPDATE 不到记录时 INSERT）
+        return super()._save_table(raw, cls, force_insert, force_update, using, update_fields)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, *args, **kwargs):
+        updated = super()._do_update(base_qs, using, pk_val, values, update_fields, *args, **kwargs)
+        if not updated and update_fields and update_fields is self.__dict__.get('_dirty_save_fields'):
+            self._dirty_save_missed = True
+        return updated
+
+
+def get_dirty_fields(instance):
+    """ 对象被修改过的字段名集合，没有记录快照（没有继承 DirtyFieldsModel 或者新建）时返回 None """
+    if isinstance(instance, DirtyFieldsModel):
+        return instance.get_dirty_fields()
+    return None
+
+
 class UUIDModel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
@@ -139,6 +257,10 @@ class HierarchicalModel(models.Model):
         abstract = True
 
     def clean(self):
+        # 上级没有修改过的时候不需要重新检测
+        dirty_fields = get_dirty_fields(self)
+        if dirty_fields is not None and 'parent' not in dirty_fields:
+            return
         # 环路检测
         p = self.parent
         while p is not None:
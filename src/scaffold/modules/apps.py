@@ -5,3 +5,7 @@ from django.apps import AppConfig
 class MetaConfig(AppConfig):
     """ AppConfig of modules"""
     name = 'scaffold.modules'
+
+    def ready(self):
+        from .fullclean import connect_receivers
+        connect_receivers()
@@ -1,11 +1,152 @@
-""" Automated call full_clean method on each model instance save """
-from django.contrib.sessions.models import Session
+""" Automated call full_clean method on each model instance save
+
+Only the changed fields are validated, so unique checks (one SELECT per unique
+field) run only when those fields change:
+
+* save(update_fields=[...]) validates the listed fields;
+* instances of DirtyFieldsModel validate the fields changed since loading,
+  nothing is validated when no field changed;
+* other instances (and new ones) are fully validated.
+
+The receiver is connected by the `scaffold.modules` app (add it to
+INSTALLED_APPS), importing this module alone does not enable it.
+Set `full_clean_on_save = False` on a model class to opt out, or list model
+labels in settings.SCAFFOLD_FULL_CLEAN_EXCLUDE (default: sessions.Session).
+Use full_clean_many() to validate a batch of instances before bulk_create.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db.models.signals import pre_save
-from django.dispatch import receiver
+
+__all__ = (
+    'get_changed_fields',
+    'full_clean_changed',
+    'full_clean_many',
+    'connect_receivers',
+    'disconnect_receivers',
+)
+
+# Values per query of the batched unique checks, below the SQLite variable limit.
+UNIQUE_CHECK_CHUNK_SIZE = 500
+
+
+def get_changed_fields(instance, update_fields=None):
+    """ Names of the fields to validate, None for all of them """
+    if update_fields is not None:
+        fields = set()
+        for name in update_fields:
+            fields.add(instance._meta.get_field(name).name)
+        return fields
+    get_dirty_fields = getattr(instance, 'get_dirty_fields', None)
+    return get_dirty_fields() if get_dirty_fields else None
+
+
+def get_unique_together(model):
+    """ Field name sets of the multi-field unique checks (unique_together and
+    UniqueConstraint without condition) of the model and its parents """
+    unique_sets = []
+    for model_class in [model] + model._meta.get_parent_list():
+        opts = model_class._meta
+        unique_sets.extend(set(names) for names in opts.unique_together)
+        unique_sets.extend(set(constraint.fields) for constraint in opts.total_unique_constraints)
+    return [names for names in unique_sets if len(names) > 1]
+
+
+def full_clean_changed(instance, fields=None):
+    """ full_clean restricted to the given field names (all fields if None)
+
+    validate_unique skips a unique_together set when any of its fields is
+    excluded, so all the fields of a set are validated once one of them changed.
+    """
+    if fields is None:
+        return instance.full_clean()
+    if not fields:
+        return
+    fields = set(fields)
+    for names in get_unique_together(type(instance)):
+        if names & fields:
+            fields |= names
+    exclude = [f.name for f in instance._meta.fields if f.name not in fields]
+    instance.full_clean(exclude=exclude)
 
 
-@receiver(pre_save)
-def pre_save_full_clean_handler(sender, instance):
+def is_excluded(sender):
+    if not getattr(sender, 'full_clean_on_save', True):
+        return True
+    excluded = getattr(settings, 'SCAFFOLD_FULL_CLEAN_EXCLUDE', ['sessions.Session'])
+    return sender._meta.label in excluded
+
+
+def pre_save_full_clean_handler(sender, instance, raw=False, update_fields=None, **kwargs):
     """ Force all models to call full_clean before save """
-    if sender != Session:
-        instance.full_clean()
+    if raw or is_excluded(sender):
+        return
+    full_clean_changed(instance, get_changed_fields(instance, update_fields))
+
+
+def connect_receivers():
+    """ Connect the pre_save full_clean receiver, called by MetaConfig.ready """
+    pre_save.connect(pre_save_full_clean_handler, dispatch_uid='scaffold.modules.full_clean')
+
+
+def disconnect_receivers():
+    pre_save.disconnect(pre_save_full_clean_handler, dispatch_uid='scaffold.modules.full_clean')
+
+
+def full_clean_many(instances, exclude=None):
+    """ Validate a batch of instances of the same model, e.g. before bulk_create
+
+    Field and model validation runs per instance, while single field unique
+    checks are merged into one query per field (and also catch duplicates
+    inside the batch).
+    :return: {index: message_dict} of the invalid instances
+    """
+    instances = list(instances)
+    if not instances:
+        return {}
+    model = type(instances[0])
+    exclude = set(exclude or ())
+    unique_fields = [
+        f for f in model._meta.concrete_fields
+        if f.unique and f.name not in exclude
+    ]
+    unique_names = {f.name for f in unique_fields}
+
+    errors = defaultdict(dict)
+    for index, instance in enumerate(instances):
+        for check in (
+                lambda: instance.clean_fields(exclude=exclude),
+                instance.clean,
+                lambda: instance.validate_unique(exclude=exclude | unique_names),
+        ):
+            try:
+                check()
+            except ValidationError as e:
+                errors[index] = e.update_error_dict(errors[index])
+
+    for field in unique_fields:
+        indexes = defaultdict(list)
+        for index, instance in enumerate(instances):
+            value = getattr(instance, field.attname)
+            if value is None or field.name in errors[index]:
+                continue
+            indexes[value].append(index)
+        values = list(indexes)
+        existing = dict()
+        for i in range(0, len(values), UNIQUE_CHECK_CHUNK_SIZE):
+            existing.update(model._default_manager.filter(**{
+                field.attname + '__in': values[i:i + UNIQUE_CHECK_CHUNK_SIZE],
+            }).values_list(field.attname, 'pk'))
+        for value, duplicates in indexes.items():
+            for n, index in enumerate(duplicates):
+                instance = instances[index]
+                if n or value in existing and existing[value] != instance.pk:
+                    errors[index].setdefault(field.name, []).append(
+                        instance.unique_error_message(model, (field.name,)))
+
+    return {
+        index: ValidationError(error_dict).message_dict
+        for index, error_dict in sorted(errors.items()) if error_dict
+    }
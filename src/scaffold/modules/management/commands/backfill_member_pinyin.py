@@ -0,0 +1,58 @@
+""" 批量生成会员昵称拼音（MemberPinyinMixin.nickname_pinyin） """
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from scaffold.models.abstract.member import MemberPinyinMixin, get_nickname_pinyin
+
+
+class Command(BaseCommand):
+    help = '批量生成会员昵称拼音，按主键分块读取，多进程计算，bulk_update 写回'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='会员模型，例如 member.Member')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='每次处理的会员数量')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help='计算拼音的进程数')
+        parser.add_argument('--all', action='store_true', help='重新生成全部会员的拼音，默认只处理拼音为空的会员')
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+        if not issubclass(model, MemberPinyinMixin):
+            raise CommandError('{} 没有继承 MemberPinyinMixin'.format(model._meta.label))
+
+        queryset = model._default_manager.order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(nickname_pinyin='').exclude(nickname='')
+        chunk_size = options['chunk_size']
+        processes = options['processes']
+
+        pool = ProcessPoolExecutor(processes) if processes > 1 else None
+        total = 0
+        last_pk = None
+        try:
+            while True:
+                chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+                rows = list(chunk.values_list('pk', 'nickname')[:chunk_size])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                nicknames = list({nickname for pk, nickname in rows})
+                if pool is None:
+                    pinyins = map(get_nickname_pinyin, nicknames)
+                else:
+                    pinyins = pool.map(get_nickname_pinyin, nicknames,
+                                       chunksize=max(1, len(nicknames) // processes))
+                pinyin_map = dict(zip(nicknames, pinyins))
+                model._default_manager.bulk_update([
+                    model(pk=pk, nickname_pinyin=pinyin_map[nickname]) for pk, nickname in rows
+                ], ['nickname_pinyin'])
+                total += len(rows)
+                self.stdout.write('{} members updated.'.format(total))
+        finally:
+            if pool is not None:
+                pool.shutdown()
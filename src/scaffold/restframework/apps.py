@@ -5,3 +5,33 @@ from django.apps import AppConfig
 class MetaConfig(AppConfig):
     """ AppConfig for the module """
     name = 'scaffold.restframework'
+
+    def ready(self):
+        # 注册 scaffold 的 system checks（scaffold.checks 导入时注册）
+        from .. import checks  # noqa: F401
+
+        # 默认的 FilterSet 不支持某些派生字段类型，例如 JSONField，全局注册为 CharFilter，
+        # 放在这里而不是 settings 中，避免 settings 导入时就加载 django_filters 和 ORM
+        from django.db.models import JSONField
+        from django_filters import CharFilter, filterset
+
+        filterset.FilterSet.FILTER_DEFAULTS = {
+            **filterset.FilterSet.FILTER_DEFAULTS,
+            JSONField: {'filter_class': CharFilter},
+        }
+
+        # 用户、组的权限变化时，让 HasPermissions 缓存的权限快照失效
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Group, Permission
+        from django.db.models.signals import m2m_changed, post_delete, post_save
+
+        from .permissions import invalidate_permissions
+
+        user_model = get_user_model()
+        for field in ('groups', 'user_permissions'):
+            if hasattr(user_model, field):
+                m2m_changed.connect(invalidate_permissions, sender=getattr(user_model, field).through)
+        m2m_changed.connect(invalidate_permissions, sender=Group.permissions.through)
+        for model in (Group, Permission):
+            post_save.connect(invalidate_permissions, sender=model)
+            post_delete.connect(invalidate_permissions, sender=model)
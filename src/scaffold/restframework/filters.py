@@ -1,14 +1,17 @@
 """ rewrite the DRF filters module """
 from __future__ import unicode_literals
 
+import math
 import operator
 import re
 import sys
 from functools import reduce
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Q
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Q, Value, When
+from django.db.models.functions import Sqrt
 from django.db.models.constants import LOOKUP_SEP
 from django.template import loader
 from django.utils.encoding import force_text
@@ -17,6 +20,9 @@ from rest_framework.compat import distinct
 from rest_framework.filters import BaseFilterBackend
 from rest_framework.settings import api_settings
 
+from ..exceptions.exceptions import AppError
+from ..utils import geohash
+
 try:
     import coreapi
 except ImportError:
@@ -438,3 +444,113 @@ class OrderingFilter(BaseFilterBackend):
                 )
             )
         ]
+
+
+class NearbyFilterBackend(BaseFilterBackend):
+    """ 附近查询过滤器
+    配合 MemberLocationMixin（或者其他带有 latitude/longitude/geohash 字段的模型）使用：
+
+    ?latitude=23.13&longitude=113.26&radius=1000  半径 1000 米以内，由近到远
+    ?latitude=23.13&longitude=113.26&nearest=10   最近的 10 条（在最大半径以内）
+
+    查询结果带有 distance 注解（米）。
+    模型有 location 空间字段（MemberGeoLocationMixin）并且数据库支持 GIS 时，走空间索引查询；
+    否则先用 geohash 前缀（普通索引）和经纬度范围粗筛，再在 SQL 中计算距离过滤和排序，
+    距离按等距矩形投影近似，适用于几十公里以内的范围。
+
+    相关配置：
+
+    - SCAFFOLD_NEARBY_MAX_RADIUS: 最大查询半径（米），默认 50000
+    - SCAFFOLD_NEARBY_MAX_NEAREST: nearest 的最大值，默认 100
+    """
+    latitude_param = 'latitude'
+    longitude_param = 'longitude'
+    radius_param = 'radius'
+    nearest_param = 'nearest'
+
+    def get_params(self, request):
+        params = request.query_params
+        max_radius = getattr(settings, 'SCAFFOLD_NEARBY_MAX_RADIUS', 50000)
+        max_nearest = getattr(settings, 'SCAFFOLD_NEARBY_MAX_NEAREST', 100)
+        try:
+            latitude = float(params[self.latitude_param])
+            longitude = float(params[self.longitude_param])
+            radius = float(params.get(self.radius_param) or max_radius)
+            nearest = int(params.get(self.nearest_param) or 0)
+        except ValueError:
+            raise AppError(40001, '参数校验失败', data=dict(params=params))
+        if not (abs(latitude) <= 90 and abs(longitude) <= 180 and radius > 0 and nearest >= 0):
+            raise AppError(40001, '参数校验失败', data=dict(params=params))
+        return latitude, longitude, min(radius, max_radius), min(nearest, max_nearest)
+
+    @staticmethod
+    def use_spatial_index(queryset):
+        try:
+            queryset.model._meta.get_field('location')
+        except FieldDoesNotExist:
+            return False
+        return getattr(connections[queryset.db].features, 'gis_enabled', False)
+
+    def filter_queryset(self, request, queryset, view):
+        if self.latitude_param not in request.query_params \
+                or self.longitude_param not in request.query_params:
+            return queryset
+        latitude, longitude, radius, nearest = self.get_params(request)
+        if self.use_spatial_index(queryset):
+            queryset = self.filter_spatial(queryset, latitude, longitude, radius)
+        else:
+            queryset = self.filter_geohash(queryset, latitude, longitude, radius)
+        queryset = queryset.order_by('distance')
+        return queryset[:nearest] if nearest else queryset
+
+    @staticmethod
+    def filter_spatial(queryset, latitude, longitude, radius):
+        from django.contrib.gis.db.models.functions import Distance
+        from django.contrib.gis.geos import Point
+        from django.contrib.gis.measure import D
+        point = Point(longitude, latitude, srid=4326)
+        return queryset.filter(
+            location__distance_lte=(point, D(m=radius))
+        ).annotate(distance=Distance('location', point))
+
+    @staticmethod
+    def filter_geohash(queryset, latitude, longitude, radius):
+        # geohash 前缀粗筛，覆盖以查询点为中心、边长不小于 2 * radius 的范围
+        precision = geohash.precision_for_radius(latitude, radius)
+        cells = geohash.neighbors(geohash.encode(latitude, longitude, precision))
+        if precision:
+            queryset = queryset.filter(reduce(operator.or_, (
+                Q(geohash__startswith=cell) for cell in sorted(cells))))
+        # 经纬度范围以及距离
+        lat_delta = radius / geohash.METERS_PER_DEGREE
+        cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+        lng_delta = min(lat_delta / cos_lat, 180)
+        west, east = longitude - lng_delta, longitude + lng_delta
+        d_lng = F('longitude') - Value(longitude)
+        if west < -180 or east > 180:
+            # 范围跨过 ±180° 经线时拆成两段，另一侧的经度差加减 360° 计算
+            if lng_delta < 180:
+                if west < -180:
+                    ranges = (-180, east), (west + 360, 180)
+                else:
+                    ranges = (west, 180), (-180, east - 360)
+                queryset = queryset.filter(
+                    Q(longitude__range=ranges[0]) | Q(longitude__range=ranges[1]))
+            d_lng = Case(
+                When(longitude__gt=longitude + 180, then=d_lng - Value(360.0)),
+                When(longitude__lt=longitude - 180, then=d_lng + Value(360.0)),
+                default=d_lng,
+                output_field=FloatField(),
+            )
+        else:
+            queryset = queryset.filter(longitude__range=(west, east))
+        dy = (F('latitude') - Value(latitude)) * Value(geohash.METERS_PER_DEGREE)
+        dx = d_lng * Value(geohash.METERS_PER_DEGREE * cos_lat)
+        distance_sq = ExpressionWrapper(dx * dx + dy * dy, output_field=FloatField())
+        return queryset.filter(
+            latitude__range=(latitude - lat_delta, latitude + lat_delta),
+        ).alias(
+            distance_sq=distance_sq,
+        ).filter(
+            distance_sq__lte=radius * radius,
+        ).annotate(distance=Sqrt('distance_sq'))
@@ -1,16 +1,49 @@
 """ Custom specified pagination classes """
+import hashlib
 from collections import OrderedDict
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 from rest_framework import pagination
 from rest_framework.response import Response
 
 
+class CachedCountPaginator(Paginator):
+    """ 缓存 COUNT(*) 结果的分页器
+    大表的 COUNT 查询很慢，翻页时每一页都要重新计算。
+    settings.SCAFFOLD_PAGINATION_COUNT_CACHE_TIMEOUT 大于 0 时，相同查询的总数缓存这么多秒
+    （期间新增或删除的记录不会反映在 count/pages 中），默认 0 不缓存。
+    """
+
+    @cached_property
+    def count(self):
+        timeout = getattr(settings, 'SCAFFOLD_PAGINATION_COUNT_CACHE_TIMEOUT', 0)
+        if not timeout or not isinstance(self.object_list, QuerySet):
+            return super().count
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except EmptyResultSet:
+            return super().count
+        key = 'scaffold:count:' + hashlib.md5('{}|{}|{!r}'.format(
+            self.object_list.db, sql, params).encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, timeout)
+        return count
+
+
 class PageNumberPagination(pagination.PageNumberPagination):
     """ 自定义分页器
     基于 rest_framework 的 PageNumberPagination 基础上修改
     """
     page_size = 10
     page_size_query_param = 'page_size'
+    django_paginator_class = CachedCountPaginator
 
     def get_paginated_response(self, data):
         return Response(OrderedDict([
@@ -1,12 +1,102 @@
 """ Extended rest_framework permissions classes """
 import re
+import time
+from functools import lru_cache
 from logging import getLogger
 
 from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from ..utils.cache import TieredCache
+
 logger = getLogger(__name__)
 
+PERMISSION_VERSION_KEY = 'scaffold:permission_version'
+
+
+def get_version_cache():
+    """ The permission version bypasses the local tier of a TieredCache,
+    so a revocation is seen by every process at once
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    return backend.shared if isinstance(backend, TieredCache) else backend
+
+
+def get_permission_version():
+    """ Version of the permission assignments, bumped by invalidate_permissions() """
+    version_cache = get_version_cache()
+    version = version_cache.get(PERMISSION_VERSION_KEY)
+    if version is None:
+        # start from the current time, so a lost version never revives old entries
+        version_cache.add(PERMISSION_VERSION_KEY, int(time.time() * 1000), None)
+        version = version_cache.get(PERMISSION_VERSION_KEY, 0)
+    return version
+
+
+def invalidate_permissions(**kwargs):
+    """ Signal handler invalidating all the cached permission snapshots,
+    connected by scaffold.restframework to changes of users' groups and permissions
+    """
+    if kwargs.get('action', 'post').startswith('pre'):
+        return
+    version_cache = get_version_cache()
+    try:
+        version_cache.incr(PERMISSION_VERSION_KEY)
+    except ValueError:
+        version_cache.set(PERMISSION_VERSION_KEY, int(time.time() * 1000), None)
+
+
+@lru_cache(maxsize=None)
+def _has_perm_only_backends(backends):
+    """ Whether any of the authentication backends may grant permissions that
+    get_all_permissions() does not list (custom has_perm or no get_all_permissions)
+    """
+    from django.contrib.auth import get_backends
+    from django.contrib.auth.backends import BaseBackend, ModelBackend
+    builtin = (BaseBackend.has_perm, ModelBackend.has_perm)
+    return any(
+        hasattr(backend, 'has_perm') and (
+            not hasattr(backend, 'get_all_permissions') or getattr(type(backend), 'has_perm', None) not in builtin
+        )
+        for backend in get_backends()
+    )
+
+
+def user_has_perm(request, perm):
+    """ Check a permission against the request snapshot, falling back to
+    user.has_perm() for the backends the snapshot cannot cover
+    """
+    if perm in get_user_permissions(request):
+        return True
+    return _has_perm_only_backends(tuple(settings.AUTHENTICATION_BACKENDS)) and request.user.has_perm(perm)
+
+
+def get_user_permissions(request):
+    """ Snapshot of request.user.get_all_permissions(), taken once per request
+
+    With settings.SCAFFOLD_PERMISSION_CACHE_TIMEOUT > 0 the snapshot is also
+    cached across requests, keyed by user and permission version.
+    Permissions granted by backends that only implement has_perm() are not
+    listed, use user_has_perm() to check a single permission.
+    """
+    user = request.user
+    snapshot = getattr(request, '_scaffold_permissions', None)
+    if snapshot is not None and snapshot[0] is user:
+        return snapshot[1]
+    if not user.is_active:
+        perms = frozenset()
+    else:
+        timeout = getattr(settings, 'SCAFFOLD_PERMISSION_CACHE_TIMEOUT', 0)
+        key = 'scaffold:permissions:{}:{}'.format(user.pk, get_permission_version()) if timeout else None
+        perms = cache.get(key) if key else None
+        if perms is None:
+            perms = frozenset(user.get_all_permissions())
+            if key:
+                cache.set(key, perms, timeout)
+    request._scaffold_permissions = (user, perms)
+    return perms
+
 
 class ActionBasedPermission(BasePermission):
     """ ViewSet action level Permission integrator
@@ -26,27 +116,46 @@ class ActionBasedPermission(BasePermission):
                 'create,update,partial_update':
                     HasPermissions.build('basic_info_admin'),
             }
+
+    The mapping is compiled once per view class into {action: permission instance},
+    so the permission instances are shared between requests and must be stateless.
     """
 
-    def has_permission(self, request, view):
-        for actions, cls in getattr(view, 'action_permissions', {}).items():
+    @staticmethod
+    def compile_action_permissions(action_permissions):
+        """ {'list,retrieve': IsMember, ...} => {'list': IsMember(), 'retrieve': IsMember(), ...} """
+        result = dict()
+        for actions, cls in action_permissions.items():
             # 支持 actions 是字符串或者数组，如果是字符串先转为数组
             if isinstance(actions, str):
                 actions = re.split(r'\s+|[\.\|,]', actions)
-            # 判断是当前 view 的动作是否在清单中
-            if view.action in actions:
-                return cls().has_permission(request, view)
-        return True
+            permission = cls()
+            for action in actions:
+                # 同一个动作出现多次时，以第一次出现的为准
+                if action and action not in result:
+                    result[action] = permission
+        return result
+
+    def get_action_permission(self, view):
+        """ 当前 view 的动作对应的权限实例，没有配置时返回 None """
+        action_permissions = getattr(view, 'action_permissions', None)
+        if not action_permissions:
+            return None
+        view_class = type(view)
+        # 缓存在 view 类上，action_permissions 被替换（例如在实例上覆盖）时重新编译
+        compiled = view_class.__dict__.get('_compiled_action_permissions')
+        if compiled is None or compiled[0] is not action_permissions:
+            compiled = (action_permissions, self.compile_action_permissions(action_permissions))
+            view_class._compiled_action_permissions = compiled
+        return compiled[1].get(view.action)
+
+    def has_permission(self, request, view):
+        permission = self.get_action_permission(view)
+        return True if permission is None else permission.has_permission(request, view)
 
     def has_object_permission(self, request, view, obj):
-        for actions, cls in getattr(view, 'action_permissions', {}).items():
-            # 支持 actions 是字符串或者数组，如果是字符串先转为数组
-            if isinstance(actions, str):
-                actions = re.split(r'\s+|[\.\|,]', actions)
-            # 判断是当前 view 的动作是否在清单中
-            if view.action in actions:
-                return cls().has_object_permission(request, view, obj)
-        return True
+        permission = self.get_action_permission(view)
+        return True if permission is None else permission.has_object_permission(request, view, obj)
 
 
 class IsAuthor(BasePermission):
@@ -101,17 +210,22 @@ class HasPermissions(BasePermission):
 
     @classmethod
     def build(cls, *args):
-        """ Derive a meta subclass of current by replacing the perms property. """
-        return type(
-            'HasPermissions',
-            (cls,),
-            dict(perms=tuple(p if '.' in p else f'{cls.app_label}.{p}' for p in args))
-        )
+        """ Derive a meta subclass of current by replacing the perms property.
+        Identical perms share the same subclass.
+        """
+        return _build_permission_class(cls, tuple(p if '.' in p else f'{cls.app_label}.{p}' for p in args))
 
     def has_permission(self, request, view):
         if not request.user or not request.user.is_authenticated:
             return False
-        return request.user.is_superuser or any(request.user.has_perm(perm) for perm in self.perms)
+        if request.user.is_superuser:
+            return True
+        return any(user_has_perm(request, perm) for perm in self.perms)
 
     def has_object_permission(self, request, view, obj):
         return self.has_permission(request, view)
+
+
+@lru_cache(maxsize=None)
+def _build_permission_class(cls, perms):
+    return type('HasPermissions', (cls,), dict(perms=perms))
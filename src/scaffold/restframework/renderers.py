@@ -0,0 +1,35 @@
+""" Extended rest_framework renderer classes """
+from django.http import StreamingHttpResponse
+from rest_framework import renderers
+
+from ..utils import fastjson
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """ JSON renderer backed by scaffold.utils.fastjson (orjson when available)
+
+    Pretty printed output (indent requested by the client or the browsable API)
+    falls back to the stock implementation.
+    """
+    encoder_class = fastjson.JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = fastjson.dumps(data, allow_nan=not self.strict)
+        # Keep the output a strict javascript subset like the stock renderer does.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+def streaming_response(data, status=200):
+    """ Write serialized data as a streamed JSON response.
+
+    Lazy values such as Base64Stream (serializer fields with stream_base64=True)
+    are encoded chunk by chunk while the response is sent.
+    """
+    return StreamingHttpResponse(
+        fastjson.iterdumps(data), status=status, content_type='application/json')
@@ -48,8 +48,32 @@ Environment variables:
 - DJANGO_DB_PASS: default root
 - DJANGO_DB_CHARSET: default utf8mb4
 - DJANGO_DB_COLLATION: default utf8mb4_general_ci
+- DJANGO_DB_STORAGE_ENGINE: mysql default storage engine, default InnoDB
+    (see docs/database.rst before switching an existing MyISAM database)
+- DJANGO_DB_CONN_MAX_AGE: seconds to keep a connection open between requests,
+    default 60, 0 closes it after every request, -1 (None) keeps it forever
+- DJANGO_DB_CONN_HEALTH_CHECKS: check persistent connections before reuse, default 1
+- DJANGO_DB_POOL_SIZE: use a connection pool of this size (mysql, requires
+    django-db-connection-pool), default 0 (disabled)
+- DJANGO_DB_POOL_MAX_OVERFLOW: extra connections allowed above the pool size, default 10
+- DJANGO_DB_POOL_RECYCLE: seconds before a pooled connection is recycled, default 3600
+
+- DJANGO_CACHE_BACKEND: backend of the shared cache, default FileBasedCache
+- DJANGO_CACHE_LOCATION: location of the shared cache, default /var/tmp/django_cache
+- DJANGO_CACHE_TIMEOUT: default expiry in seconds, default 300
+- DJANGO_CACHE_MAX_ENTRIES: max entries of the shared cache, default 3000
+- DJANGO_CACHE_LOCAL_TIMEOUT: expiry of the per-process cache in front of
+    the shared one, default 5, 0 disables it
+- DJANGO_CACHE_LOCAL_MAX_ENTRIES: max entries of the per-process cache, default 1000
+
+- DJANGO_BASE_DIR: the project directory (BASE_DIR), default the parent directory
+    of the package holding DJANGO_SETTINGS_MODULE
+
+- SCAFFOLD_PROFILE_IMPORTS: set it as 1 to print the slowest scaffold imports
+    at exit, see scaffold/importtime.py
 """
 
+import importlib.util
 import os
 import sys
 
@@ -58,11 +82,31 @@ from django.core.exceptions import ImproperlyConfigured
 # Get the main module name
 app_name = os.environ['DJANGO_SETTINGS_MODULE'].split('.')[0]
 
+
+def _get_base_dir():
+    """ 项目目录：项目 settings 模块（from scaffold.settings import * 的模块）所在包的上一级目录
+    不能使用本文件的 __file__，scaffold 通常安装在 site-packages 中，和项目目录无关。
+    项目 settings 模块正在导入时从 sys.modules 取得路径，直接导入本模块时按模块名查找（不执行），
+    都找不到时使用当前目录，也可以用环境变量 DJANGO_BASE_DIR 指定。
+    """
+    base_dir = os.environ.get('DJANGO_BASE_DIR')
+    if base_dir:
+        return os.path.abspath(base_dir)
+    settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', '')
+    path = getattr(sys.modules.get(settings_module), '__file__', None)
+    if path is None and settings_module:
+        try:
+            spec = importlib.util.find_spec(settings_module)
+        except (ImportError, ValueError):
+            spec = None
+        path = spec and spec.origin
+    if not path:
+        return os.getcwd()
+    return os.path.dirname(os.path.dirname(os.path.abspath(path)))
+
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
-# https://stackoverflow.com/a/606574/2544762
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(
-    sys.modules[os.environ.get('DJANGO_SETTINGS_MODULE')].__file__
-)))
+BASE_DIR = _get_base_dir()
 
 # Quick-start development base_settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
@@ -87,11 +131,15 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     # Included third-party apps
+    # 保存前自动 full_clean，SCAFFOLD_FULL_CLEAN_EXCLUDE 中的模型（默认 sessions.Session）除外
+    # 继承了 DirtyFieldsModel 的模型只验证修改过的字段，需要在模型中显式继承，参考 docs/database.rst
     # 'scaffold.modules',
     # 'scaffold.models.entity.media',
+    # 'scaffold.apps.search',
     'rest_framework',
     'django_cron',
     'django_filters',
+    'scaffold.restframework',
 ]
 
 MIDDLEWARE = [
@@ -102,6 +150,7 @@ MIDDLEWARE = [
     # 'django_base.base_utils.middleware.DebugMiddleware',
     # 'django_base.base_utils.middleware.CookieCsrfMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # 需要支持请求头指定 SESSION_ID 时，用 'scaffold.middlewares.ExplicitSessionMiddleware' 替换下面这一项
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -139,6 +188,11 @@ WSGI_APPLICATION = f'{app_name}.wsgi.application'
 DATABASES = dict()
 
 _db_type: str = os.environ.get('DJANGO_DB_TYPE', 'mysql').lower()
+# 持久连接：每个请求结束后不关闭连接，超过 CONN_MAX_AGE 秒才重新连接
+_db_conn_max_age = int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', '60'))
+_db_conn_max_age = None if _db_conn_max_age < 0 else _db_conn_max_age
+_db_conn_health_checks = os.environ.get('DJANGO_DB_CONN_HEALTH_CHECKS', '1') == '1'
+_db_pool_size = int(os.environ.get('DJANGO_DB_POOL_SIZE', '0'))
 if _db_type == 'sqlite3':
     _db_name = os.environ.get('DJANGO_DB_NAME', 'db.sqlite3')
     DATABASES['default'] = {
@@ -154,15 +208,18 @@ elif _db_type == 'mysql':
             'ENGINE': 'django.db.backends.mysql',
             'NAME': os.environ.get('DJANGO_DB_NAME', f'django_{app_name}'),
             'USER': os.environ.get('DJANGO_DB_USER', 'root'),
-            'PASSWORD': os.environ.get('DJANGO_DB_USER', 'root'),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASS', os.environ.get('DJANGO_DB_USER', 'root')),
             'HOST': os.environ.get('DJANGO_DB_HOST', '127.0.0.1'),
             'PORT': os.environ.get('DJANGO_DB_PORT', '3306'),
+            'CONN_MAX_AGE': _db_conn_max_age,
+            # Django 4.1+ 生效，之前的版本忽略
+            'CONN_HEALTH_CHECKS': _db_conn_health_checks,
             'OPTIONS': {
                 'charset': os.environ.get('DJANGO_DB_CHARSET', 'utf8mb4'),
                 'init_command': '''
-                    SET default_storage_engine=MYISAM;
+                    SET default_storage_engine={};
                     SET sql_mode='STRICT_TRANS_TABLES';
-                ''',
+                '''.format(os.environ.get('DJANGO_DB_STORAGE_ENGINE', 'InnoDB')),
             },
             'TEST': {
                 'CHARSET': os.environ.get('DJANGO_DB_CHARSET', 'utf8mb4'),
@@ -170,6 +227,22 @@ elif _db_type == 'mysql':
             },
         },
     }
+    if _db_pool_size > 0:
+        try:
+            import dj_db_conn_pool  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured(
+                'DJANGO_DB_POOL_SIZE requires django-db-connection-pool, '
+                'install it with `pip install django-db-connection-pool[mysql]`.'
+            )
+        # 连接池自己管理连接，请求结束时归还而不是断开
+        DATABASES['default']['ENGINE'] = 'dj_db_conn_pool.backends.mysql'
+        DATABASES['default']['POOL_OPTIONS'] = {
+            'POOL_SIZE': _db_pool_size,
+            'MAX_OVERFLOW': int(os.environ.get('DJANGO_DB_POOL_MAX_OVERFLOW', '10')),
+            'RECYCLE': int(os.environ.get('DJANGO_DB_POOL_RECYCLE', '3600')),
+            'PRE_PING': _db_conn_health_checks,
+        }
 else:
     raise ImproperlyConfigured(
         f'The DJANGO_DB_TYPE \'{_db_type}\' you\'ve configured in your '
@@ -183,6 +256,11 @@ else:
 DATABASE_ROUTERS = ['scaffold.utils.db_router.AppRouter']
 # map appname to database name, example: {'core': 'default', 'myapp': 'db2'}
 DATABASE_ROUTE_MAP = dict()
+# 读写分离：使用 scaffold.utils.db_router.ReplicaRouter 并在 MIDDLEWARE 中加入
+# scaffold.middlewares.middleware.ReplicaPinningMiddleware
+# DATABASE_REPLICAS = {'default': ['replica1', ('replica2', 3)]}
+# DATABASE_REPLICA_STRATEGY = 'random'  # random / weighted / least_recent
+# DATABASE_REPLICA_LAG = 2
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -226,15 +304,49 @@ MEDIA_URL = '/media/'
 
 FILE_UPLOAD_PERMISSIONS = 0o644
 
+# 上传时顺带计算文件内容哈希，供 scaffold.apps.media 按内容去重存储
+FILE_UPLOAD_HANDLERS = [
+    'scaffold.apps.media.uploadhandlers.HashingMemoryFileUploadHandler',
+    'scaffold.apps.media.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
+
 # Django Cache
-# To solve django-cron process lock issue, we switch the cache to filebased
-# https://github.com/Tivix/django-cron/issues/41
+# default 为两级缓存：进程内 LRU + 共享缓存（默认文件缓存，可以换成 Redis/Memcached）
 CACHES = {
     'default': {
+        'BACKEND': 'scaffold.utils.cache.TieredCache',
+        'LOCATION': 'shared',
+        'TIMEOUT': int(os.environ.get('DJANGO_CACHE_TIMEOUT', '300')),
+        'OPTIONS': {
+            'LOCAL_TIMEOUT': float(os.environ.get('DJANGO_CACHE_LOCAL_TIMEOUT', '5')),
+            'LOCAL_MAX_ENTRIES': int(os.environ.get('DJANGO_CACHE_LOCAL_MAX_ENTRIES', '1000')),
+        },
+    },
+    'shared': {
+        'BACKEND': os.environ.get(
+            'DJANGO_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', '/var/tmp/django_cache'),
+        'TIMEOUT': int(os.environ.get('DJANGO_CACHE_TIMEOUT', '300')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('DJANGO_CACHE_MAX_ENTRIES', '3000')),
+        },
+    },
+    # django-cron 的进程锁需要跨进程可见，使用单独的小容量文件缓存，
+    # 锁文件不会被业务缓存挤出，也不经过进程内缓存
+    # https://github.com/Tivix/django-cron/issues/41
+    'cron': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': '/var/tmp/django_cache',
-    }
+        'LOCATION': '/var/tmp/django_cron_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100,
+        },
+    },
 }
+if float(CACHES['default']['OPTIONS']['LOCAL_TIMEOUT']) <= 0:
+    CACHES['default'] = CACHES['shared']
+DJANGO_CRON_CACHE = 'cron'
+# 分页总数（COUNT 查询）的缓存时间（秒），默认 0 不缓存
+# SCAFFOLD_PAGINATION_COUNT_CACHE_TIMEOUT = 30
 
 # CORS headers
 # https://pypi.org/project/django-cors-headers/
@@ -257,14 +369,8 @@ CSRF_TRUSTED_ORIGINS = ['null', '.local', 'localhost', '127.0.0.1']
 # REST Framework
 # https://www.django-rest-framework.org/
 
-# 默认的 DRF FilterSet 不支持某些派生字段类型，例如 JSONField，通过这样的方式全局注册替换支持
-from django_filters import filterset, CharFilter
-from django.db.models import JSONField
-
-filterset.FilterSet.Meta = type('Meta', (object,), dict(
-    filter_overrides={JSONField: {'filter_class': CharFilter}}
-))
-
+# 默认的 DRF FilterSet 不支持某些派生字段类型，例如 JSONField，
+# 由 INSTALLED_APPS 中的 scaffold.restframework 在 AppConfig.ready() 中全局注册替换支持
 REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
     'DEFAULT_PAGINATION_CLASS':
@@ -285,10 +391,11 @@ REST_FRAMEWORK = {
         'scaffold.restframework.filters.OrderingFilter',
         'scaffold.restframework.filters.SearchFilter',
     ),
-    # 'DEFAULT_RENDERER_CLASSES': (
-    #     # 'rest_framework.renderers.JSONRenderer',
-    #     'rest_framework.renderers.BrowsableAPIRenderer',
-    # ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # 安装 orjson 时使用 orjson 编码，否则退回标准库
+        'scaffold.restframework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DATE_FORMAT': '%Y-%m-%d',
     'DATETIME_FORMAT': '%Y-%m-%d %H:%M:%S',
     'COERCE_DECIMAL_TO_STRING': False,
@@ -302,10 +409,17 @@ REST_FRAMEWORK = {
     ],
 }
 
+# HasPermissions 跨请求缓存用户权限的时间（秒），用户、组的权限变化时自动失效，默认 0 只在请求内缓存
+# SCAFFOLD_PERMISSION_CACHE_TIMEOUT = 300
+
 # # Geo
 #
 # AUTO_GEO_DECODE = False
 #
+# # 附近查询（NearbyFilterBackend）的最大半径（米）和 nearest 的最大条数
+# SCAFFOLD_NEARBY_MAX_RADIUS = 50000
+# SCAFFOLD_NEARBY_MAX_NEAREST = 100
+#
 # # 百度地图 API_KEY
 # BMAP_KEY = ''
 # # 高德地图 API_KEY
@@ -347,6 +461,8 @@ REST_FRAMEWORK = {
 #
 # # ============== CUSTOM SESSION HEADER ==============
 # CUSTOM_SESSION_HEADER = 'SESSION-ID'
+# # 请求头中直接携带签名后的 session 数据（signed_cookies 引擎），不读写 session 存储
+# CUSTOM_SESSION_STATELESS = False
 #
 # # ============== MethodOverrideMiddleware =================
 # METHOD_OVERRIDE_ALLOWED_HTTP_METHODS =\
@@ -0,0 +1,187 @@
+""" 两级缓存
+进程内的 LRU 缓存（本地层）挡在共享缓存（文件、Redis、Memcached 等任意 Django 缓存）前面，
+热点数据在本地层命中，省去读文件/网络往返和反序列化。
+
+CACHES = {
+    'default': {
+        'BACKEND': 'scaffold.utils.cache.TieredCache',
+        # 共享层使用的缓存别名
+        'LOCATION': 'shared',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            # 本地层的过期时间（秒），其他进程写入后本进程最多在这段时间内读到旧值
+            'LOCAL_TIMEOUT': 5,
+            'LOCAL_MAX_ENTRIES': 1000,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/var/tmp/django_cache',
+    },
+}
+
+本进程内的 set/delete 会同时更新本地层，add/incr/decr 等需要跨进程原子性的操作
+直接由共享层完成。django.core.cache.caches 为每个线程创建单独的缓存对象，
+本地层和 LocMemCache 一样按 LOCATION（共享层别名）保存在模块级的字典中，进程内所有线程共用，
+一个线程的 set/delete 对其他线程立即可见。锁之类不能容忍旧值的数据不要放在两级缓存里，
+django-cron 的锁使用单独的缓存（settings.DJANGO_CRON_CACHE）。
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+__all__ = (
+    'TieredCache',
+)
+
+# 共享层别名 -> 本地层，进程内所有线程共用，参考 django.core.cache.backends.locmem
+_local_stores = {}
+_locks = {}
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location or 'shared'
+        self.local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self.local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        # make_key -> (过期时间, pickle 后的值)，保存 pickle 后的值避免调用方修改缓存的对象
+        self._local = _local_stores.setdefault(self.shared_alias, OrderedDict())
+        self._lock = _locks.setdefault(self.shared_alias, threading.Lock())
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _shared_timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+        return entry
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        expire = time.time() + self.local_timeout
+        backend_expire = self.get_backend_timeout(timeout)
+        if backend_expire is not None:
+            expire = min(expire, backend_expire)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[key] = (expire, pickled)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        entry = self._local_get(local_key)
+        if entry is not None:
+            return pickle.loads(entry[1])
+        missing = object()
+        value = self.shared.get(key, missing, version=version)
+        if value is missing:
+            return default
+        self._local_set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        result = dict()
+        missing = []
+        for key in keys:
+            local_key = self.make_key(key, version)
+            self.validate_key(local_key)
+            entry = self._local_get(local_key)
+            if entry is None:
+                missing.append(key)
+            else:
+                result[key] = pickle.loads(entry[1])
+        if missing:
+            for key, value in self.shared.get_many(missing, version=version).items():
+                self._local_set(self.make_key(key, version), value)
+                result[key] = value
+        return result
+
+    def has_key(self, key, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        return self._local_get(local_key) is not None or self.shared.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        self.shared.set(key, value, self._shared_timeout(timeout), version=version)
+        self._local_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, self._shared_timeout(timeout), version=version)
+        for key, value in data.items():
+            local_key = self.make_key(key, version)
+            if key in (failed or ()):
+                self._local_delete(local_key)
+            else:
+                self._local_set(local_key, value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        # 本地层可能还留着其他进程已经删除的值，以共享层的结果为准
+        self._local_delete(local_key)
+        added = self.shared.add(key, value, self._shared_timeout(timeout), version=version)
+        if added:
+            self._local_set(local_key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self.make_key(key, version))
+        return self.shared.touch(key, self._shared_timeout(timeout), version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._local_delete(self.make_key(key, version))
+        return self.shared.decr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        self._local_delete(local_key)
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._local_delete(self.make_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear_local(self):
+        """ 只清空本进程（所有线程共用）的本地层 """
+        with self._lock:
+            self._local.clear()
+
+    def clear(self):
+        self.clear_local()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
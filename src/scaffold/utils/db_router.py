@@ -1,8 +1,62 @@
+import contextvars
+import random
+import threading
+from time import time
+
 from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+__all__ = (
+    'AppRouter',
+    'ReplicaRouter',
+    'pin_primary',
+    'is_pinned',
+    'install_write_hook',
+)
+
+# 写入之后读操作固定到主库的截止时间，请求开始时由 ReplicaPinningMiddleware 重置
+_pinned_until = contextvars.ContextVar('scaffold_db_pinned_until', default=0.0)
+
+
+def pin_primary(seconds=None):
+    """ 在接下来的 seconds 秒（默认 DATABASE_REPLICA_LAG）内读主库，保证读到自己的写入 """
+    if seconds is None:
+        seconds = getattr(settings, 'DATABASE_REPLICA_LAG', 2)
+    _pinned_until.set(max(_pinned_until.get(), time() + seconds))
+
+
+def is_pinned():
+    return _pinned_until.get() > time()
+
+
+# 这些语句之外（SELECT、SAVEPOINT、事务控制等）都不会修改数据
+WRITE_STATEMENTS = frozenset((
+    'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'MERGE', 'UPSERT',
+    'CREATE', 'ALTER', 'DROP', 'TRUNCATE', 'RENAME',
+))
+
+
+def pin_on_write(execute, sql, params, many, context):
+    """ connection.execute_wrapper：真正执行写语句时才固定主库 """
+    keyword = sql.lstrip()[:8].split(None, 1)
+    if keyword and keyword[0].upper() in WRITE_STATEMENTS:
+        pin_primary()
+    return execute(sql, params, many, context)
+
+
+def install_write_hook(connection, **kwargs):
+    """ 为数据库连接安装 pin_on_write，connection_created 时调用，重复调用不会重复安装 """
+    if pin_on_write not in connection.execute_wrappers:
+        connection.execute_wrappers.append(pin_on_write)
 
 
 class AppRouter:
-    db_map = getattr(settings, 'DATABASE_ROUTE_MAP', {})
+    """ 按 app_label 将模型路由到 DATABASE_ROUTE_MAP 指定的数据库，默认 default """
+
+    @property
+    def db_map(self):
+        return getattr(settings, 'DATABASE_ROUTE_MAP', {})
 
     def db_for_read(self, model, **hints):
         """
@@ -30,3 +84,74 @@ class AppRouter:
         'auth_db' database.
         """
         return self.db_map.get(app_label, 'default') == db == 'default'
+
+
+class ReplicaRouter(AppRouter):
+    """ 在 AppRouter 的基础上支持读写分离
+    读操作分散到主库对应的只读副本，写操作以及写入后 DATABASE_REPLICA_LAG 秒内的读操作走主库。
+    是否写入以实际执行的 SQL 为准（INSERT/UPDATE/DELETE 等），不是 db_for_write 的调用。
+    配合 scaffold.middlewares.middleware.ReplicaPinningMiddleware，
+    同一个请求（以及写入后的下一个请求）里写入之后的读操作都会走主库。
+
+    DATABASES = {'default': {...}, 'replica1': {...}, 'replica2': {...}}
+    DATABASE_ROUTERS = ['scaffold.utils.db_router.ReplicaRouter']
+    # 主库 -> 副本列表，可以指定权重
+    DATABASE_REPLICAS = {'default': ['replica1', ('replica2', 3)]}
+    # 副本的选择方式：random（默认）、weighted 或者 least_recent（最久没有使用的）
+    DATABASE_REPLICA_STRATEGY = 'random'
+    # 副本延迟（秒），写入之后这段时间内读主库
+    DATABASE_REPLICA_LAG = 2
+    """
+
+    def __init__(self):
+        self.last_used = dict()
+        self.lock = threading.Lock()
+        # 写语句执行时固定主库；get_or_create 之类只读到数据的操作虽然经过 db_for_write，不会固定
+        connection_created.connect(install_write_hook, dispatch_uid='scaffold.db_router.write_hook')
+        for connection in connections.all():
+            if connection.connection is not None:
+                install_write_hook(connection)
+
+    def get_replicas(self, primary):
+        """ 主库对应的 (副本, 权重) 列表 """
+        replicas = getattr(settings, 'DATABASE_REPLICAS', {}).get(primary, ())
+        return [(r, 1) if isinstance(r, str) else tuple(r) for r in replicas]
+
+    def get_primary(self, db):
+        db = db or 'default'
+        for primary, replicas in getattr(settings, 'DATABASE_REPLICAS', {}).items():
+            if any(db == (r if isinstance(r, str) else r[0]) for r in replicas):
+                return primary
+        return db
+
+    def choose_replica(self, replicas):
+        strategy = getattr(settings, 'DATABASE_REPLICA_STRATEGY', 'random')
+        if strategy == 'weighted':
+            return random.choices([r for r, _ in replicas], [w for _, w in replicas])[0]
+        if strategy == 'least_recent':
+            with self.lock:
+                replica = min((r for r, _ in replicas), key=lambda r: self.last_used.get(r, 0))
+                self.last_used[replica] = time()
+            return replica
+        return random.choice(replicas)[0]
+
+    def db_for_read(self, model, **hints):
+        primary = super().db_for_read(model, **hints)
+        replicas = self.get_replicas(primary)
+        if not replicas or is_pinned() or connections[primary].in_atomic_block:
+            return primary
+        # 关联对象跟随实例所在的数据库
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return self.choose_replica(replicas)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """ 同一个主库（包括其副本）上的对象之间允许关联 """
+        return self.get_primary(obj1._state.db) == self.get_primary(obj2._state.db)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if self.get_primary(db) != db:
+            # 副本由数据库复制同步，不需要迁移
+            return False
+        return super().allow_migrate(db, app_label, model_name, **hints)
@@ -0,0 +1,122 @@
+""" JSON 序列化
+统一 API 响应（DRF 渲染器以及 response_success/response_fail）的 JSON 编码，
+安装了 orjson 时优先使用 orjson，否则退回标准库 json。
+
+Decimal、datetime/date（按 REST_FRAMEWORK 的 DATETIME_FORMAT/DATE_FORMAT 格式化）
+以及 UUID 在两种实现下输出一致。
+NaN/Infinity 按 REST_FRAMEWORK 的 STRICT_JSON 处理，两种实现一致：
+默认（STRICT_JSON = True）抛出 ValueError，否则和标准库一样输出 NaN/Infinity。
+
+可以通过 SCAFFOLD_JSON_BACKEND = 'json' 强制使用标准库实现。
+
+带有 json_chunks() 方法的对象（例如 drf_extra_fields 的 Base64Stream）按字符串输出，
+dumps 会一次性拼接，iterdumps 则逐块编码输出，用于 StreamingHttpResponse。
+"""
+import datetime
+import decimal
+import json
+import math
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__all__ = (
+    'JSONEncoder',
+    'dumps',
+    'iterdumps',
+)
+
+
+def format_datetime(value, output_format):
+    if output_format is None or output_format.lower() == 'iso-8601':
+        representation = value.isoformat()
+        if representation.endswith('+00:00'):
+            representation = representation[:-6] + 'Z'
+        return representation
+    return value.strftime(output_format)
+
+
+class JSONEncoder(encoders.JSONEncoder):
+    """ 在 DRF JSONEncoder 的基础上按照 REST_FRAMEWORK 的配置输出日期和 Decimal """
+
+    def default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            return format_datetime(obj, api_settings.DATETIME_FORMAT)
+        elif isinstance(obj, datetime.date):
+            return format_datetime(obj, api_settings.DATE_FORMAT)
+        elif isinstance(obj, decimal.Decimal):
+            return str(obj) if api_settings.COERCE_DECIMAL_TO_STRING else float(obj)
+        elif hasattr(obj, 'json_chunks'):
+            return ''.join(obj.json_chunks())
+        return super().default(obj)
+
+
+_encoder = JSONEncoder()
+
+if orjson is not None:
+    _orjson_options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def has_non_finite(data):
+    """ 数据中是否有 NaN/Infinity（包括 Decimal） """
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    elif isinstance(data, decimal.Decimal):
+        return not data.is_finite()
+    elif isinstance(data, dict):
+        return any(has_non_finite(value) for value in data.values())
+    elif isinstance(data, (list, tuple)):
+        return any(has_non_finite(value) for value in data)
+    return False
+
+
+def dumps(data, allow_nan=None):
+    """ 将数据编码为 utf-8 的 JSON 字节串（非 ASCII 字符不转义）
+    :param allow_nan: 是否允许输出 NaN/Infinity，默认 not STRICT_JSON
+    """
+    if allow_nan is None:
+        allow_nan = not api_settings.STRICT_JSON
+    if orjson is not None and getattr(settings, 'SCAFFOLD_JSON_BACKEND', 'orjson') == 'orjson':
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=_orjson_options)
+        except TypeError:
+            # orjson 不支持的情况（例如超过 64 位的整数）退回标准库
+            pass
+        else:
+            # orjson 把 NaN/Infinity 输出为 null，只有输出中有 null 时才需要检查
+            if b'null' not in ret or not has_non_finite(data):
+                return ret
+    return json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'), allow_nan=allow_nan,
+    ).encode()
+
+
+def iterdumps(data, allow_nan=None):
+    """ 逐块输出 JSON 字节串，json_chunks() 对象的内容不会整体驻留内存 """
+    if isinstance(data, dict):
+        yield b'{'
+        for i, (key, value) in enumerate(data.items()):
+            yield (b',' if i else b'') + dumps(key if isinstance(key, str) else str(key)) + b':'
+            yield from iterdumps(value, allow_nan)
+        yield b'}'
+    elif isinstance(data, (list, tuple)):
+        yield b'['
+        for i, value in enumerate(data):
+            if i:
+                yield b','
+            yield from iterdumps(value, allow_nan)
+        yield b']'
+    elif hasattr(data, 'json_chunks'):
+        yield b'"'
+        for chunk in data.json_chunks():
+            # 去掉首尾引号，只保留转义后的内容
+            yield dumps(chunk)[1:-1]
+        yield b'"'
+    else:
+        yield dumps(data, allow_nan)
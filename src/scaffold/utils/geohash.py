@@ -0,0 +1,104 @@
+""" Geohash 编码
+用于在不支持空间索引的数据库上，以 geohash 前缀（普通 B-Tree 索引的 LIKE 'xxx%' 查询）
+粗筛附近的记录，再用经纬度计算精确距离。
+"""
+import math
+
+__all__ = (
+    'encode',
+    'decode',
+    'cell_size',
+    'precision_for_radius',
+    'neighbors',
+    'distance',
+)
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+MAX_PRECISION = 12
+EARTH_RADIUS = 6371008.8
+# 每个纬度对应的距离（米）
+METERS_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+
+
+def encode(latitude, longitude, precision=MAX_PRECISION):
+    """ 将经纬度编码为指定长度的 geohash """
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = bit = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = bits << 1 | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[bits])
+            bits = bit = 0
+    return ''.join(chars)
+
+
+def decode(geohash):
+    """ 返回 geohash 单元格的中心点 (latitude, longitude) """
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            rng[0 if bits >> shift & 1 else 1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+def cell_size(precision):
+    """ 指定长度的 geohash 单元格大小 (纬度跨度, 经度跨度)，单位为度 """
+    lng_bits = (precision * 5 + 1) // 2
+    lat_bits = precision * 5 // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def precision_for_radius(latitude, radius):
+    """ 单元格宽高都不小于 radius（米）的最长 geohash 长度，
+    此时以中心点所在单元格及其周围 8 个单元格就能覆盖整个圆
+    """
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    for precision in range(MAX_PRECISION, 0, -1):
+        lat_size, lng_size = cell_size(precision)
+        if lat_size * METERS_PER_DEGREE >= radius \
+                and lng_size * METERS_PER_DEGREE * cos_lat >= radius:
+            return precision
+    return 0
+
+
+def neighbors(geohash):
+    """ geohash 自身及其周围 8 个单元格（去重，靠近两极时会少于 9 个） """
+    if not geohash:
+        return {''}
+    precision = len(geohash)
+    latitude, longitude = decode(geohash)
+    lat_size, lng_size = cell_size(precision)
+    cells = set()
+    for dy in (-1, 0, 1):
+        lat = latitude + dy * lat_size
+        if not -90 <= lat <= 90:
+            continue
+        for dx in (-1, 0, 1):
+            lng = (longitude + dx * lng_size + 180) % 360 - 180
+            cells.add(encode(lat, lng, precision))
+    return cells
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """ 两点之间的球面距离（米） """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
@@ -1,9 +1,24 @@
+import json
 import os
 import os.path
-import pickle
-import requests
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from logging import getLogger
 from uuid import uuid4
 
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import create_cookie
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = getLogger(__name__)
+
 __all__ = {
     'UserContext',
     'response_success',
@@ -13,7 +28,22 @@ __all__ = {
 
 
 class UserContext(object):
-    """ 用于独立保存登录状态的 CookieJar 封装，可以持久化指定请求的 Cookie 以及部分 Header """
+    """ 用于独立保存登录状态的 CookieJar 封装，可以持久化指定请求的 Cookie 以及部分 Header
+    * 每个 UserContext 实例有自己的 requests.Session（Cookie 独立，不跨线程共享），
+      但是共享同一个 HTTPAdapter 连接池，复用 TCP/TLS 连接；
+    * 持久化文件只保存 Cookie 和 Header（JSON），写入时加文件锁并原子替换；
+    * 进程内用 LRU 缓存最近使用的 context 的 Cookie 和 Header 数据，
+      文件未被其他进程修改时不重复读盘。
+    注意：不要调用 self.session.close()，否则会关闭共享的连接池。
+    """
+
+    # 所有 context 共享的连接池
+    adapter = HTTPAdapter(pool_connections=20, pool_maxsize=100)
+    # 进程内缓存的 context 数量
+    cache_size = 128
+    # context_id -> (文件 mtime, JSON 数据)
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
 
     def __init__(self, context_id=''):
         self.context_id = context_id or str(uuid4())
@@ -21,32 +51,136 @@ class UserContext(object):
 
         if not os.path.isdir(os.path.dirname(self.session_file_path)):
             os.makedirs(os.path.dirname(self.session_file_path), exist_ok=True)
-        # 如果已有就读 pickle，否则创建一个新的 Session 对象
-        if os.path.isfile(self.session_file_path):
-            with open(self.session_file_path, 'rb') as file:
-                self.session = pickle.load(file)
-        else:
-            self.session = requests.Session()
+        self.session = self.load_session()
+
+    def load_session(self):
+        """ 创建本实例的 session，Cookie 和 Header 优先从进程内缓存获取，文件有变化时才重新读取 """
+        session = requests.Session()
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
         # 统一限定 UserAgent 免得有些站点闹别扭
-        self.session.headers.update({
+        session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_4) '
                           'AppleWebKit/603.1.30 (KHTML, like Gecko) Version/10.1 Safari/603.1.30'
         })
+        data = self.load_data()
+        if data is not None:
+            self.restore(session, data)
+        return session
+
+    def load_data(self):
+        mtime = self.get_mtime()
+        if mtime is None:
+            return None
+        with self._cache_lock:
+            entry = self._cache.get(self.context_id)
+            if entry is not None and entry[0] == mtime:
+                self._cache.move_to_end(self.context_id)
+                return entry[1]
+        try:
+            with self.lock(shared=True):
+                with open(self.session_file_path, 'rb') as file:
+                    # 从打开的文件读取 mtime，与读到的内容一致
+                    mtime = os.fstat(file.fileno()).st_mtime_ns
+                    content = file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            data = json.loads(content.decode())
+        except ValueError:
+            # 旧版本直接 pickle 整个 Session 的文件不再读取：文件位于 MEDIA_ROOT 下，不能信任其内容
+            logger.warning('Ignored the session file of context %s in legacy pickle format, '
+                           'the context starts with no cookies.', self.context_id)
+            return None
+        self.cache_data(data, mtime)
+        return data
+
+    @staticmethod
+    def restore(session, data):
+        session.headers.update(data.get('headers', {}))
+        for cookie in data.get('cookies', []):
+            session.cookies.set_cookie(create_cookie(**cookie))
+
+    @staticmethod
+    def dump_cookies(jar):
+        return [dict(
+            name=cookie.name,
+            value=cookie.value,
+            domain=cookie.domain,
+            path=cookie.path,
+            secure=cookie.secure,
+            expires=cookie.expires,
+            discard=cookie.discard,
+            rest=cookie._rest,
+        ) for cookie in jar]
+
+    def cache_data(self, data, mtime):
+        with self._cache_lock:
+            self._cache[self.context_id] = (mtime, data)
+            self._cache.move_to_end(self.context_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get_mtime(self):
+        try:
+            return os.stat(self.session_file_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def lock(self, shared=False):
+        return self.file_lock(self.session_file_path, shared)
+
+    @staticmethod
+    @contextmanager
+    def file_lock(path, shared=False):
+        """ 跨进程文件锁，不支持 fcntl 的平台上只依赖原子替换
+        锁文件一直保留，删除它会让其他进程在同一路径的新文件上加锁，锁就失效了
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
     def save(self):
-        with open(self.session_file_path, 'wb') as file:
-            pickle.dump(self.session, file)
+        data = dict(
+            headers=dict(self.session.headers),
+            cookies=self.dump_cookies(self.session.cookies),
+        )
+        content = json.dumps(data).encode()
+        directory = os.path.dirname(self.session_file_path)
+        with self.lock():
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + self.context_id)
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    file.write(content)
+                    file.flush()
+                    # os.replace 不改变 inode 和 mtime，替换之前读取，避免读到其他进程之后写入的文件
+                    mtime = os.fstat(file.fileno()).st_mtime_ns
+                os.replace(tmp_path, self.session_file_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self.cache_data(data, mtime)
 
     def delete(self):
-        if os.path.isfile(self.session_file_path):
-            os.remove(self.session_file_path)
+        self.destroy(self.context_id)
 
     @classmethod
     def destroy(cls, context_id):
         """ 销毁一个 context_id 的缓存文件 """
         session_file = os.path.join(cls.get_session_dir(), context_id)
-        if os.path.isfile(session_file):
-            os.remove(session_file)
+        if not os.path.isdir(os.path.dirname(session_file)):
+            return
+        with cls.file_lock(session_file):
+            with cls._cache_lock:
+                cls._cache.pop(context_id, None)
+            if os.path.isfile(session_file):
+                os.remove(session_file)
 
     @classmethod
     def get_session_dir(cls):
@@ -72,8 +206,7 @@ def response_success(msg=None, *, data=None, silent=False):
         payload['silent'] = True
     if data is not None:
         payload['data'] = data
-    from django.http import JsonResponse
-    return JsonResponse(payload, json_dumps_params=dict(ensure_ascii=False))
+    return _json_response(payload)
 
 
 def response_fail(msg=None, errcode=0, *, status=400, data=None, silent=False):
@@ -86,8 +219,13 @@ def response_fail(msg=None, errcode=0, *, status=400, data=None, silent=False):
         payload['data'] = data
     if errcode:
         payload['errcode'] = errcode
-    from django.http import JsonResponse
-    return JsonResponse(payload, status=status, json_dumps_params=dict(ensure_ascii=False))
+    return _json_response(payload, status=status)
+
+
+def _json_response(payload, status=200):
+    from django.http import HttpResponse
+    from .fastjson import dumps
+    return HttpResponse(dumps(payload), status=status, content_type='application/json')
 
 
 def requests_ssl_strict_off(level=1):
@@ -0,0 +1,117 @@
+""" 后台批量处理
+队列加上按需启动的守护线程，线程把队列中积压的数据合并成一批交给 process(batch) 处理：
+
+    class Writer(BatchWorker):
+        name = 'my-writer'
+        batch_size = 200
+
+        def process(self, batch):
+            ...
+
+    writer = Writer(maxsize=10000)
+    writer.put(item)
+
+- 线程在第一次入队时启动，fork 之后的子进程（worker_pid 不同）会重新启动自己的线程；
+- 每批处理完后关闭线程内的数据库连接；
+- 进程正常退出时（atexit）同步处理队列中剩余的数据，并等待正在处理的一批完成，
+  最多等待 drain_timeout 秒。
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.db import connections
+
+__all__ = (
+    'BatchWorker',
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWorker(object):
+    """ 队列 + 守护线程的批量处理器，子类实现 process(batch) """
+    name = 'scaffold-worker'
+    batch_size = 100
+    drain_timeout = 10
+
+    def __init__(self, maxsize=0):
+        self.queue = queue.Queue(maxsize)
+        self.worker_lock = threading.Lock()
+        self.worker = None
+        self.worker_pid = None
+        self.exit_registered = False
+
+    def process(self, batch):
+        raise NotImplementedError
+
+    def put(self, item):
+        """ 入队，队列已满时返回 False """
+        self.ensure_worker()
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            return False
+        return True
+
+    def ensure_worker(self):
+        """ 按需启动后台线程，fork 之后的子进程需要重新启动 """
+        if self.worker_pid == os.getpid() and self.worker.is_alive():
+            return
+        with self.worker_lock:
+            if self.worker_pid == os.getpid() and self.worker.is_alive():
+                return
+            if not self.exit_registered:
+                atexit.register(self.drain)
+                self.exit_registered = True
+            self.worker = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.worker.start()
+            self.worker_pid = os.getpid()
+
+    def get_batch(self, block=True):
+        try:
+            batch = [self.queue.get(block)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def process_batch(self, batch):
+        try:
+            self.process(batch)
+        except Exception:
+            logger.exception('%s failed to process %d items', self.name, len(batch))
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def run(self):
+        while True:
+            try:
+                self.process_batch(self.get_batch())
+            finally:
+                connections.close_all()
+
+    def drain(self, timeout=None):
+        """ 在当前线程处理完队列中剩余的数据，并等待后台线程处理中的批次 """
+        if self.worker_pid != os.getpid():
+            return
+        while True:
+            batch = self.get_batch(block=False)
+            if not batch:
+                break
+            self.process_batch(batch)
+        deadline = time.monotonic() + (self.drain_timeout if timeout is None else timeout)
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.queue.all_tasks_done.wait(remaining)
@@ -0,0 +1,26 @@
+""" Configure Django for the test suite without pytest-django
+
+The test database is created once per session, django.test.TestCase
+subclasses then run inside transactions as usual.
+"""
+import os
+import sys
+
+import django
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+def pytest_configure(config):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+    django.setup()
+    from django.test.utils import setup_databases, setup_test_environment
+    setup_test_environment()
+    config._scaffold_databases = setup_databases(verbosity=0, interactive=False)
+
+
+def pytest_unconfigure(config):
+    from django.test.utils import teardown_databases, teardown_test_environment
+    if getattr(config, '_scaffold_databases', None) is not None:
+        teardown_databases(config._scaffold_databases, verbosity=0)
+        teardown_test_environment()
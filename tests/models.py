@@ -0,0 +1,68 @@
+""" Concrete models built on the scaffold abstract models, for tests only """
+from django.conf import settings
+from django.db import models
+
+from scaffold.models.abstract.member import (
+    AbstractOAuthEntry, MemberConstellationMixin, MemberLocationMixin, MemberPinyinMixin,
+)
+from scaffold.apps.media.models import GalleryModel
+from scaffold.models.abstract.meta import DirtyFieldsModel
+
+
+class Document(models.Model):
+    """ 不是附件模型，但可能引用附件模型存放的文件 """
+    file = models.FileField(upload_to='images/', blank=True)
+
+
+class Place(MemberLocationMixin):
+    name = models.CharField(max_length=50)
+
+
+if settings.SPATIALITE:
+    from scaffold.models.abstract.member import MemberGeoLocationMixin
+
+    class GeoPlace(MemberGeoLocationMixin):
+        name = models.CharField(max_length=50)
+
+
+class Membership(DirtyFieldsModel):
+    group = models.IntegerField()
+    name = models.CharField(max_length=50)
+    code = models.CharField(max_length=50, blank=True)
+    note = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        unique_together = [('group', 'name')]
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'code'], name='membership_group_code'),
+        ]
+
+
+class Article(DirtyFieldsModel):
+    title = models.CharField(max_length=50)
+    body = models.TextField(blank=True)
+    slug = models.CharField(max_length=50, blank=True)
+    date_updated = models.DateTimeField(auto_now=True)
+
+
+class OAuthEntry(AbstractOAuthEntry):
+
+    class Meta(AbstractOAuthEntry.Meta):
+        db_table = 'tests_oauth_entry'
+
+
+class Profile(MemberPinyinMixin, MemberConstellationMixin):
+    """ 没有继承 DirtyFieldsModel，每次保存都重新计算 """
+    nickname = models.CharField(max_length=255, blank=True, default='')
+    birthday = models.DateField(null=True, blank=True)
+    signature = models.CharField(max_length=255, blank=True, default='')
+
+
+class TrackedProfile(DirtyFieldsModel, MemberPinyinMixin, MemberConstellationMixin):
+    nickname = models.CharField(max_length=255, blank=True, default='')
+    birthday = models.DateField(null=True, blank=True)
+    signature = models.CharField(max_length=255, blank=True, default='')
+
+
+class Album(GalleryModel):
+    name = models.CharField(max_length=50)
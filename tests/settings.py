@@ -0,0 +1,67 @@
+""" Settings of the scaffold test suite, run with `make pytest` (pytest tests/)
+
+SCAFFOLD_TEST_SPATIALITE=1 runs the suite on SpatiaLite (needs GDAL/GEOS and
+mod_spatialite), which also enables the GIS tests.
+"""
+import os
+import tempfile
+
+SECRET_KEY = 'scaffold-tests'
+USE_TZ = True
+TIME_ZONE = 'Asia/Shanghai'
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'rest_framework',
+    'django_filters',
+    'scaffold.restframework',
+    'scaffold.apps.media',
+    'scaffold.apps.config',
+    'scaffold.apps.search',
+    'tests',
+]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+}
+
+SPATIALITE = bool(os.environ.get('SCAFFOLD_TEST_SPATIALITE'))
+if SPATIALITE:
+    INSTALLED_APPS.insert(0, 'django.contrib.gis')
+    DATABASES['default']['ENGINE'] = 'django.contrib.gis.db.backends.spatialite'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+    'tiered': {
+        'BACKEND': 'scaffold.utils.cache.TieredCache',
+        'LOCATION': 'shared',
+    },
+}
+
+MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+]
+
+ROOT_URLCONF = 'tests.urls'
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='scaffold-tests-media-')
+MEDIA_URL = '/media/'
+SCAFFOLD_AUTO_DELETE_FILE = True
+SCAFFOLD_ASYNC_FILE_CLEANUP = False
+
+CUSTOM_SESSION_HEADER = 'SESSION-ID'
+
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -0,0 +1,69 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+TIERED = {
+    'BACKEND': 'scaffold.utils.cache.TieredCache',
+    'LOCATION': 'shared',
+    'OPTIONS': {'LOCAL_TIMEOUT': 60, 'LOCAL_MAX_ENTRIES': 3},
+}
+
+
+def in_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+class TieredCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        caches['tiered'].clear()
+
+    @property
+    def cache(self):
+        return caches['tiered']
+
+    def test_local_tier_serves_reads(self):
+        self.cache.set('k', {'a': 1})
+        caches['shared'].set('k', 'changed elsewhere')
+        # 本地层在 LOCAL_TIMEOUT 内命中
+        value = self.cache.get('k')
+        self.assertEqual(value, {'a': 1})
+        value['a'] = 2
+        self.assertEqual(self.cache.get('k'), {'a': 1})
+        self.cache.clear_local()
+        self.assertEqual(self.cache.get('k'), 'changed elsewhere')
+
+    def test_invalidation_crosses_threads(self):
+        self.cache.set('k', 1)
+        self.assertEqual(self.cache.get('k'), 1)
+        other = in_thread(lambda: caches['tiered'])
+        self.assertIsNot(other, self.cache)
+        in_thread(lambda: caches['tiered'].delete('k'))
+        self.assertIsNone(self.cache.get('k'))
+        in_thread(lambda: caches['tiered'].set('k', 2))
+        caches['shared'].delete('k')
+        # 其他线程写入的值进入共用的本地层
+        self.assertEqual(self.cache.get('k'), 2)
+
+    def test_incr_reads_shared_tier(self):
+        self.cache.set('n', 1)
+        self.assertEqual(in_thread(lambda: caches['tiered'].incr('n')), 2)
+        self.assertEqual(self.cache.get('n'), 2)
+
+    @override_settings(CACHES={
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+        'tiered': dict(TIERED, OPTIONS={'LOCAL_TIMEOUT': 0.05, 'LOCAL_MAX_ENTRIES': 2}),
+    })
+    def test_local_expiry_and_size(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.assertLessEqual(len(self.cache._local), 2)
+        caches['shared'].set('c', 'new')
+        time.sleep(0.06)
+        self.assertEqual(self.cache.get('c'), 'new')
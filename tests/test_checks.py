@@ -0,0 +1,35 @@
+import sys
+from unittest import mock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.checks import registry
+from django.test import SimpleTestCase, override_settings
+
+import scaffold
+from scaffold.checks import check_database_connections
+
+
+class DatabaseChecksTest(SimpleTestCase):
+
+    def test_registered_by_restframework(self):
+        self.assertNotIn('scaffold.modules', settings.INSTALLED_APPS)
+        # 重新导入 scaffold.checks，确认由 scaffold.restframework 的 ready() 注册
+        with mock.patch.dict(sys.modules), mock.patch.object(scaffold, 'checks'), \
+                mock.patch.object(registry.registry, 'registered_checks', set()):
+            del sys.modules['scaffold.checks']
+            del scaffold.checks
+            apps.get_app_config('restframework').ready()
+            self.assertEqual(
+                [check.__module__ for check in registry.registry.get_checks()], ['scaffold.checks'])
+
+    @override_settings(DATABASES={
+        'default': {'ENGINE': 'django.db.backends.sqlite3'},
+        'mysql': {'ENGINE': 'django.db.backends.mysql', 'CONN_MAX_AGE': 0,
+                  'OPTIONS': {'init_command': 'SET default_storage_engine=MYISAM'}},
+        'pooled': {'ENGINE': 'dj_db_conn_pool.backends.mysql', 'CONN_MAX_AGE': 0, 'POOL_OPTIONS': {}},
+    })
+    def test_warnings(self):
+        warnings = check_database_connections()
+        self.assertEqual([w.id for w in warnings], ['scaffold.W001', 'scaffold.W002'])
+        self.assertIn('"mysql"', warnings[0].msg)
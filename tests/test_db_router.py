@@ -0,0 +1,117 @@
+import threading
+from time import time
+
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from scaffold.middlewares.middleware import ReplicaPinningMiddleware
+from scaffold.utils import db_router
+from tests.models import Article
+
+REPLICAS = dict(DATABASE_REPLICAS={'default': ['replica1', 'replica2']}, DATABASE_REPLICA_LAG=2)
+
+
+class PinnedTestMixin:
+
+    def setUp(self):
+        super().setUp()
+        token = db_router._pinned_until.set(0.0)
+        self.addCleanup(db_router._pinned_until.reset, token)
+
+
+@override_settings(**REPLICAS)
+class ReplicaRouterTest(PinnedTestMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.router = db_router.ReplicaRouter()
+        self.addCleanup(self.remove_hook)
+
+    @staticmethod
+    def remove_hook():
+        if db_router.pin_on_write in connection.execute_wrappers:
+            connection.execute_wrappers.remove(db_router.pin_on_write)
+
+    def test_reads_go_to_replicas_until_pinned(self):
+        self.assertIn(self.router.db_for_read(Article), ('replica1', 'replica2'))
+        self.assertEqual(self.router.db_for_write(Article), 'default')
+        # 只是选择写库不会固定主库
+        self.assertFalse(db_router.is_pinned())
+        db_router.pin_primary()
+        self.assertEqual(self.router.db_for_read(Article), 'default')
+
+    @override_settings(DATABASE_REPLICA_STRATEGY='least_recent')
+    def test_least_recent_thread_safe(self):
+        used = []
+
+        def read():
+            for _ in range(200):
+                used.append(self.router.db_for_read(Article))
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(used), 800)
+        self.assertEqual(set(self.router.last_used), {'replica1', 'replica2'})
+
+    def test_relations_and_migrations(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'tests'))
+        self.assertTrue(self.router.allow_migrate('default', 'tests'))
+        self.assertEqual(self.router.get_primary('replica2'), 'default')
+
+
+class WriteHookTest(PinnedTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        db_router.install_write_hook(connection)
+        self.addCleanup(connection.execute_wrappers.remove, db_router.pin_on_write)
+
+    def test_pinned_only_by_writes(self):
+        Article.objects.filter(pk=0).exists()
+        self.assertFalse(db_router.is_pinned())
+        Article.objects.create(title='a')
+        self.assertTrue(db_router.is_pinned())
+
+    def test_get_or_create_hit_does_not_pin(self):
+        Article.objects.create(title='a')
+        db_router._pinned_until.set(0.0)
+        self.assertFalse(db_router.is_pinned())
+        Article.objects.get_or_create(title='a')
+        self.assertFalse(db_router.is_pinned())
+
+    def test_installed_once(self):
+        db_router.install_write_hook(connection)
+        self.assertEqual(connection.execute_wrappers.count(db_router.pin_on_write), 1)
+
+
+@override_settings(**REPLICAS)
+class ReplicaPinningMiddlewareTest(PinnedTestMixin, SimpleTestCase):
+
+    def request(self, cookie=None, write=False):
+        middleware = ReplicaPinningMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/')
+        if cookie is not None:
+            request.COOKIES[middleware.cookie_name] = cookie
+        middleware.process_request(request)
+        pinned_until = db_router._pinned_until.get()
+        if write:
+            db_router.pin_primary()
+        response = middleware.process_response(request, HttpResponse())
+        return pinned_until, response.cookies.get(middleware.cookie_name)
+
+    def test_cookie_clamped(self):
+        for cookie in (str(time() + 10 ** 9), 'inf', 'nan', 'x'):
+            pinned_until, _ = self.request(cookie)
+            self.assertLessEqual(pinned_until, time() + 2, cookie)
+
+    def test_cookie_set_after_write(self):
+        _, cookie = self.request()
+        self.assertIsNone(cookie)
+        _, cookie = self.request(write=True)
+        self.assertLessEqual(cookie['max-age'], 2)
+        pinned_until, _ = self.request(cookie.value)
+        self.assertGreater(pinned_until, time())
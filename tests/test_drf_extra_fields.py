@@ -0,0 +1,197 @@
+import base64
+import hashlib
+import io
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework import serializers
+
+from scaffold.libs.drf_extra_fields import fields
+from scaffold.libs.drf_extra_fields.fields import (
+    Base64Cache, Base64ImageField, Base64Stream, iter_base64_decode,
+)
+from scaffold.restframework.renderers import streaming_response
+from scaffold.utils import fastjson
+
+
+def make_png(size=(8, 8)):
+    f = io.BytesIO()
+    Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(f, 'PNG')
+    return f.getvalue()
+
+
+def small_chunks(data, start=0):
+    return iter_base64_decode(data, start, chunk_size=16)
+
+
+class RecordingImageField(Base64ImageField):
+    """ 记录用于判断类型的数据 """
+
+    def __init__(self, *args, **kwargs):
+        self.sniffed = []
+        super().__init__(*args, **kwargs)
+
+    def get_file_extension(self, filename, decoded_file):
+        self.sniffed.append(decoded_file)
+        return super().get_file_extension(filename, decoded_file)
+
+
+class Base64DecodeTest(SimpleTestCase):
+
+    def setUp(self):
+        self.png = make_png()
+        self.encoded = base64.b64encode(self.png).decode()
+
+    def decode(self, data, **kwargs):
+        file = Base64ImageField(**kwargs).to_internal_value(data)
+        self.addCleanup(file.close)
+        return file
+
+    def test_iter_base64_decode_whitespace(self):
+        wrapped = '\n'.join(self.encoded[i:i + 76] for i in range(0, len(self.encoded), 76))
+        wrapped = 'header,' + wrapped.replace('A', ' A\t')
+        for chunk_size in [4, 8, 10, 64 * 1024]:
+            chunks = list(iter_base64_decode(wrapped, len('header,'), chunk_size))
+            self.assertEqual(b''.join(chunks), self.png, chunk_size)
+
+    def test_decode(self):
+        file = self.decode('data:image/png;base64,' + self.encoded)
+        self.assertIsInstance(file, InMemoryUploadedFile)
+        self.assertTrue(file.name.endswith('.png'))
+        self.assertEqual(file.content_type, 'image/png')
+        self.assertEqual((file.size, file.read()), (len(self.png), self.png))
+        self.assertEqual(file.content_hash, hashlib.sha256(self.png).hexdigest())
+
+    def test_spooled_to_temporary_file(self):
+        png = make_png((64, 64))
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024):
+            file = self.decode(base64.encodebytes(png).decode())
+        self.assertIsInstance(file, TemporaryUploadedFile)
+        self.assertTrue(os.path.exists(file.temporary_file_path()))
+        self.assertEqual((file.size, file.read()), (len(png), png))
+        self.assertEqual(file.content_hash, hashlib.sha256(png).hexdigest())
+
+    @mock.patch.object(fields, 'iter_base64_decode', small_chunks)
+    def test_type_sniffed_from_first_chunk(self):
+        field = RecordingImageField()
+        file = field.to_internal_value(self.encoded)
+        self.addCleanup(file.close)
+        self.assertEqual(field.sniffed, [self.png[:12]])
+
+    def test_size_limit_before_decoding(self):
+        with mock.patch.object(fields, 'iter_base64_decode') as decode, \
+                self.assertRaisesMessage(ValidationError, 'The file is too large.'):
+            Base64ImageField(max_decoded_size=len(self.png) // 2).to_internal_value(self.encoded)
+        decode.assert_not_called()
+
+    @mock.patch.object(fields, 'iter_base64_decode', wraps=small_chunks)
+    def test_size_limit_while_decoding(self, decode):
+        # 在预先检查的余量之内，解码之后才发现超过限制
+        data = b'\x89PNG\r\n\x1a\n' + b'\0' * 1000
+        with self.assertRaisesMessage(ValidationError, 'The file is too large.'):
+            Base64ImageField(max_decoded_size=len(data) - 5).to_internal_value(
+                base64.b64encode(data).decode())
+        decode.assert_called_once()
+
+    @override_settings(BASE64_FILE_MAX_SIZE=10)
+    def test_size_limit_setting(self):
+        with self.assertRaisesMessage(ValidationError, 'The file is too large.'):
+            Base64ImageField().to_internal_value(self.encoded)
+
+    def test_invalid(self):
+        field = Base64ImageField()
+        self.assertIsNone(field.to_internal_value(''))
+        for data in ['data:image/png;base64,a===', '=' + self.encoded, ' \n ', 'abc']:
+            with self.subTest(data=data[-8:]), \
+                    self.assertRaisesMessage(ValidationError, 'Please upload a valid image.'):
+                field.to_internal_value(data)
+
+    def test_unknown_type(self):
+        with self.assertRaisesMessage(ValidationError, "The type of the image couldn't be determined."):
+            Base64ImageField().to_internal_value(base64.b64encode(b'plain text file').decode())
+
+
+class Base64RepresentationTest(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.addCleanup(fields.base64_cache.clear)
+
+    def write(self, name, data, mtime_ns=None):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def test_cache_key(self):
+        cache = Base64Cache(max_bytes=1024)
+        path = self.write('a', b'abcdef', 10 ** 18)
+        self.assertEqual(cache.get(path), 'YWJjZGVm')
+        # 内容改变但 mtime 和大小相同时命中缓存
+        self.write('a', b'ABCDEF', 10 ** 18)
+        self.assertEqual(cache.get(path), 'YWJjZGVm')
+        self.write('a', b'ABCDEF', 10 ** 18 + 1)
+        self.assertEqual(cache.get(path), 'QUJDREVG')
+        self.write('a', b'ABCDEFGHI', 10 ** 18 + 1)
+        self.assertEqual(cache.get(path), 'QUJDREVGR0hJ')
+        self.assertEqual(len(cache.entries), 3)
+
+    def test_cache_hit_does_not_read(self):
+        cache = Base64Cache(max_bytes=1024)
+        path = self.write('a', b'abcdef')
+        cache.get(path)
+        with mock.patch('builtins.open') as open_:
+            self.assertEqual(cache.get(path), 'YWJjZGVm')
+        open_.assert_not_called()
+
+    def test_cache_eviction(self):
+        cache = Base64Cache(max_bytes=20)
+        a, b, c = [self.write(name, b'123456') for name in 'abc']
+        cache.get(a)
+        cache.get(b)
+        cache.get(a)
+        cache.get(c)
+        self.assertEqual([key[0] for key in cache.entries], [a, c])
+        self.assertEqual(cache.total, 16)
+        # 超过预算的文件不缓存
+        cache.get(self.write('big', b'x' * 30))
+        self.assertEqual([key[0] for key in cache.entries], [a, c])
+        cache.clear()
+        self.assertEqual((len(cache.entries), cache.total), (0, 0))
+
+    def test_cache_disabled(self):
+        path = self.write('a', b'abcdef')
+        with override_settings(BASE64_CACHE_MAX_BYTES=0):
+            cache = Base64Cache()
+            self.assertEqual(cache.get(path), 'YWJjZGVm')
+            self.assertEqual(len(cache.entries), 0)
+
+    @mock.patch.object(Base64Stream, 'read_size', 6)
+    def test_stream(self):
+        data = os.urandom(100)
+        path = self.write('image.png', data)
+
+        class ImageSerializer(serializers.Serializer):
+            image = Base64ImageField(represent_in_base64=True, stream_base64=True)
+            cached = Base64ImageField(represent_in_base64=True, source='image')
+
+        payload = {'items': [ImageSerializer(SimpleNamespace(image=SimpleNamespace(path=path))).data]}
+        stream = payload['items'][0]['image']
+        self.assertIsInstance(stream, Base64Stream)
+        self.assertEqual(len(list(stream.json_chunks())), 17)
+        self.assertEqual(str(stream), base64.b64encode(data).decode())
+        self.assertEqual(payload['items'][0]['cached'], str(stream))
+        for backend in ['orjson', 'json']:
+            with self.subTest(backend=backend), override_settings(SCAFFOLD_JSON_BACKEND=backend):
+                self.assertEqual(b''.join(fastjson.iterdumps(payload)), fastjson.dumps(payload))
+        response = streaming_response(payload)
+        self.assertEqual(b''.join(response.streaming_content), fastjson.dumps(payload))
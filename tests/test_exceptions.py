@@ -0,0 +1,79 @@
+import io
+import time
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from scaffold.exceptions.reporter import ErrorReporter, reporter
+
+
+def raise_error(message='boom'):
+    try:
+        raise ValueError(message)
+    except ValueError as e:
+        return e
+
+
+def wait_for(predicate, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@override_settings(DEBUG=False)
+class ErrorReporterTest(TestCase):
+
+    def test_traceback_is_formatted_before_queuing(self):
+        stream = io.StringIO()
+        errors = ErrorReporter(stream=stream)
+        # 不启动后台线程，直接检查队列中的内容
+        errors.ensure_worker = lambda: None
+        errors.report(raise_error())
+        key, text, suppressed = errors.queue.get_nowait()
+        self.assertIsInstance(text, str)
+        self.assertIn('ValueError: boom', text)
+        self.assertIn('raise_error', text)
+
+    def test_written_by_worker(self):
+        stream = io.StringIO()
+        errors = ErrorReporter(stream=stream)
+        errors.report(raise_error())
+        self.assertTrue(wait_for(lambda: 'ValueError: boom' in stream.getvalue()))
+
+    def test_rate_limit_and_counters(self):
+        errors = ErrorReporter(stream=io.StringIO())
+        errors.ensure_worker = lambda: None
+        errors.traceback_limit = 2
+        for _ in range(5):
+            errors.report(raise_error())
+        errors.report(KeyError('x'), capture=False)
+        self.assertEqual(errors.queue.qsize(), 2)
+        snapshot = errors.snapshot()
+        self.assertEqual(snapshot['classes'], {'ValueError': 5, 'KeyError': 1})
+        self.assertEqual(sum(snapshot['fingerprints'].values()), 6)
+
+    def test_expired_windows_are_purged(self):
+        errors = ErrorReporter(stream=io.StringIO())
+        errors.ensure_worker = lambda: None
+        errors.window = 60
+        errors.windows = {'old-{}'.format(i): [time.time() - 120, 1, 0] for i in range(100)}
+        errors.report(raise_error())
+        self.assertEqual(len(errors.windows), 1)
+
+
+class ErrorStatsViewTest(TestCase):
+
+    def test_staff_only(self):
+        user = User.objects.create_user('user', password='pass')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/error_stats/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        reporter.report(KeyError('x'), capture=False)
+        response = self.client.get('/api/error_stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.json()['data']['classes']['KeyError'], 1)
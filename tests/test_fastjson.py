@@ -0,0 +1,77 @@
+import datetime
+import decimal
+import uuid
+
+from django.test import SimpleTestCase, override_settings
+
+from scaffold.restframework.renderers import JSONRenderer
+from scaffold.utils import fastjson
+
+BACKENDS = ['orjson', 'json']
+
+
+class FastJSONTest(SimpleTestCase):
+
+    def assertDumps(self, data, expected, **kwargs):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), override_settings(SCAFFOLD_JSON_BACKEND=backend):
+                self.assertEqual(fastjson.dumps(data, **kwargs), expected)
+
+    def assertRaisesOnDumps(self, data, **kwargs):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), override_settings(SCAFFOLD_JSON_BACKEND=backend):
+                with self.assertRaises(ValueError):
+                    fastjson.dumps(data, **kwargs)
+
+    def test_decimal(self):
+        self.assertDumps({'d': decimal.Decimal('1.10')}, b'{"d":"1.10"}')
+        with override_settings(REST_FRAMEWORK={'COERCE_DECIMAL_TO_STRING': False}):
+            self.assertDumps({'d': decimal.Decimal('1.10')}, b'{"d":1.1}')
+
+    def test_datetime(self):
+        value = datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc)
+        self.assertDumps(
+            [value, value.replace(tzinfo=None), value.date()],
+            b'["2024-01-02T03:04:05.123456Z","2024-01-02T03:04:05.123456","2024-01-02"]')
+        with override_settings(REST_FRAMEWORK={'DATETIME_FORMAT': '%Y-%m-%d %H:%M', 'DATE_FORMAT': '%m/%d'}):
+            self.assertDumps([value, value.date()], b'["2024-01-02 03:04","01/02"]')
+
+    def test_uuid(self):
+        value = uuid.UUID('12345678-1234-5678-1234-567812345678')
+        self.assertDumps({'id': value}, b'{"id":"12345678-1234-5678-1234-567812345678"}')
+
+    def test_non_ascii_and_big_int(self):
+        self.assertDumps({'name': '张三', 'n': 2 ** 70}, '{"name":"张三","n":1180591620717411303424}'.encode())
+
+    def test_non_finite_strict(self):
+        for value in [float('nan'), float('inf'), -float('inf')]:
+            self.assertRaisesOnDumps({'x': value, 'y': None})
+            self.assertRaisesOnDumps([1, [value]])
+        with override_settings(REST_FRAMEWORK={'COERCE_DECIMAL_TO_STRING': False}):
+            self.assertRaisesOnDumps({'d': decimal.Decimal('NaN')})
+
+    def test_non_finite_allowed(self):
+        self.assertDumps({'x': float('nan'), 'y': None}, b'{"x":NaN,"y":null}', allow_nan=True)
+        with override_settings(REST_FRAMEWORK={'STRICT_JSON': False}):
+            self.assertDumps([float('inf')], b'[Infinity]')
+
+    def test_iterdumps(self):
+        data = {'a': [1, 'b', None, {'c': decimal.Decimal('2.5')}], 3: 'x'}
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), override_settings(SCAFFOLD_JSON_BACKEND=backend):
+                self.assertEqual(b''.join(fastjson.iterdumps(data)), fastjson.dumps(data))
+        with self.assertRaises(ValueError):
+            b''.join(fastjson.iterdumps({'x': [float('nan')]}))
+
+
+class JSONRendererTest(SimpleTestCase):
+
+    def test_strict(self):
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({'x': float('nan'), 'y': 2 ** 70})
+
+    def test_not_strict(self):
+        renderer = JSONRenderer()
+        renderer.strict = False
+        self.assertEqual(renderer.render({'x': float('nan'), 'y': 2 ** 70}),
+                         b'{"x":NaN,"y":1180591620717411303424}')
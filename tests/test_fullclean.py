@@ -0,0 +1,68 @@
+from django.core.exceptions import ValidationError
+from django.db.models.signals import pre_save
+from django.test import TestCase
+
+import scaffold.modules
+from scaffold.modules.fullclean import (
+    connect_receivers, disconnect_receivers, full_clean_changed, get_changed_fields,
+    pre_save_full_clean_handler,
+)
+from scaffold.modules.apps import MetaConfig
+from tests.models import Membership
+
+
+class FullCleanChangedTest(TestCase):
+
+    def setUp(self):
+        Membership.objects.create(group=1, name='a', code='x')
+        self.member = Membership.objects.create(group=1, name='b', code='y')
+        self.member = Membership.objects.get(pk=self.member.pk)
+
+    def clean(self, update_fields=None):
+        full_clean_changed(self.member, get_changed_fields(self.member, update_fields))
+
+    def test_unique_together(self):
+        self.member.name = 'a'
+        with self.assertRaises(ValidationError) as cm:
+            self.clean()
+        self.assertIn('__all__', cm.exception.message_dict)
+        with self.assertRaises(ValidationError):
+            self.clean(update_fields=['name'])
+
+    def test_unique_constraint(self):
+        self.member.code = 'x'
+        with self.assertRaises(ValidationError):
+            self.clean()
+
+    def test_unrelated_change(self):
+        self.member.note = 'note'
+        self.assertEqual(get_changed_fields(self.member), {'note'})
+        self.clean()
+        self.member.name = 'c'
+        self.clean()
+
+    def test_not_connected_on_import(self):
+        self.assertNotIn(pre_save_full_clean_handler, [ref() for key, ref in pre_save.receivers])
+
+
+class PreSaveFullCleanTest(TestCase):
+
+    def setUp(self):
+        # scaffold.modules 没有安装，只在这里连接 pre_save 校验
+        connect_receivers()
+        self.addCleanup(disconnect_receivers)
+        Membership.objects.create(group=1, name='a', code='x')
+        Membership.objects.create(group=1, name='b', code='y')
+        self.member = Membership.objects.get(name='b')
+
+    def test_pre_save_receiver(self):
+        self.member.name = 'a'
+        with self.assertRaises(ValidationError):
+            self.member.save()
+        self.member.name = 'c'
+        self.member.save()
+
+    def test_connected_by_app_config(self):
+        disconnect_receivers()
+        MetaConfig('scaffold.modules', scaffold.modules).ready()
+        self.assertIn(pre_save_full_clean_handler, [ref() for key, ref in pre_save.receivers])
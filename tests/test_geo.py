@@ -0,0 +1,148 @@
+import json
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from scaffold.exceptions.exceptions import AppError
+from scaffold.models.abstract import member
+from scaffold.restframework.filters import NearbyFilterBackend
+from scaffold.utils import geohash
+from tests.models import Place
+
+
+class GeohashTest(SimpleTestCase):
+
+    def test_encode_decode(self):
+        self.assertEqual(geohash.encode(42.6, -5.6, 5), 'ezs42')
+        latitude, longitude = geohash.decode('ezs42')
+        self.assertAlmostEqual(latitude, 42.6, delta=0.03)
+        self.assertAlmostEqual(longitude, -5.6, delta=0.03)
+
+    def test_neighbors_wrap_antimeridian(self):
+        cells = geohash.neighbors(geohash.encode(0, 179.99, 5))
+        self.assertEqual(len(cells), 9)
+        self.assertIn(geohash.encode(0, -179.99, 5), cells)
+
+    def test_precision_for_radius(self):
+        precision = geohash.precision_for_radius(23.13, 1000)
+        lat_size, lng_size = geohash.cell_size(precision)
+        self.assertGreaterEqual(lat_size * geohash.METERS_PER_DEGREE, 1000)
+        self.assertLess(geohash.cell_size(precision + 1)[0] * geohash.METERS_PER_DEGREE, 1000)
+
+
+class NearbyFilterTest(TestCase):
+    backend = NearbyFilterBackend()
+
+    def search(self, **params):
+        request = Request(APIRequestFactory().get('/', params))
+        return list(self.backend.filter_queryset(request, Place.objects.all(), None))
+
+    def test_nearby_ordered_by_distance(self):
+        origin = (23.13, 113.26)
+        points = dict(a=(23.131, 113.26), b=(23.13, 113.265), c=(23.14, 113.27), far=(23.3, 113.26))
+        for name, (latitude, longitude) in points.items():
+            Place.objects.create(name=name, latitude=latitude, longitude=longitude)
+        Place.objects.create(name='unknown')
+        result = self.search(latitude=origin[0], longitude=origin[1], radius=2000)
+        self.assertEqual([place.name for place in result], ['a', 'b', 'c'])
+        for place in result:
+            expected = geohash.distance(*origin, *points[place.name])
+            self.assertAlmostEqual(place.distance, expected, delta=expected * 0.01)
+        self.assertEqual([place.name for place in self.search(
+            latitude=origin[0], longitude=origin[1], nearest=1)], ['a'])
+
+    def test_antimeridian(self):
+        Place.objects.create(name='east', latitude=0, longitude=179.999)
+        Place.objects.create(name='west', latitude=0, longitude=-179.9985)
+        Place.objects.create(name='far', latitude=0, longitude=-179.9)
+        result = self.search(latitude=0, longitude=179.9995, radius=1000)
+        self.assertEqual([place.name for place in result], ['east', 'west'])
+        self.assertAlmostEqual(result[1].distance, geohash.distance(0, 179.9995, 0, -179.9985), delta=5)
+        result = self.search(latitude=0, longitude=-179.9995, radius=1000)
+        self.assertEqual([place.name for place in result], ['west', 'east'])
+
+    def test_invalid_params(self):
+        with self.assertRaises(AppError):
+            self.search(latitude='x', longitude=1)
+        with self.assertRaises(AppError):
+            self.search(latitude=91, longitude=1)
+
+    def test_geohash_updated_on_save(self):
+        place = Place.objects.create(name='a', latitude=23.13, longitude=113.26)
+        self.assertEqual(place.geohash, geohash.encode(23.13, 113.26))
+        place.latitude = None
+        place.save(update_fields=['latitude'])
+        self.assertEqual(Place.objects.get(pk=place.pk).geohash, '')
+
+
+@unittest.skipIf(member.gis_models is not None, 'GeoDjango is available')
+class GeoLocationWithoutGISTest(SimpleTestCase):
+
+    def test_subclass_fails_clearly(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'GDAL/GEOS'):
+            type('GeoMember', (member.MemberGeoLocationMixin,), dict(
+                __module__=__name__, Meta=type('Meta', (), dict(abstract=True))))
+
+
+@unittest.skipIf(member.gis_models is None, 'GeoDjango is not available')
+class PointListFieldTest(SimpleTestCase):
+    coords = [[113.26, 23.13], [121.4737, 31.2304], [-0.1276, 51.5072], [179.999999, -89.5]]
+
+    def setUp(self):
+        from django.contrib.gis.geos import LineString, MultiPoint
+        from scaffold.libs.drf_extra_fields import geo_fields
+        self.geo_fields, self.LineString, self.MultiPoint = geo_fields, LineString, MultiPoint
+
+    def round_trip(self, field, data):
+        value = field.to_internal_value(data)
+        return value, field.to_representation(value)
+
+    def test_line_string(self):
+        field = self.geo_fields.PointListField(srid=4326)
+        for numpy in [self.geo_fields.numpy, None]:
+            with self.subTest(numpy=numpy is not None), mock.patch.object(self.geo_fields, 'numpy', numpy):
+                value, representation = self.round_trip(field, self.coords)
+                self.assertIsInstance(value, self.LineString)
+                self.assertEqual(value.srid, 4326)
+                self.assertEqual(representation, self.coords)
+                self.assertEqual(self.round_trip(field, json.dumps(self.coords))[1], self.coords)
+                line = self.LineString([(1, 2, 3), (4.5, 5.5, 6.5)])
+                self.assertEqual(field.to_representation(line), [[1, 2, 3], [4.5, 5.5, 6.5]])
+
+    def test_multi_point(self):
+        field = self.geo_fields.PointListField(geometry_class=self.MultiPoint)
+        for numpy in [self.geo_fields.numpy, None]:
+            with self.subTest(numpy=numpy is not None), mock.patch.object(self.geo_fields, 'numpy', numpy):
+                value, representation = self.round_trip(field, self.coords)
+                self.assertIsInstance(value, self.MultiPoint)
+                self.assertEqual(representation, self.coords)
+                self.assertEqual(self.round_trip(field, self.coords[:1])[1], self.coords[:1])
+
+    def test_invalid(self):
+        field = self.geo_fields.PointListField(max_length=3)
+        for numpy in [self.geo_fields.numpy, None]:
+            with mock.patch.object(self.geo_fields, 'numpy', numpy):
+                for data in [[[1, 2]], self.coords, [[181, 0], [0, 0]], [[0, 91], [0, 0]],
+                             [[1, 2, 3], [4, 5, 6]], [[1, 'x'], [0, 0]], {'a': 1}, '[[1, 2]']:
+                    with self.subTest(numpy=numpy is not None, data=data), self.assertRaises(ValidationError):
+                        field.to_internal_value(data)
+
+
+@unittest.skipUnless(settings.SPATIALITE, 'SCAFFOLD_TEST_SPATIALITE is not set')
+class SpatialNearbyFilterTest(TestCase):
+
+    def test_spatial_index_used(self):
+        from tests.models import GeoPlace
+        GeoPlace.objects.create(name='a', latitude=23.131, longitude=113.26)
+        GeoPlace.objects.create(name='far', latitude=23.3, longitude=113.26)
+        self.assertTrue(NearbyFilterBackend.use_spatial_index(GeoPlace.objects.all()))
+        request = Request(APIRequestFactory().get('/', dict(latitude=23.13, longitude=113.26, radius=2000)))
+        result = list(NearbyFilterBackend().filter_queryset(request, GeoPlace.objects.all(), None))
+        self.assertEqual([place.name for place in result], ['a'])
+        self.assertAlmostEqual(result[0].distance.m, geohash.distance(23.13, 113.26, 23.131, 113.26), delta=2)
@@ -0,0 +1,333 @@
+import hashlib
+import io
+import os
+from unittest import mock
+
+import requests
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image as PILImage
+
+from scaffold.apps.media import cleanup, models as media_models, thumbnails
+from scaffold.apps.media.models import Attachment, Image, download
+from scaffold.exceptions.exceptions import AppError
+from tests.models import Album, Document
+
+
+def png(color=(200, 30, 30), size=(64, 48), format='PNG'):
+    buffer = io.BytesIO()
+    PILImage.new('RGB', size, color).save(buffer, format)
+    return ContentFile(buffer.getvalue(), name='photo.' + format.lower())
+
+
+class MediaTestCase(TestCase):
+
+    def assertFileExists(self, field_file, exists=True):
+        self.assertEqual(field_file.storage.exists(field_file.name), exists, field_file.name)
+
+
+class ContentHashStorageTest(MediaTestCase):
+
+    def test_identical_uploads_share_blob(self):
+        first = Image.objects.create(image=png())
+        second = Image.objects.create(image=png())
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertEqual(first.image.name, second.image.name)
+        digest = first.content_hash
+        self.assertEqual(first.image.name, 'images/{}/{}/{}.png'.format(digest[:2], digest[2:4], digest))
+        self.assertFileExists(first.image)
+
+    def test_stored_file_is_committed(self):
+        image = Image(name='photo')
+        image.store_file(png(), 'photo.png')
+        self.assertTrue(image.image._committed)
+        self.assertEqual(image.image.instance, image)
+        image.save()
+        self.assertEqual(Image.objects.get(pk=image.pk).image.name, image.image.name)
+
+    def test_from_file_returns_existing_image(self):
+        image = Image.from_file(png())
+        self.assertEqual(Image.from_file(png()).pk, image.pk)
+        self.assertNotEqual(Image.from_file(png(color=(0, 0, 255))).pk, image.pk)
+
+
+class FakeResponse(object):
+    """ requests 流式响应的替身，iter_content 按给定的块输出 """
+
+    def __init__(self, chunks=(), headers=None, status_code=200, error=None):
+        self.chunks = list(chunks)
+        self.headers = headers or {}
+        self.status_code = status_code
+        self.error = error
+        self.consumed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(response=self)
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.consumed += 1
+            yield chunk
+        if self.error:
+            raise self.error
+
+
+class FakeSession(object):
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        response = self.responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@override_settings(SCAFFOLD_DOWNLOAD_MAX_SIZE=100, SCAFFOLD_DOWNLOAD_TIMEOUT=5)
+class DownloadTest(MediaTestCase):
+
+    def mock_session(self, responses):
+        session = FakeSession(responses)
+        patcher = mock.patch.object(media_models, 'download_session', session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return session
+
+    def test_download(self):
+        session = self.mock_session({'http://a/x.png': FakeResponse([b'abc', b'def'])})
+        with download('http://a/x.png') as f:
+            self.assertEqual(f.read(), b'abcdef')
+            self.assertEqual(f.content_hash, hashlib.sha256(b'abcdef').hexdigest())
+        self.assertEqual(session.calls, [('http://a/x.png', dict(stream=True, timeout=5))])
+
+    def test_content_length_too_large(self):
+        response = FakeResponse([b'x'], headers={'Content-Length': '101'})
+        self.mock_session({'http://a/x.png': response})
+        with self.assertRaisesMessage(AppError, '下载的文件过大'):
+            download('http://a/x.png')
+        self.assertEqual(response.consumed, 0)
+
+    def test_streamed_too_large(self):
+        # 没有 Content-Length（或者不准确）时，读取超过上限即停止
+        response = FakeResponse([b'x' * 60] * 5, headers={'Content-Length': '10'})
+        self.mock_session({'http://a/x.png': response})
+        with self.assertRaisesMessage(AppError, '下载的文件过大'):
+            download('http://a/x.png')
+        self.assertEqual(response.consumed, 2)
+
+    def test_timeout(self):
+        self.mock_session({
+            'http://a/connect.png': requests.ConnectTimeout(),
+            'http://a/read.png': FakeResponse([b'x'], error=requests.ReadTimeout()),
+        })
+        for url in ['http://a/connect.png', 'http://a/read.png']:
+            with self.subTest(url=url), self.assertRaises(requests.Timeout):
+                download(url)
+
+    def test_freeze_many(self):
+        urls = ['http://a/{}.png'.format(name) for name in ['ok1', 'ok2', 'large', 'timeout', 'missing']]
+        ok = [png(color=(i, 0, 0)).read() for i in range(2)]
+        self.mock_session({
+            urls[0]: FakeResponse([ok[0]]),
+            urls[1]: FakeResponse([ok[1]]),
+            urls[2]: FakeResponse([b'x' * 6 * 1024] * 2),
+            urls[3]: requests.ReadTimeout(),
+            urls[4]: FakeResponse(status_code=404),
+        })
+        images = [Image.objects.create(ext_url=url) for url in urls]
+        local = Image.objects.create(image=png())
+        with CaptureQueriesContext(connection) as queries, \
+                override_settings(SCAFFOLD_DOWNLOAD_MAX_SIZE=10 * 1024):
+            frozen, errors = Image.freeze_many(Image.objects.order_by('pk'), concurrency=3)
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['SELECT', 'UPDATE'])
+        self.assertEqual(frozen, images[:2])
+        self.assertCountEqual(errors, images[2:])
+        self.assertIsInstance(errors[images[3]], requests.Timeout)
+        self.assertIsInstance(errors[images[4]], requests.HTTPError)
+        for image, data in zip(images[:2], ok):
+            image = Image.objects.get(pk=image.pk)
+            self.assertEqual(image.ext_url, '')
+            self.assertEqual(image.content_hash, hashlib.sha256(data).hexdigest())
+            self.assertEqual(image.image.read(), data)
+            image.image.close()
+        for image, url in zip(images[2:], urls[2:]):
+            image = Image.objects.get(pk=image.pk)
+            self.assertEqual((image.ext_url, image.image.name, image.content_hash), (url, '', ''))
+        self.assertEqual(Image.objects.get(pk=local.pk).image.name, local.image.name)
+
+
+class MediaURLTest(MediaTestCase):
+
+    def test_formatter_follows_settings(self):
+        image = Image.objects.create(image=png())
+        self.assertEqual(image.url(), settings.MEDIA_URL + image.image.name)
+        with override_settings(SCAFFOLD_MEDIA_BASE_URL='https://cdn.example.com/m'):
+            self.assertEqual(image.url(), 'https://cdn.example.com/m/' + image.image.name)
+        with override_settings(MEDIA_URL='/uploads/'):
+            self.assertEqual(image.url(), '/uploads/' + image.image.name)
+        self.assertEqual(image.url(), settings.MEDIA_URL + image.image.name)
+
+    def test_with_gallery_urls(self):
+        images = [Image.objects.create(image=png(color=(i, 0, 0))) for i in range(3)]
+        images.append(Image.objects.create(ext_url='https://example.com/a.png'))
+        for i in range(3):
+            Album.objects.create(name=str(i)).images.set(images[i:i + 2])
+        with self.assertNumQueries(2):
+            urls = [album.images_url for album in Album.objects.with_gallery_urls().order_by('name')]
+        self.assertEqual([sorted(u) for u in urls], [sorted(image.url() for image in images[i:i + 2]) for i in range(3)])
+        with self.assertNumQueries(4):
+            [album.images_url for album in Album.objects.all()]
+
+
+class FileCleanupTest(MediaTestCase):
+
+    def delete(self, obj_or_queryset):
+        with self.captureOnCommitCallbacks(execute=True):
+            obj_or_queryset.delete()
+
+    def test_blob_deleted_with_last_reference(self):
+        first = Image.objects.create(image=png())
+        second = Image.objects.create(image=png())
+        self.delete(first)
+        self.assertFileExists(second.image)
+        self.delete(Image.objects.filter(pk=second.pk))
+        self.assertFileExists(second.image, exists=False)
+
+    def test_blob_referenced_by_another_model_is_kept(self):
+        image = Image.objects.create(image=png())
+        Document.objects.create(file=image.image.name)
+        self.delete(image)
+        self.assertFileExists(image.image)
+
+    def test_references_checked_after_commit(self):
+        first = Image.objects.create(image=png())
+        second = Image.objects.create(image=png())
+        # 引用检查在提交之后进行，同一事务（或者并发事务中后提交的一方）删除最后的引用时文件被删除
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            first.delete()
+            second.delete()
+        self.assertEqual(len(callbacks), 2)
+        for callback in callbacks:
+            callback()
+        self.assertFileExists(first.image, exists=False)
+
+    def test_rollback_keeps_file(self):
+        image = Image.objects.create(image=png())
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            image.delete()
+        self.assertFileExists(image.image)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_attachment_cleanup(self):
+        attachment = Attachment.objects.create(file=ContentFile(b'data', name='a.txt'))
+        self.assertTrue(os.path.isfile(attachment.file.path))
+        self.delete(attachment)
+        self.assertFalse(os.path.isfile(attachment.file.path))
+
+
+class ThumbnailTest(MediaTestCase):
+
+    def test_variant_redirect(self):
+        image = Image.objects.create(image=png())
+        response = self.client.get('/api/images/{}/variant/'.format(image.pk), dict(width=32, format='webp'))
+        self.assertEqual(response.status_code, 302)
+        name = thumbnails.variant_name(image.image.name, width=32, format='webp')
+        self.assertTrue(response['Location'].endswith(name))
+        self.assertTrue(image.image.storage.exists(name))
+
+    def test_invalid_variant_params(self):
+        image = Image.objects.create(image=png())
+        url = '/api/images/{}/variant/'.format(image.pk)
+        for params in (dict(width='abc'), dict(width=-1), dict(width=32, quality=0),
+                       dict(width=32, fit='stretch'), dict(), dict(width=100000)):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+    def test_gif_without_format_falls_back_to_original(self):
+        image = Image.objects.create(image=png(format='GIF'))
+        self.assertEqual(image.variant_url(width=32), image.url())
+        self.assertNotEqual(image.variant_url(width=32, format='png'), image.url())
+
+    def test_decompression_bomb_falls_back_to_original(self):
+        image = Image.objects.create(image=png())
+        with mock.patch.object(PILImage, 'MAX_IMAGE_PIXELS', 10):
+            self.assertEqual(image.variant_url(width=32, format='jpg'), image.url())
+        self.assertEqual(thumbnails._pending, {})
+
+    def test_variants_deleted_with_original(self):
+        image = Image.objects.create(image=png())
+        other = Image.objects.create(image=png(color=(0, 0, 255)))
+        names = [thumbnails.get_variant(image.image, width=32),
+                 thumbnails.get_variant(image.image, height=16, format='webp')]
+        kept = thumbnails.get_variant(other.image, width=32)
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        for name in names:
+            self.assertFalse(image.image.storage.exists(name), name)
+        self.assertTrue(other.image.storage.exists(kept))
+
+
+class CleanupReceiverTest(MediaTestCase):
+
+    def tearDown(self):
+        cleanup.connect_receivers()
+
+    def test_receivers_follow_setting(self):
+        self.assertTrue(post_delete.has_listeners(Image))
+        self.assertFalse(post_delete.has_listeners(Document))
+        cleanup.disconnect_receivers()
+        with override_settings(SCAFFOLD_AUTO_DELETE_FILE=False):
+            cleanup.connect_receivers()
+        # 没有接收者时 QuerySet.delete() 可以使用 fast delete
+        self.assertFalse(post_delete.has_listeners(Image))
+
+    @override_settings(SCAFFOLD_ASYNC_FILE_CLEANUP=True)
+    def test_drain_at_exit(self):
+        image = Image.objects.create(image=png())
+        cleaner = cleanup.FileCleaner()
+        with mock.patch.object(cleanup, 'cleaner', cleaner), mock.patch('atexit.register') as register, \
+                mock.patch.object(cleanup.FileCleaner, 'run'):
+            with self.captureOnCommitCallbacks(execute=True):
+                image.delete()
+        register.assert_called_once_with(cleaner.drain)
+        # 后台线程没有机会处理，退出时同步删除
+        self.assertFileExists(image.image)
+        cleaner.drain(timeout=1)
+        self.assertFileExists(image.image, exists=False)
+        self.assertEqual(cleaner.queue.unfinished_tasks, 0)
+
+
+class ScanOrphansTest(MediaTestCase):
+
+    def write(self, path):
+        path = os.path.join(settings.MEDIA_ROOT, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'data')
+        return path
+
+    def test_delete_limited_to_upload_dirs(self):
+        image = Image.objects.create(image=png())
+        orphan = self.write('images/00/00/orphan.png')
+        variant = self.write('images/00/00/gone.w32h0-contain-q80.png')
+        foreign = self.write('static/app.js')
+        call_command('scan_media_orphans', delete=True, stdout=io.StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(variant))
+        self.assertTrue(os.path.exists(foreign))
+        self.assertFileExists(image.image)
@@ -0,0 +1,152 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from scaffold.models.abstract import member
+from scaffold.modules.management.commands import backfill_member_pinyin
+from tests.models import Profile, TrackedProfile
+
+
+class MemberPinyinTest(TestCase):
+
+    def setUp(self):
+        TrackedProfile.objects.create(nickname='张三')
+        self.profile = TrackedProfile.objects.get()
+
+    def test_created(self):
+        self.assertEqual(self.profile.nickname_pinyin, 'zhang-san')
+
+    def test_not_recomputed_when_nickname_unchanged(self):
+        self.profile.signature = 'hello'
+        with mock.patch.object(member, 'get_nickname_pinyin') as get_nickname_pinyin:
+            self.profile.save()
+        get_nickname_pinyin.assert_not_called()
+        self.assertEqual(TrackedProfile.objects.get().nickname_pinyin, 'zhang-san')
+
+    def test_recomputed_when_nickname_changed(self):
+        self.profile.nickname = '李四'
+        self.profile.save()
+        self.assertEqual(TrackedProfile.objects.get().nickname_pinyin, 'li-si')
+
+    def test_update_fields_widened(self):
+        self.profile.nickname = '李四'
+        with CaptureQueriesContext(connection) as queries:
+            self.profile.save(update_fields=['nickname'])
+        sql, = [query['sql'] for query in queries]
+        self.assertIn('"nickname_pinyin"', sql)
+        self.assertEqual(TrackedProfile.objects.get().nickname_pinyin, 'li-si')
+
+    def test_memoized(self):
+        member.get_nickname_pinyin.cache_clear()
+        member.get_nickname_pinyin('王五')
+        member.get_nickname_pinyin('王五')
+        info = member.get_nickname_pinyin.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+
+class BackfillMemberPinyinTest(TestCase):
+    nicknames = ['张三', '李四', '张三', '王五', '']
+
+    def setUp(self):
+        TrackedProfile.objects.bulk_create(TrackedProfile(nickname=name) for name in self.nicknames)
+        TrackedProfile.objects.filter(nickname='李四').update(nickname_pinyin='stale')
+
+    def backfill(self, *args, **options):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command(backfill_member_pinyin.Command(), 'tests.TrackedProfile',
+                         *args, stdout=out, **options)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        return out.getvalue().splitlines(), updates
+
+    def pinyins(self):
+        return list(TrackedProfile.objects.order_by('pk').values_list('nickname_pinyin', flat=True))
+
+    def test_empty_pinyin_in_chunks(self):
+        lines, updates = self.backfill(chunk_size=2, processes=1)
+        self.assertEqual(lines, ['2 members updated.', '3 members updated.'])
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.pinyins(), ['zhang-san', 'stale', 'zhang-san', 'wang-wu', ''])
+
+    def test_all(self):
+        lines, updates = self.backfill('--all', chunk_size=2, processes=1)
+        self.assertEqual(lines[-1], '5 members updated.')
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(self.pinyins(), ['zhang-san', 'li-si', 'zhang-san', 'wang-wu', ''])
+
+    def test_process_pool(self):
+        self.backfill('--all', chunk_size=10, processes=2)
+        self.assertEqual(self.pinyins(), ['zhang-san', 'li-si', 'zhang-san', 'wang-wu', ''])
+
+
+class MemberConstellationTest(TestCase):
+    # 每个星座的第一天和前一天
+    boundaries = [
+        ('0119', 'CAPRICORN'), ('0120', 'AQUARIUS'),
+        ('0218', 'AQUARIUS'), ('0219', 'PISCES'),
+        ('0320', 'PISCES'), ('0321', 'ARIES'),
+        ('0419', 'ARIES'), ('0420', 'TAURUS'),
+        ('0520', 'TAURUS'), ('0521', 'GEMINI'),
+        ('0621', 'GEMINI'), ('0622', 'CANCER'),
+        ('0722', 'CANCER'), ('0723', 'LEO'),
+        ('0822', 'LEO'), ('0823', 'VIRGO'),
+        ('0922', 'VIRGO'), ('0923', 'LIBRA'),
+        ('1023', 'LIBRA'), ('1024', 'SCORPIO'),
+        ('1122', 'SCORPIO'), ('1123', 'SAGITTARIUS'),
+        ('1221', 'SAGITTARIUS'), ('1222', 'CAPRICORN'),
+        ('0101', 'CAPRICORN'), ('1231', 'CAPRICORN'), ('0229', 'PISCES'),
+    ]
+
+    def test_boundaries(self):
+        for mmdd, constellation in self.boundaries:
+            birthday = datetime.datetime.strptime('2000' + mmdd, '%Y%m%d').date()
+            self.assertEqual(Profile.get_constellation(birthday), constellation, mmdd)
+        self.assertEqual(Profile.get_constellation(None), '')
+
+    def test_update_constellations_matches_lookup(self):
+        # 闰年的每一天以及没有生日
+        start = datetime.date(2000, 1, 1)
+        birthdays = [start + datetime.timedelta(days=i) for i in range(366)] + [None]
+        Profile.objects.bulk_create(
+            Profile(birthday=birthday, constellation='X') for birthday in birthdays)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(Profile.update_constellations(), len(birthdays))
+        self.assertEqual(len(queries), 1)
+        for birthday, constellation in Profile.objects.values_list('birthday', 'constellation'):
+            self.assertEqual(constellation, Profile.get_constellation(birthday), birthday)
+
+    def test_update_constellations_queryset(self):
+        Profile.objects.bulk_create([
+            Profile(nickname='a', birthday=datetime.date(1990, 1, 20)),
+            Profile(nickname='b', birthday=datetime.date(1990, 1, 20)),
+        ])
+        self.assertEqual(Profile.update_constellations(Profile.objects.filter(nickname='a')), 1)
+        self.assertEqual(
+            list(Profile.objects.order_by('nickname').values_list('constellation', flat=True)),
+            ['AQUARIUS', ''])
+
+    def test_save(self):
+        TrackedProfile.objects.create(birthday=datetime.date(1990, 12, 21))
+        profile = TrackedProfile.objects.get()
+        self.assertEqual(profile.constellation, 'SAGITTARIUS')
+        profile.birthday = datetime.date(1990, 12, 22)
+        with CaptureQueriesContext(connection) as queries:
+            profile.save(update_fields=['birthday'])
+        sql, = [query['sql'] for query in queries]
+        self.assertIn('"constellation"', sql)
+        self.assertEqual(TrackedProfile.objects.get().constellation, 'CAPRICORN')
+        # 生日没有修改时不重新计算，也不会填写当前日期
+        TrackedProfile.objects.update(constellation='')
+        profile = TrackedProfile.objects.get()
+        profile.signature = 'hello'
+        profile.save()
+        self.assertEqual(TrackedProfile.objects.get().constellation, '')
+
+    def test_save_without_birthday(self):
+        profile = TrackedProfile.objects.create()
+        self.assertEqual((profile.birthday, profile.constellation), (None, ''))
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from scaffold.middlewares import ExplicitSessionMiddleware
+
+
+@override_settings(MIDDLEWARE=['scaffold.middlewares.ExplicitSessionMiddleware'])
+class ExplicitSessionMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def process(self, request, view=None):
+        def get_response(request):
+            if view:
+                view(request)
+            return HttpResponse()
+        return ExplicitSessionMiddleware(get_response)(request)
+
+    def test_header_session_loaded_once(self):
+        session = SessionStore()
+        session['user'] = 1
+        session.save()
+        request = self.factory.get('/', HTTP_SESSION_ID=session.session_key)
+        with self.assertNumQueries(1):
+            response = self.process(request, lambda r: r.session.get('user'))
+        self.assertEqual(request.session['user'], 1)
+        self.assertEqual(response[settings.CUSTOM_SESSION_HEADER], session.session_key)
+
+    def test_header_session_has_no_cookie_or_vary(self):
+        session = SessionStore()
+        session.save()
+
+        def view(request):
+            request.session['visited'] = True
+
+        request = self.factory.get('/', HTTP_SESSION_ID=session.session_key)
+        response = self.process(request, view)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(response.has_header('Vary'))
+        self.assertTrue(SessionStore(session.session_key)['visited'])
+
+    def test_invalid_header_session_gets_new_key(self):
+        def view(request):
+            request.session['visited'] = True
+
+        request = self.factory.get('/', HTTP_SESSION_ID='invalid')
+        response = self.process(request, view)
+        key = response[settings.CUSTOM_SESSION_HEADER]
+        self.assertNotEqual(key, 'invalid')
+        self.assertTrue(SessionStore(key)['visited'])
+
+    @override_settings(CUSTOM_SESSION_STATELESS=True)
+    def test_stateless_header_session(self):
+        def view(request):
+            request.session['user'] = 2
+
+        with self.assertNumQueries(0):
+            response = self.process(self.factory.get('/', HTTP_SESSION_ID=''), view)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(response.has_header('Vary'))
+        signed = response[settings.CUSTOM_SESSION_HEADER]
+
+        seen = []
+        with self.assertNumQueries(0):
+            self.process(self.factory.get('/', HTTP_SESSION_ID=signed),
+                         lambda r: seen.append(r.session.get('user')))
+        self.assertEqual(seen, [2])
+
+    def test_cookie_session_still_uses_cookie(self):
+        def view(request):
+            request.session['visited'] = True
+
+        response = self.process(self.factory.get('/'), view)
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertIn('Cookie', response['Vary'])
@@ -0,0 +1,77 @@
+import datetime
+
+from django.db import connection
+from django.db.models.signals import pre_save
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from scaffold.models.abstract.meta import DatedModel, DirtyFieldsModel
+from tests.models import Article, Profile
+
+
+def set_slug(sender, instance, **kwargs):
+    instance.slug = instance.title.lower()
+
+
+class DirtyFieldsSaveTest(TestCase):
+
+    def setUp(self):
+        Article.objects.create(title='Title', body='body')
+        self.article = Article.objects.get()
+
+    def save(self, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            self.article.save(**kwargs)
+        return [query['sql'] for query in queries]
+
+    def test_only_dirty_fields_written(self):
+        date_updated = self.article.date_updated
+        self.article.title = 'New'
+        sql, = self.save()
+        self.assertIn('"title"', sql)
+        self.assertIn('"date_updated"', sql)
+        self.assertNotIn('"body"', sql)
+        article = Article.objects.get()
+        self.assertEqual(article.title, 'New')
+        self.assertGreater(article.date_updated, date_updated)
+        self.assertEqual(self.article.get_dirty_fields(), set())
+
+    def test_unchanged_instance_not_written(self):
+        self.assertEqual(self.save(), [])
+
+    def test_explicit_update_fields(self):
+        self.article.title = 'New'
+        self.article.body = 'changed'
+        sql, = self.save(update_fields=['body'])
+        self.assertNotIn('"title"', sql)
+        self.assertEqual(self.article.get_dirty_fields(), {'title'})
+
+    def test_fields_set_by_pre_save_receiver(self):
+        pre_save.connect(set_slug, sender=Article)
+        self.addCleanup(pre_save.disconnect, set_slug, sender=Article)
+        self.article.title = 'New'
+        self.save()
+        self.assertEqual(Article.objects.get().slug, 'new')
+
+    def test_deleted_row_inserted(self):
+        Article.objects.all().delete()
+        self.article.title = 'New'
+        self.save()
+        article = Article.objects.get()
+        self.assertEqual((article.pk, article.title, article.body), (self.article.pk, 'New', 'body'))
+
+    def test_opt_in(self):
+        self.assertFalse(issubclass(DatedModel, DirtyFieldsModel))
+
+
+class UntrackedMixinSaveTest(TestCase):
+
+    def test_save_without_dirty_fields_model(self):
+        profile = Profile(nickname='张三', birthday=datetime.date(2000, 1, 20))
+        profile.save()
+        profile = Profile.objects.get()
+        self.assertEqual((profile.nickname_pinyin, profile.constellation), ('zhang-san', 'AQUARIUS'))
+        # 没有快照时每次保存都重新计算
+        profile.nickname = '李四'
+        profile.save()
+        self.assertEqual(Profile.objects.get().nickname_pinyin, 'li-si')
@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from tests.models import OAuthEntry
+
+
+class OAuthEntryResolveTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def resolve(self, openid='o1', unionid='', app='app'):
+        return OAuthEntry.resolve(OAuthEntry.PLATFORM_WECHAT_APP, app, openid, unionid)
+
+    def test_cache_written_on_miss_only(self):
+        entry = self.resolve()
+        self.assertEqual(cache.get(OAuthEntry.get_cache_key('app', 'o1')).pk, entry.pk)
+        with mock.patch.object(OAuthEntry, 'update_cache') as update_cache, \
+                self.assertNumQueries(0):
+            self.assertEqual(self.resolve().pk, entry.pk)
+        update_cache.assert_not_called()
+
+    def test_bind_by_unionid(self):
+        user = User.objects.create(username='u')
+        first = self.resolve('o1', 'u1')
+        first.author = user
+        first.save()
+        second = self.resolve('o2', 'u1', app='other')
+        self.assertEqual(second.author_id, user.pk)
+        self.assertEqual(cache.get(OAuthEntry.get_cache_key('other', 'o2')).author_id, user.pk)
+
+    def test_author_deleted(self):
+        user = User.objects.create(username='u')
+        entry = self.resolve()
+        entry.author = user
+        entry.save()
+        self.assertEqual(self.resolve().author_id, user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        self.assertIsNone(cache.get(OAuthEntry.get_cache_key('app', 'o1')))
+        self.assertIsNone(self.resolve().author_id)
@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+
+from scaffold.restframework import permissions
+from scaffold.restframework.permissions import HasPermissions, get_permission_version
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'scaffold.utils.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'LOCAL_TIMEOUT': 60},
+    },
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+}
+
+
+class HasPermBackend:
+    """ 只实现 has_perm 的认证后端 """
+
+    def authenticate(self, request, **kwargs):
+        return None
+
+    def has_perm(self, user, perm, obj=None):
+        return user.is_active and perm == 'tests.special'
+
+
+class HasPermissionsTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['shared'].clear()
+        content_type = ContentType.objects.get_for_model(User)
+        self.permission = Permission.objects.create(
+            codename='manage', name='manage', content_type=content_type)
+        self.user = User.objects.create(username='u')
+
+    def check(self, *perms):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        return HasPermissions.build(*perms)().has_permission(request, None)
+
+    def test_snapshot(self):
+        self.assertFalse(self.check('auth.manage'))
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.check('auth.manage', 'auth.other'))
+
+    def test_has_perm_only_backend(self):
+        self.assertFalse(self.check('tests.special'))
+        with override_settings(AUTHENTICATION_BACKENDS=[MODEL_BACKEND, 'tests.test_permissions.HasPermBackend']):
+            self.assertTrue(self.check('tests.special'))
+            self.assertFalse(self.check('tests.other'))
+
+    def test_no_has_perm_call_for_model_backend(self):
+        with mock.patch.object(User, 'has_perm') as has_perm:
+            self.assertFalse(self.check('auth.manage'))
+        has_perm.assert_not_called()
+
+    @override_settings(CACHES=TIERED_CACHES, SCAFFOLD_PERMISSION_CACHE_TIMEOUT=300)
+    def test_revocation_seen_through_local_tier(self):
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.check('auth.manage'))
+        version = get_permission_version()
+        # 另一个进程撤销权限：只有共享层的版本号变化
+        User.user_permissions.through.objects.filter(user=self.user).delete()
+        caches['shared'].incr(permissions.PERMISSION_VERSION_KEY)
+        self.assertEqual(get_permission_version(), version + 1)
+        self.assertFalse(self.check('auth.manage'))
+
+    @override_settings(CACHES=TIERED_CACHES, SCAFFOLD_PERMISSION_CACHE_TIMEOUT=300)
+    def test_invalidated_by_signal(self):
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.check('auth.manage'))
+        self.user.user_permissions.remove(self.permission)
+        self.assertFalse(self.check('auth.manage'))
@@ -0,0 +1,50 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from scaffold.apps.search import history
+from scaffold.apps.search.models import SearchHistory, SearchTerm
+from scaffold.models.abstract.member import AbstractMember
+
+
+@override_settings(SCAFFOLD_ASYNC_SEARCH_HISTORY=False)
+class SearchHistoryTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='u')
+
+    def test_record(self):
+        for term in ('a', 'b', 'a'):
+            history.record(self.user, term)
+        self.assertEqual(history.recent_terms(self.user), ['a', 'b'])
+        self.assertEqual(history.popular_terms(), ['a', 'b'])
+
+    def test_slot_conflict_skips_only_conflicting_rows(self):
+        SearchHistory.objects.create(user=self.user, slot=0, term='old', date_searched=timezone.now())
+        now = timezone.now()
+        # 模拟另一个进程在读取之后写入了槽位 0
+        with mock.patch.object(SearchHistory.objects, 'filter', return_value=[]):
+            history.HistoryWriter.write([(self.user.pk, 'x', now), (self.user.pk, 'y', now)])
+        self.assertEqual(dict(SearchHistory.objects.values_list('slot', 'term')), {0: 'old', 1: 'y'})
+        self.assertEqual(SearchTerm.objects.count(), 2)
+
+    def test_popular_limit(self):
+        for term in ('a', 'b', 'c'):
+            history.record(None, term)
+        response = self.client.get('/api/search/popular/', dict(limit=2))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        for limit in ('abc', 0, 101, -1):
+            self.assertEqual(self.client.get('/api/search/popular/', dict(limit=limit)).status_code, 400)
+
+    def test_member_history_requires_app(self):
+        member = mock.Mock(user=self.user)
+        with mock.patch('django.apps.apps.is_installed', return_value=False), \
+                mock.patch.object(history, 'record') as record:
+            AbstractMember.add_search_history(member, 'a')
+            self.assertEqual(AbstractMember.get_search_history(member), [])
+        record.assert_not_called()
+        AbstractMember.add_search_history(member, 'a')
+        self.assertEqual(AbstractMember.get_search_history(member), ['a'])
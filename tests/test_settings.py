@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+from django.test import SimpleTestCase
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+class BaseDirTest(SimpleTestCase):
+    """ scaffold.settings 在独立进程中导入，不影响测试本身的 settings """
+
+    def setUp(self):
+        self.project = tempfile.mkdtemp(prefix='scaffold-project-')
+        os.makedirs(os.path.join(self.project, 'proj'))
+        open(os.path.join(self.project, 'proj', '__init__.py'), 'w').close()
+        with open(os.path.join(self.project, 'proj', 'settings.py'), 'w') as f:
+            f.write('from scaffold.settings import *\n')
+
+    def base_dir(self, module, **env):
+        env = dict(
+            {k: v for k, v in os.environ.items() if k != 'DJANGO_BASE_DIR'},
+            DJANGO_SETTINGS_MODULE='proj.settings', DJANGO_DB_TYPE='sqlite3',
+            PYTHONPATH=os.pathsep.join([SRC, self.project]), **env)
+        code = textwrap.dedent('''
+            import importlib
+            print(importlib.import_module({!r}).BASE_DIR)
+        ''').format(module)
+        return subprocess.run(
+            [sys.executable, '-c', code], env=env, cwd=tempfile.gettempdir(),
+            check=True, capture_output=True, text=True).stdout.strip()
+
+    def test_project_settings(self):
+        self.assertEqual(self.base_dir('proj.settings'), os.path.realpath(self.project))
+
+    def test_scaffold_settings_imported_directly(self):
+        self.assertEqual(self.base_dir('scaffold.settings'), os.path.realpath(self.project))
+
+    def test_env_override(self):
+        self.assertEqual(self.base_dir('proj.settings', DJANGO_BASE_DIR='/srv/app'), '/srv/app')
@@ -0,0 +1,65 @@
+import os
+import pickle
+
+from django.test import SimpleTestCase
+
+from scaffold.utils.http import UserContext
+
+unpickled = []
+
+
+class Exploit:
+    def __reduce__(self):
+        return unpickled.append, (True,)
+
+
+class UserContextTest(SimpleTestCase):
+
+    def setUp(self):
+        UserContext._cache.clear()
+
+    def tearDown(self):
+        UserContext.destroy('ctx')
+
+    def test_contexts_have_own_session_and_share_adapter(self):
+        a, b = UserContext('ctx'), UserContext('ctx')
+        self.assertIsNot(a.session, b.session)
+        self.assertIs(a.session.get_adapter('https://example.com'),
+                      b.session.get_adapter('https://example.com'))
+        a.session.cookies.set('token', 'a', domain='example.com')
+        self.assertIsNone(b.session.cookies.get('token'))
+
+    def test_save_and_load(self):
+        context = UserContext('ctx')
+        context.session.cookies.set('token', 'abc', domain='example.com', path='/')
+        context.session.headers['X-Token'] = 'header'
+        context.save()
+        self.assertEqual(UserContext._cache['ctx'][0], os.stat(context.session_file_path).st_mtime_ns)
+
+        cached = UserContext('ctx')
+        self.assertEqual(cached.session.cookies.get('token'), 'abc')
+        # 从缓存恢复的 session 修改 Cookie 不影响缓存和其他 context
+        cached.session.cookies.set('token', 'changed', domain='example.com', path='/')
+        self.assertEqual(UserContext('ctx').session.cookies.get('token'), 'abc')
+
+        UserContext._cache.clear()
+        loaded = UserContext('ctx')
+        self.assertEqual(loaded.session.cookies.get('token'), 'abc')
+        self.assertEqual(loaded.session.headers['X-Token'], 'header')
+
+    def test_legacy_pickle_file_is_not_loaded(self):
+        path = os.path.join(UserContext.get_session_dir(), 'ctx')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(pickle.dumps(Exploit()))
+        context = UserContext('ctx')
+        self.assertEqual(unpickled, [])
+        self.assertEqual(len(context.session.cookies), 0)
+
+    def test_destroy_keeps_lock_file(self):
+        context = UserContext('ctx')
+        context.save()
+        UserContext.destroy('ctx')
+        self.assertFalse(os.path.exists(context.session_file_path))
+        self.assertTrue(os.path.exists(context.session_file_path + '.lock'))
+        self.assertNotIn('ctx', UserContext._cache)
@@ -0,0 +1,63 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from scaffold.utils.worker import BatchWorker
+
+
+class Collector(BatchWorker):
+    name = 'test-collector'
+    batch_size = 3
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.batches = []
+        self.threads = set()
+        self.processed = threading.Event()
+
+    def process(self, batch):
+        self.threads.add(threading.current_thread().name)
+        self.batches.append(batch)
+        if batch == ['fail']:
+            raise ValueError(batch)
+        self.processed.set()
+
+
+class BatchWorkerTest(SimpleTestCase):
+
+    def test_processed_in_background(self):
+        worker = Collector()
+        with mock.patch('atexit.register') as register:
+            self.assertTrue(worker.put('fail'))
+            self.assertTrue(worker.put(1))
+            register.assert_called_once_with(worker.drain)
+        self.assertTrue(worker.processed.wait(5))
+        worker.queue.join()
+        self.assertEqual(worker.threads, {'test-collector'})
+        self.assertEqual(sum(worker.batches, []), ['fail', 1])
+
+    def test_full_queue(self):
+        worker = Collector(maxsize=1)
+        worker.ensure_worker = lambda: None
+        self.assertTrue(worker.put(1))
+        self.assertFalse(worker.put(2))
+
+    def test_drain_in_batches(self):
+        worker = Collector()
+        worker.ensure_worker = lambda: None
+        worker.worker_pid = mock.ANY
+        with mock.patch('os.getpid', return_value=mock.ANY):
+            for i in range(7):
+                worker.put(i)
+            worker.drain(timeout=1)
+        self.assertEqual(worker.batches, [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(worker.queue.unfinished_tasks, 0)
+
+    def test_drain_skipped_in_forked_child(self):
+        worker = Collector()
+        worker.ensure_worker = lambda: None
+        worker.worker_pid = -1
+        worker.put(1)
+        worker.drain(timeout=0)
+        self.assertEqual(worker.batches, [])
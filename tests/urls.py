@@ -0,0 +1,14 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from scaffold.apps.media import views as media_views
+from scaffold.apps.search import views as search_views
+
+router = DefaultRouter()
+router.register('images', media_views.ImageViewSet)
+router.register('search', search_views.SearchHistoryViewSet, basename='search')
+
+urlpatterns = [
+    path('api/', include('scaffold.exceptions.urls')),
+    path('api/', include(router.urls)),
+]